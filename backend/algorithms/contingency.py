@@ -0,0 +1,237 @@
+import numpy as np
+
+from algorithms.ford_fulkerson import MaxFlowSession
+from utils.compiled_graph import as_compiled_graph
+from utils.parallel import map_with_graph
+
+
+class OutageModel:
+    """
+    Base solution shared by the workers of an N-1 contingency run
+
+    Every outage starts from the solved base max-flow and withdraws the
+    flow of the failed pipe instead of solving from scratch. Reachability
+    uses a breadth-first tree from the source: only removing a tree arc can
+    cut nodes off, and then only nodes in that arc's subtree.
+    """
+
+    def __init__(self, graph, source, sink, consumers):
+        self.session = MaxFlowSession(graph, source, sink)
+        self.graph = G = self.session.graph
+        self.base = self.session.snapshot()
+        self.base_value = self.session.value
+        self.consumers = np.zeros(G.num_nodes, dtype=bool)
+        self.consumers[[G.node_index(c) for c in consumers]] = True
+        self.tails = G.arc_sources()
+        self.open_arc = G.capacity > 0
+        # Arcs grouped by head, to find the arcs entering a set of nodes
+        self.in_arcs = np.argsort(G.indices, kind='stable')
+        self.in_ptr = np.zeros(G.num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(G.indices, minlength=G.num_nodes), out=self.in_ptr[1:])
+        self._build_tree(G.node_index(source))
+
+    def _build_tree(self, s):
+        G = self.graph
+        indptr = G.indptr.tolist()
+        indices = G.indices.tolist()
+        open_arc = self.open_arc.tolist()
+
+        parent_arc = [-1] * G.num_nodes
+        seen = [False] * G.num_nodes
+        seen[s] = True
+        children = [[] for _ in range(G.num_nodes)]
+        queue = [s]
+        for u in queue:
+            for e in range(indptr[u], indptr[u + 1]):
+                v = indices[e]
+                if open_arc[e] and not seen[v]:
+                    seen[v] = True
+                    parent_arc[v] = e
+                    children[u].append(v)
+                    queue.append(v)
+
+        # Preorder numbering puts every subtree in one contiguous run
+        order = []
+        stack = [s]
+        while stack:
+            u = stack.pop()
+            order.append(u)
+            stack.extend(children[u])
+        size = [1] * G.num_nodes
+        for u in reversed(order):
+            if parent_arc[u] >= 0:
+                size[self.tails[parent_arc[u]]] += size[u]
+
+        self.order = np.asarray(order, dtype=np.int64)
+        self.first = np.full(G.num_nodes, -1, dtype=np.int64)
+        self.first[self.order] = np.arange(len(order))
+        self.size = np.asarray(size, dtype=np.int64)
+        self.parent_arc = np.asarray(parent_arc, dtype=np.int64)
+
+    def base_flow(self, e):
+        """Flow on arc e in the base solution"""
+        return self.base[0][2 * e + 1]
+
+    def subtree(self, arcs):
+        """Nodes below whichever of the arcs is a tree arc (empty if none is)"""
+        heads = self.graph.indices[arcs]
+        tree = heads[self.parent_arc[heads] == arcs]
+        if len(tree) == 0:
+            return np.empty(0, dtype=np.int64)
+        v = tree[0]
+        return self.order[self.first[v]:self.first[v] + self.size[v]]
+
+    def cut_off(self, arcs):
+        """Nodes that lose every path from the source when the arcs are removed"""
+        sub = self.subtree(arcs)
+        if len(sub) == 0 or not self.consumers[sub].any():
+            return sub[:0]
+
+        G = self.graph
+        inside = np.zeros(G.num_nodes, dtype=bool)
+        inside[sub] = True
+        # Reachable nodes outside the subtree keep their tree paths, so any
+        # usable arc entering the subtree from one of them reconnects its head
+        entering = _arc_ranges(self.in_ptr, self.in_arcs, sub)
+        entering = entering[self._usable(entering, arcs) & ~inside[self.tails[entering]]]
+        entering = entering[self.first[self.tails[entering]] >= 0]
+
+        reached = np.zeros(G.num_nodes, dtype=bool)
+        frontier = np.unique(G.indices[entering])
+        reached[frontier] = True
+        while len(frontier):
+            out = _arc_ranges(G.indptr, None, frontier)
+            heads = G.indices[out[self._usable(out, arcs)]]
+            frontier = np.unique(heads[inside[heads] & ~reached[heads]])
+            reached[frontier] = True
+        return sub[~reached[sub]]
+
+    def _usable(self, candidates, removed):
+        return self.open_arc[candidates] & ~np.isin(candidates, removed)
+
+    def outage(self, arcs):
+        """
+        Effect of removing a set of arcs
+
+        Returns:
+            tuple: (max-flow with the arcs removed, consumer node indices cut off)
+        """
+        arcs = np.asarray(arcs, dtype=np.int64)
+        if any(self.base_flow(e) > self.session.residual.eps for e in arcs.tolist()):
+            self.session.restore(self.base)
+            value = self.session.what_if({e: 0 for e in arcs.tolist()})
+        else:
+            value = self.base_value
+        lost = self.cut_off(arcs)
+        return value, lost[self.consumers[lost]].tolist()
+
+
+def _arc_ranges(ptr, arcs, nodes):
+    """Arcs listed under the given nodes of a CSR-style pointer array, concatenated"""
+    starts = ptr[nodes]
+    counts = ptr[nodes + 1] - starts
+    offsets = np.repeat(starts - np.cumsum(counts) + counts, counts)
+    positions = offsets + np.arange(counts.sum())
+    return positions if arcs is None else arcs[positions]
+
+
+def _outage(model, arcs):
+    """Worker entry point: one pipe outage against the shared base model"""
+    return model.outage(arcs)
+
+
+def pipe_arcs(graph):
+    """
+    Group arcs into pipes
+
+    An undirected pipe is stored as two opposite arcs; both fail together.
+
+    Returns:
+        dict: (lower node index, higher node index) -> list of arc indices
+    """
+    G = as_compiled_graph(graph)
+    tails = G.arc_sources()
+    heads = G.indices
+    low = np.minimum(tails, heads)
+    high = np.maximum(tails, heads)
+    pipes = {}
+    for e, key in enumerate(zip(low.tolist(), high.tolist())):
+        if key[0] != key[1]:
+            pipes.setdefault(key, []).append(e)
+    return pipes
+
+
+def contingency_analysis(graph, source, sink, consumers=None, pipes=None, max_workers=None):
+    """
+    N-1 contingency analysis: remove every pipe in turn
+
+    Pipes that carry no flow in the base solution cannot change the max
+    flow, and pipes off the reachability tree cannot disconnect anything,
+    so only pipes doing either are evaluated. Outages run in a process
+    pool that shares one copy of the base model.
+
+    Args:
+        graph (CompiledGraph or dict): Graph representation
+        source (str): Source node ID
+        sink (str): Sink node ID or list of sink nodes
+        consumers (list): Node IDs to check for reachability, defaults to the sinks
+        pipes (list): (source, target) node ID pairs to evaluate, defaults to all pipes
+        max_workers (int): Pool size, defaults to the configured worker count
+
+    Returns:
+        dict: Base max-flow, evaluated/skipped counts and the criticality
+              table, most critical pipe first
+    """
+    G = as_compiled_graph(graph)
+    if consumers is None:
+        consumers = sink if isinstance(sink, list) else [sink]
+    model = OutageModel(G, source, sink, consumers)
+
+    all_pipes = pipe_arcs(G)
+    if pipes is None:
+        selected = list(all_pipes)
+    else:
+        selected = []
+        for u, v in pipes:
+            i, j = G.node_index(u), G.node_index(v)
+            key = (min(i, j), max(i, j))
+            if key not in all_pipes:
+                raise ValueError(f"No pipe between {u} and {v}")
+            selected.append(key)
+        selected = list(dict.fromkeys(selected))
+
+    eps = model.session.residual.eps
+    candidates = []
+    for key in selected:
+        arcs = all_pipes[key]
+        flow = sum(model.base_flow(e) for e in arcs)
+        if flow > eps or model.consumers[model.subtree(arcs)].any():
+            candidates.append((key, arcs, flow))
+
+    outcomes = map_with_graph(
+        _outage, model, [arcs for _, arcs, _ in candidates],
+        max_workers=max_workers, item_work=G.num_edges
+    )
+
+    node_ids = G.node_ids
+    base_value = model.base_value
+    table = []
+    for (key, arcs, flow), (value, lost) in zip(candidates, outcomes):
+        loss = base_value - value
+        table.append({
+            "source": node_ids[key[0]],
+            "target": node_ids[key[1]],
+            "flow": flow,
+            "maxFlow": value,
+            "flowLoss": loss,
+            "lossFraction": loss / base_value if base_value else 0,
+            "unreachableConsumers": [node_ids[c] for c in lost]
+        })
+    table.sort(key=lambda row: (-row["flowLoss"], -len(row["unreachableConsumers"]), -row["flow"]))
+
+    return {
+        "baseMaxFlow": base_value,
+        "evaluated": len(candidates),
+        "skipped": len(selected) - len(candidates),
+        "criticality": table
+    }
@@ -0,0 +1,272 @@
+import heapq
+import math
+import sys
+import time
+
+from utils.compiled_graph import as_compiled_graph
+from utils.job_queue import checkpoint
+
+# Weight of the edge difference (shortcuts added minus arcs removed) in a
+# node's contraction priority
+EDGE_DIFFERENCE_WEIGHT = 2
+
+
+class ContractionHierarchy:
+    """
+    Preprocessed index for fast point-to-point shortest paths
+
+    Nodes are contracted one at a time, least important first (fewest
+    shortcuts added, fewest contracted neighbours, lowest in the hierarchy
+    built so far). Contracting v removes
+    it from the graph and adds a shortcut u->w for every path u->v->w that
+    has no equally short witness path avoiding v. Each node then keeps
+    only its arcs to nodes contracted after it, so a query is a
+    bidirectional Dijkstra that only climbs the hierarchy and settles a
+    few hundred nodes, whatever the size of the network. Shortcuts remember
+    the node they bypass, which is how paths are unpacked.
+
+    The index assumes the network does not change; rebuild it when it does.
+    """
+
+    def __init__(self, graph, rank, up, down, middle, stats):
+        self.graph = graph
+        self.rank = rank
+        # up[u]: [(w, weight)] for arcs u->w to higher-ranked w;
+        # down[v]: [(u, weight)] for arcs u->v from higher-ranked u
+        self.up = up
+        self.down = down
+        # u * n + w -> bypassed node, for every shortcut u->w
+        self.middle = middle
+        self.stats = stats
+
+    @classmethod
+    def build(cls, graph, witness_limit=100):
+        """
+        Contract a network into a hierarchy
+
+        Args:
+            graph (CompiledGraph or dict): Graph representation
+            witness_limit (int): Nodes a witness search may settle before a
+                shortcut is added anyway (a missed witness only costs an
+                unneeded shortcut, never a wrong answer)
+
+        Returns:
+            ContractionHierarchy: The index
+        """
+        start = time.perf_counter()
+        G = as_compiled_graph(graph)
+        n = G.num_nodes
+        out_adj = [{} for _ in range(n)]
+        in_adj = [{} for _ in range(n)]
+        indptr = G.indptr.tolist()
+        heads = G.indices.tolist()
+        weights = G.weight.tolist()
+        for u in range(n):
+            for e in range(indptr[u], indptr[u + 1]):
+                v, w = heads[e], weights[e]
+                if w < 0:
+                    raise ValueError("Shortest paths require non-negative pipe weights")
+                if v != u and math.isfinite(w):
+                    out_adj[u][v] = w
+                    in_adj[v][u] = w
+
+        middle = {}
+        deleted = [0] * n
+        level = [0] * n
+        rank = [-1] * n
+        up = [None] * n
+        down = [None] * n
+
+        def shortcuts(v):
+            found = []
+            outs = out_adj[v]
+            for u, w_uv in in_adj[v].items():
+                targets = {w: w_uv + w_vw for w, w_vw in outs.items() if w != u}
+                if not targets:
+                    continue
+                reached = _witness_search(out_adj, u, v, targets, max(targets.values()), witness_limit)
+                for w, d in targets.items():
+                    if reached.get(w, math.inf) > d:
+                        found.append((u, w, d))
+            return found
+
+        def priority(v, found):
+            edge_difference = len(found) - len(in_adj[v]) - len(out_adj[v])
+            return EDGE_DIFFERENCE_WEIGHT * edge_difference + deleted[v] + level[v]
+
+        heap = [(priority(v, shortcuts(v)), v) for v in range(n)]
+        heapq.heapify(heap)
+        order = 0
+        while heap:
+            _, v = heapq.heappop(heap)
+            if rank[v] >= 0:
+                continue
+            # Lazy update: priorities go stale as neighbours are contracted
+            found = shortcuts(v)
+            p = priority(v, found)
+            if heap and p > heap[0][0]:
+                heapq.heappush(heap, (p, v))
+                continue
+
+            for u, w, d in found:
+                if d < out_adj[u].get(w, math.inf):
+                    out_adj[u][w] = d
+                    in_adj[w][u] = d
+                    middle[u * n + w] = v
+
+            rank[v] = order
+            order += 1
+            up[v] = list(out_adj[v].items())
+            down[v] = list(in_adj[v].items())
+            for w in out_adj[v]:
+                del in_adj[w][v]
+                deleted[w] += 1
+                level[w] = max(level[w], level[v] + 1)
+            for u in in_adj[v]:
+                del out_adj[u][v]
+                deleted[u] += 1
+                level[u] = max(level[u], level[v] + 1)
+            out_adj[v] = in_adj[v] = None
+            if order % 1000 == 0:
+                checkpoint(order, n, f"{order} of {n} nodes contracted")
+
+        # Only shortcuts that survived (were not replaced by a shorter one)
+        # are still reachable from the stored arcs
+        live = {u * n + w for u in range(n) for w, _ in up[u]}
+        live.update(u * n + v for v in range(n) for u, _ in down[v])
+        middle = {key: via for key, via in middle.items() if key in live}
+
+        arcs = sum(len(a) for a in up) + sum(len(a) for a in down)
+        stats = {
+            'nodes': n,
+            'arcs': G.num_edges,
+            'indexArcs': arcs,
+            'shortcuts': len(middle),
+            'buildSeconds': round(time.perf_counter() - start, 3)
+        }
+        index = cls(G, rank, up, down, middle, stats)
+        stats['bytes'] = index.nbytes
+        return index
+
+    @property
+    def nbytes(self):
+        """Approximate memory held by the index (its Python lists, tuples and dicts)"""
+        total = sys.getsizeof(self.rank) + sys.getsizeof(self.up) + sys.getsizeof(self.down)
+        for arcs in (self.up, self.down):
+            for items in arcs:
+                # List slot, 2-tuple, float; node indices are shared ints
+                total += sys.getsizeof(items) + len(items) * (sys.getsizeof((0, 0)) + 24)
+        total += sys.getsizeof(self.middle) + 28 * len(self.middle)
+        return total
+
+    def query(self, source, target):
+        """
+        Shortest path between two node IDs
+
+        Returns:
+            tuple: (distance, path, settled) with distance None and path None
+                   when target is unreachable; settled counts the nodes the
+                   search touched
+        """
+        G = self.graph
+        s, t = G.node_index(source), G.node_index(target)
+        if s == t:
+            return 0.0, [source], 1
+
+        up, down = self.up, self.down
+        dist = ({s: 0.0}, {t: 0.0})
+        parent = ({s: -1}, {t: -1})
+        heaps = ([(0.0, s)], [(0.0, t)])
+        adjacency = (up, down)
+        settled = (set(), set())
+        best, meet = math.inf, -1
+
+        while heaps[0] or heaps[1]:
+            # Advance the side with the smaller frontier; stop once neither
+            # side can still improve on the best meeting point
+            keys = [h[0][0] if h else math.inf for h in heaps]
+            side = 0 if keys[0] <= keys[1] else 1
+            if keys[side] >= best:
+                break
+            d, u = heapq.heappop(heaps[side])
+            if u in settled[side]:
+                continue
+            settled[side].add(u)
+            other = dist[1 - side].get(u)
+            if other is not None and d + other < best:
+                best, meet = d + other, u
+            mine, preds = dist[side], parent[side]
+            for v, w in adjacency[side][u]:
+                nd = d + w
+                if nd < mine.get(v, math.inf):
+                    mine[v] = nd
+                    preds[v] = u
+                    heapq.heappush(heaps[side], (nd, v))
+
+        touched = len(settled[0]) + len(settled[1])
+        if meet < 0:
+            return None, None, touched
+
+        # Overlay path s..meet..t, then unpack every shortcut on it
+        forward = []
+        v = meet
+        while v >= 0:
+            forward.append(v)
+            v = parent[0][v]
+        forward.reverse()
+        v = parent[1][meet]
+        while v >= 0:
+            forward.append(v)
+            v = parent[1][v]
+
+        nodes = [forward[0]]
+        for a, b in zip(forward, forward[1:]):
+            nodes.extend(self._unpack(a, b))
+        node_ids = G.node_ids
+        return best, [node_ids[v] for v in nodes], touched
+
+    def _unpack(self, a, b):
+        """Original nodes after a on the arc a->b, shortcuts expanded"""
+        n = self.graph.num_nodes
+        path = []
+        stack = [(a, b)]
+        while stack:
+            a, b = stack.pop()
+            via = self.middle.get(a * n + b)
+            if via is None:
+                path.append(b)
+            else:
+                stack.append((via, b))
+                stack.append((a, via))
+        return path
+
+    def describe(self):
+        return dict(self.stats)
+
+
+def _witness_search(out_adj, source, excluded, targets, limit, max_settled):
+    """Distances from source avoiding excluded, up to limit or max_settled nodes"""
+    dist = {source: 0.0}
+    heap = [(0.0, source)]
+    pop, push = heapq.heappop, heapq.heappush
+    settled = 0
+    remaining = len(targets)
+    while heap:
+        d, u = pop(heap)
+        if d > dist[u]:
+            continue
+        settled += 1
+        if u in targets:
+            remaining -= 1
+            if remaining == 0:
+                break
+        if settled >= max_settled:
+            break
+        for v, w in out_adj[u].items():
+            nd = d + w
+            # Paths longer than the longest path via the excluded node
+            # can't be witnesses
+            if nd <= limit and v != excluded and (v not in dist or nd < dist[v]):
+                dist[v] = nd
+                push(heap, (nd, v))
+    return dist
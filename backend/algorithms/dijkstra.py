@@ -1,32 +1,192 @@
-import networkx as nx
+import heapq
+
+import numpy as np
+
+from utils.compiled_graph import as_compiled_graph
+from utils.parallel import map_with_graph
+
+
+def shortest_path_tree(graph, source, weights=None):
+    """
+    Run Dijkstra's algorithm on the CSR arrays of a compiled graph
+
+    Args:
+        graph (CompiledGraph): Compiled graph
+        source (int): Interned source node index
+        weights (array): Per-arc weights overriding graph.weight
+
+    Returns:
+        tuple: (dist list, pred list, settled order) indexed by node index;
+               unreachable nodes have dist inf and pred -1
+    """
+    indptr = graph.indptr.tolist()
+    indices = graph.indices.tolist()
+    weights = (graph.weight if weights is None else np.asarray(weights, dtype=np.float64)).tolist()
+
+    dist = [float('inf')] * graph.num_nodes
+    pred = [-1] * graph.num_nodes
+    done = [False] * graph.num_nodes
+    order = []
+
+    dist[source] = 0
+    heap = [(0, source)]
+    while heap:
+        d, u = heapq.heappop(heap)
+        if done[u]:
+            continue
+        done[u] = True
+        order.append(u)
+        for e in range(indptr[u], indptr[u + 1]):
+            v = indices[e]
+            nd = d + weights[e]
+            if nd < dist[v]:
+                dist[v] = nd
+                pred[v] = u
+                heapq.heappush(heap, (nd, v))
+
+    return dist, pred, order
+
+
+class ShortestPathTree:
+    """
+    Single-source shortest path tree kept as compact distance/predecessor arrays
+
+    Paths are only reconstructed when asked for, so one tree can serve any
+    number of targets cheaply.
+    """
+
+    def __init__(self, graph, source, dist, pred):
+        self.graph = graph
+        self.source = source
+        self.dist = np.asarray(dist, dtype=np.float64)
+        self.pred = np.asarray(pred, dtype=np.int64)
+
+    @classmethod
+    def compute(cls, graph, source):
+        """Build the tree for a source node ID"""
+        G = as_compiled_graph(graph)
+        dist, pred, _ = shortest_path_tree(G, G.node_index(source))
+        return cls(G, source, dist, pred)
+
+    def reachable(self, node_id):
+        i = self.graph.index.get(node_id)
+        return i is not None and bool(np.isfinite(self.dist[i]))
+
+    def distance(self, node_id):
+        """Shortest distance to a node, or None if it is unreachable"""
+        if not self.reachable(node_id):
+            return None
+        return self.dist[self.graph.index[node_id]].item()
+
+    def path(self, node_id):
+        """Node IDs from the source to node_id, or None if it is unreachable"""
+        if not self.reachable(node_id):
+            return None
+        pred = self.pred
+        node_ids = self.graph.node_ids
+        i = self.graph.index[node_id]
+        path = []
+        while i >= 0:
+            path.append(node_ids[i])
+            i = pred[i]
+        path.reverse()
+        return path
+
+    @property
+    def nbytes(self):
+        return self.dist.nbytes + self.pred.nbytes
+
 
 def dijkstra(graph, source):
     """
     Implementation of Dijkstra's algorithm for shortest paths
-    
+
     Args:
-        graph (dict): Graph representation
+        graph (CompiledGraph or dict): Graph representation
         source (str): Source node ID
-        
+
     Returns:
         tuple: (distances dict, paths dict)
     """
-    # Convert our graph format to NetworkX DiGraph
-    G = nx.DiGraph()
-    for u in graph:
-        for v in graph[u]:
-            # Use 'weight', 'distance' or 'cost' as the edge weight
-            weight = graph[u][v].get('weight', 
-                     graph[u][v].get('distance',
-                     graph[u][v].get('cost', 1)))
-            # Add the edge along with the resolved weight
-            G.add_edge(u, v, weight=weight)
-    
-    # Calculate shortest paths 
-    paths = nx.single_source_dijkstra_path(G, source, weight='weight')
-
-    # Get shortest distances from source to all reachable nodes
-    distances = nx.single_source_dijkstra_path_length(G, source, weight='weight')
+    G = as_compiled_graph(graph)
+    if source not in G:
+        raise ValueError(f"Source {source} is not in the network")
+
+    # One pass builds both the distances and the predecessor tree
+    dist, pred, order = shortest_path_tree(G, G.index[source])
+
+    node_ids = G.node_ids
+    distances = {}
+    paths = {}
+    for u in order:
+        distances[node_ids[u]] = dist[u]
+        # Nodes are settled in distance order, so the parent path already exists
+        p = pred[u]
+        paths[node_ids[u]] = [node_ids[u]] if p < 0 else paths[node_ids[p]] + [node_ids[u]]
 
     # Returning both distances and full paths
     return distances, paths
+
+
+def _tree_arrays(graph, source):
+    """Worker entry point: distance and predecessor arrays for one source index"""
+    dist, pred, _ = shortest_path_tree(graph, source)
+    return np.asarray(dist, dtype=np.float64), np.asarray(pred, dtype=np.int64)
+
+
+def shortest_path_trees(graph, sources, max_workers=None):
+    """
+    Compute one ShortestPathTree per distinct source
+
+    Independent sources are spread across a process pool.
+
+    Args:
+        graph (CompiledGraph or dict): Graph representation
+        sources (iterable): Source node IDs
+        max_workers (int): Pool size, defaults to the configured worker count
+
+    Returns:
+        dict: source node ID -> ShortestPathTree
+    """
+    G = as_compiled_graph(graph)
+    distinct = list(dict.fromkeys(sources))
+    indices = [G.node_index(source) for source in distinct]
+    arrays = map_with_graph(_tree_arrays, G, indices, max_workers=max_workers, item_work=G.num_edges)
+    return {
+        source: ShortestPathTree(G, source, dist, pred)
+        for source, (dist, pred) in zip(distinct, arrays)
+    }
+
+
+def iter_shortest_paths(trees, pairs, include_paths=True):
+    """
+    Answer many (source, target) queries from precomputed trees, one at a time
+
+    Args:
+        trees (dict): source node ID -> ShortestPathTree
+        pairs (iterable): (source, target) node ID pairs
+        include_paths (bool): Whether to reconstruct the node paths
+
+    Yields:
+        dict: One result per pair, in order
+    """
+    for source, target in pairs:
+        tree = trees[source]
+        result = {"source": source, "target": target}
+        if tree.reachable(target):
+            result["distance"] = tree.distance(target)
+            if include_paths:
+                result["path"] = tree.path(target)
+        else:
+            result["error"] = f"No path exists to target node {target}"
+        yield result
+
+
+def batch_shortest_paths(trees, pairs, include_paths=True):
+    """
+    Answer many (source, target) queries from precomputed trees
+
+    Returns:
+        list: One result dict per pair, in order
+    """
+    return list(iter_shortest_paths(trees, pairs, include_paths=include_paths))
@@ -0,0 +1,367 @@
+import math
+import threading
+
+from algorithms.mst import convert_to_undirected, kruskals_algorithm
+from utils.compiled_graph import as_compiled_graph
+
+
+class LinkCutForest:
+    """
+    Link-cut trees (splay-tree based) with path-maximum queries
+
+    Every node carries a value; path_max(x, y) returns the node with the
+    largest value on the tree path between x and y. Operations run in
+    amortized O(log n) time.
+    """
+
+    def __init__(self, values):
+        self.left = [-1] * len(values)
+        self.right = [-1] * len(values)
+        self.parent = [-1] * len(values)
+        self.flip = [False] * len(values)
+        self.value = list(values)
+        self.best = list(range(len(values)))
+
+    def add_node(self, value):
+        self.left.append(-1)
+        self.right.append(-1)
+        self.parent.append(-1)
+        self.flip.append(False)
+        self.value.append(value)
+        self.best.append(len(self.value) - 1)
+        return len(self.value) - 1
+
+    def reset_node(self, x, value):
+        """Reuse a detached node with a new value"""
+        self.left[x] = self.right[x] = self.parent[x] = -1
+        self.flip[x] = False
+        self.value[x] = value
+        self.best[x] = x
+
+    def set_value(self, x, value):
+        self._access(x)
+        self.value[x] = value
+        self._pull(x)
+
+    def link(self, x, y):
+        """Join the trees of x and y by making x a child of y"""
+        self._make_root(x)
+        self.parent[x] = y
+
+    def cut(self, x, y):
+        """Remove the tree edge between adjacent nodes x and y"""
+        self._make_root(x)
+        self._access(y)
+        # x is now the only node left of y on the path
+        self.left[y] = -1
+        self.parent[x] = -1
+        self._pull(y)
+
+    def connected(self, x, y):
+        return x == y or self._find_root(x) == self._find_root(y)
+
+    def path_max(self, x, y):
+        """Node with the largest value on the path between x and y"""
+        self._make_root(x)
+        self._access(y)
+        return self.best[y]
+
+    # ----- splay internals -----
+
+    def _is_root(self, x):
+        p = self.parent[x]
+        return p < 0 or (self.left[p] != x and self.right[p] != x)
+
+    def _pull(self, x):
+        best, value = self.best, self.value
+        m = x
+        child = self.left[x]
+        if child >= 0 and value[best[child]] > value[m]:
+            m = best[child]
+        child = self.right[x]
+        if child >= 0 and value[best[child]] > value[m]:
+            m = best[child]
+        best[x] = m
+
+    def _push(self, x):
+        if self.flip[x]:
+            left, right = self.left[x], self.right[x]
+            self.left[x], self.right[x] = right, left
+            if left >= 0:
+                self.flip[left] = not self.flip[left]
+            if right >= 0:
+                self.flip[right] = not self.flip[right]
+            self.flip[x] = False
+
+    def _rotate(self, x):
+        left, right, parent = self.left, self.right, self.parent
+        p = parent[x]
+        g = parent[p]
+        if not self._is_root(p):
+            if left[g] == p:
+                left[g] = x
+            else:
+                right[g] = x
+        parent[x] = g
+        if left[p] == x:
+            left[p] = right[x]
+            if right[x] >= 0:
+                parent[right[x]] = p
+            right[x] = p
+        else:
+            right[p] = left[x]
+            if left[x] >= 0:
+                parent[left[x]] = p
+            left[x] = p
+        parent[p] = x
+        self._pull(p)
+        self._pull(x)
+
+    def _splay(self, x):
+        # Pending flips must be pushed top-down before rotating
+        path = [x]
+        y = x
+        while not self._is_root(y):
+            y = self.parent[y]
+            path.append(y)
+        for y in reversed(path):
+            self._push(y)
+
+        while not self._is_root(x):
+            p = self.parent[x]
+            if not self._is_root(p):
+                g = self.parent[p]
+                if (self.left[g] == p) == (self.left[p] == x):
+                    self._rotate(p)
+                else:
+                    self._rotate(x)
+            self._rotate(x)
+
+    def _access(self, x):
+        last = -1
+        y = x
+        while y >= 0:
+            self._splay(y)
+            self.right[y] = last
+            self._pull(y)
+            last = y
+            y = self.parent[y]
+        self._splay(x)
+
+    def _make_root(self, x):
+        self._access(x)
+        self.flip[x] = not self.flip[x]
+        self._push(x)
+
+    def _find_root(self, x):
+        self._access(x)
+        while True:
+            self._push(x)
+            if self.left[x] < 0:
+                break
+            x = self.left[x]
+        self._splay(x)
+        return x
+
+
+class DynamicMST:
+    """
+    Minimum spanning forest maintained under pipe insertions, removals and cost changes
+
+    The forest is kept in link-cut trees where every tree edge is a node
+    carrying its cost, so the most expensive edge on the path a new or
+    cheaper pipe would close is found in O(log n). Removing a tree edge, or
+    raising its cost, searches for the cheapest replacement pipe from the
+    smaller of the two halves it leaves.
+    """
+
+    def __init__(self, graph):
+        G = as_compiled_graph(graph)
+        self.graph = G
+        n = G.num_nodes
+        self.adjacency = [{} for _ in range(n)]
+        self.tree_adjacency = [set() for _ in range(n)]
+        self.tree_node = {}
+        self.edge_of = {}
+        self.total_cost = 0
+        self._free = []
+        self._changes = []
+        self._lock = threading.Lock()
+
+        edge_u, edge_v, edge_cost = convert_to_undirected(G)
+        for u, v, c in zip(edge_u.tolist(), edge_v.tolist(), edge_cost.tolist()):
+            self.adjacency[u][v] = c
+            self.adjacency[v][u] = c
+
+        # Vertices never win a path-maximum query
+        self.forest = LinkCutForest([float('-inf')] * n)
+        tree_edges, _ = kruskals_algorithm(G)
+        for u_id, v_id in tree_edges:
+            u, v = G.index[u_id], G.index[v_id]
+            self.tree_adjacency[u].add(v)
+            self.tree_adjacency[v].add(u)
+        self._build_forest()
+        self._changes = []
+
+    def _build_forest(self):
+        """Hang every tree off a root; each node is then its own preferred path"""
+        n = self.graph.num_nodes
+        parent = self.forest.parent
+        seen = [False] * n
+        for root in range(n):
+            if seen[root]:
+                continue
+            seen[root] = True
+            queue = [root]
+            for u in queue:
+                for v in self.tree_adjacency[u]:
+                    if not seen[v]:
+                        seen[v] = True
+                        e = self._edge_node(u, v, self.adjacency[u][v])
+                        self.total_cost += self.adjacency[u][v]
+                        parent[v] = e
+                        parent[e] = u
+                        queue.append(v)
+
+    # ----- updates -----
+
+    def set_cost(self, source, target, cost):
+        """Insert a pipe, or change the cost of an existing one"""
+        u, v = self._pair(source, target)
+        # Checked before anything changes, so a bad cost leaves the forest intact
+        cost = float(cost)
+        if not math.isfinite(cost):
+            raise ValueError(f"Pipe cost must be a finite number, got {cost}")
+        with self._lock:
+            old = self.adjacency[u].get(v)
+            self.adjacency[u][v] = cost
+            self.adjacency[v][u] = cost
+            key = (min(u, v), max(u, v))
+            if key in self.tree_node:
+                self.forest.set_value(self.tree_node[key], cost)
+                self.total_cost += cost - old
+                if cost > old:
+                    # A dearer tree edge may lose to a pipe across the same cut
+                    self._remove_tree_edge(u, v)
+                    self._reconnect(u, v)
+            elif old is None or cost < old:
+                self._offer(u, v, cost)
+            return self._take_changes()
+
+    def remove(self, source, target):
+        """Delete a pipe"""
+        u, v = self._pair(source, target)
+        with self._lock:
+            if v not in self.adjacency[u]:
+                raise ValueError(f"No pipe between {source} and {target}")
+            del self.adjacency[u][v]
+            del self.adjacency[v][u]
+            if (min(u, v), max(u, v)) in self.tree_node:
+                self._remove_tree_edge(u, v)
+                self._reconnect(u, v)
+            return self._take_changes()
+
+    # ----- queries -----
+
+    def edges(self):
+        """Current forest as (source, target) node ID pairs"""
+        node_ids = self.graph.node_ids
+        with self._lock:
+            return [(node_ids[u], node_ids[v]) for u, v in self.tree_node]
+
+    def num_edges(self):
+        return len(self.tree_node)
+
+    # ----- internals -----
+
+    def _pair(self, source, target):
+        u, v = self.graph.node_index(source), self.graph.node_index(target)
+        if u == v:
+            raise ValueError("Self-loops never belong to a spanning tree")
+        return u, v
+
+    def _offer(self, u, v, cost):
+        """Use pipe u-v if it joins two trees or beats the dearest edge on the cycle it closes"""
+        forest = self.forest
+        if not forest.connected(u, v):
+            self._add_tree_edge(u, v, cost)
+            return
+        worst = forest.path_max(u, v)
+        if forest.value[worst] > cost:
+            a, b = self.edge_of[worst]
+            self._remove_tree_edge(a, b)
+            self._add_tree_edge(u, v, cost)
+
+    def _reconnect(self, a, b):
+        """Join the halves left by removing tree edge a-b with the cheapest pipe across"""
+        small = self._smaller_side(a, b)
+        best = None
+        for x in small:
+            for y, c in self.adjacency[x].items():
+                if y not in small and (best is None or c < best[0]):
+                    best = (c, x, y)
+        if best is not None:
+            self._add_tree_edge(best[1], best[2], best[0])
+
+    def _smaller_side(self, a, b):
+        """Nodes of whichever tree, a's or b's, is smaller, found by searching both in lockstep"""
+        seen = ({a}, {b})
+        queues = ([a], [b])
+        heads = [0, 0]
+        while True:
+            for k in (0, 1):
+                queue = queues[k]
+                if heads[k] == len(queue):
+                    return seen[k]
+                u = queue[heads[k]]
+                heads[k] += 1
+                for w in self.tree_adjacency[u]:
+                    if w not in seen[k]:
+                        seen[k].add(w)
+                        queue.append(w)
+
+    def _edge_node(self, u, v, cost):
+        if self._free:
+            e = self._free.pop()
+            self.forest.reset_node(e, cost)
+        else:
+            e = self.forest.add_node(cost)
+        key = (min(u, v), max(u, v))
+        self.tree_node[key] = e
+        self.edge_of[e] = key
+        return e
+
+    def _add_tree_edge(self, u, v, cost):
+        e = self._edge_node(u, v, cost)
+        self.forest.link(u, e)
+        self.forest.link(e, v)
+        self.tree_adjacency[u].add(v)
+        self.tree_adjacency[v].add(u)
+        self.total_cost += cost
+        self._changes.append(('added', u, v))
+
+    def _remove_tree_edge(self, u, v):
+        key = (min(u, v), max(u, v))
+        e = self.tree_node.pop(key)
+        del self.edge_of[e]
+        self.forest.cut(u, e)
+        self.forest.cut(e, v)
+        self._free.append(e)
+        self.tree_adjacency[u].discard(v)
+        self.tree_adjacency[v].discard(u)
+        self.total_cost -= self.forest.value[e]
+        self._changes.append(('removed', u, v))
+
+    def _take_changes(self):
+        """Tree edges added and removed by the last update, as node ID pairs"""
+        node_ids = self.graph.node_ids
+        # An edge removed and added back (or the reverse) did not change
+        net = {}
+        for kind, u, v in self._changes:
+            key = (min(u, v), max(u, v))
+            net[key] = net.get(key, 0) + (1 if kind == 'added' else -1)
+        self._changes = []
+        return {
+            'added': [(node_ids[u], node_ids[v]) for (u, v), k in net.items() if k > 0],
+            'removed': [(node_ids[u], node_ids[v]) for (u, v), k in net.items() if k < 0]
+        }
@@ -0,0 +1,572 @@
+import heapq
+import threading
+
+import numpy as np
+
+from algorithms.dijkstra import shortest_path_tree
+from utils.compiled_graph import CompiledGraph
+from utils.job_queue import checkpoint
+from utils.parallel import iter_with_graph
+from utils.route_replay import RouteReplay
+
+# Sensor history columns of one sensor, as in Filtered_Data.csv
+HISTORY_COLUMNS = ('Flow rate', 'Pressure 1', 'Pressure 2')
+
+
+def dynamic_dijkstra(graph, start, weights=None):
+    # Compiled graphs take a per-arc weights array (e.g. from dynamic_weight_kernel)
+    if isinstance(graph, CompiledGraph):
+        dist, pred, _ = shortest_path_tree(graph, graph.node_index(start), weights)
+        node_ids = graph.node_ids
+        distances = dict(zip(node_ids, dist))
+        previous = {node_ids[v]: node_ids[u] if u >= 0 else None for v, u in enumerate(pred)}
+        return distances, previous
+
+    queue = [(0, start)]
+    distances = {node: float('inf') for node in graph}
+    distances[start] = 0
+    previous = {node: None for node in graph}
+    while queue:
+        (dist, current_node) = heapq.heappop(queue)
+        for neighbor, weight in graph[current_node].items():
+            new_distance = dist + weight
+            if new_distance < distances[neighbor]:
+                distances[neighbor] = new_distance
+                previous[neighbor] = current_node
+                heapq.heappush(queue, (new_distance, neighbor))
+    return distances, previous
+
+
+def compute_dynamic_weights(base_graph, flow, pressure1, pressure2):
+    dynamic_graph = {}
+    factor = dynamic_factor(flow, pressure1, pressure2)
+    for node in base_graph:
+        dynamic_graph[node] = {}
+        for neighbor, base_weight in base_graph[node].items():
+            dynamic_graph[node][neighbor] = base_weight * factor
+    return dynamic_graph
+
+
+def dynamic_factor(flow, pressure1, pressure2):
+    """Weight multiplier for a sensor reading: pressure drop over flow"""
+    return (abs(pressure1 - pressure2) + 1) / (flow + 1)
+
+
+def dynamic_weight_kernel(base_weights, arc_sensor, flow, pressure1, pressure2):
+    """
+    Vectorized per-arc dynamic weights for one time step or a window of them
+
+    Args:
+        base_weights (array): Base weight per arc, shape (E,)
+        arc_sensor (array): Sensor column driving each arc, -1 for none, shape (E,)
+        flow, pressure1, pressure2 (array): Readings per sensor, shape (S,) for
+            one time step or (T, S) for a window; NaN means no reading
+
+    Returns:
+        array: Arc weights, shape (E,) or (T, E)
+    """
+    factor = sensor_factors(flow, pressure1, pressure2)
+    return np.asarray(base_weights, dtype=np.float64) * factor[..., arc_sensor]
+
+
+def sensor_factors(flow, pressure1, pressure2):
+    """
+    Weight multiplier per sensor, plus a trailing column of ones
+
+    Arcs without a sensor (arc_sensor -1) pick the trailing column, and
+    sensors without a reading (NaN) get a factor of 1, so both keep their
+    base weight.
+
+    Returns:
+        array: Factors, shape (S + 1,) or (T, S + 1)
+    """
+    flow = np.asarray(flow, dtype=np.float64)
+    pressure1 = np.asarray(pressure1, dtype=np.float64)
+    pressure2 = np.asarray(pressure2, dtype=np.float64)
+
+    factor = dynamic_factor(flow, pressure1, pressure2)
+    factor = np.where(np.isfinite(factor), factor, 1.0)
+    ones = np.ones(factor.shape[:-1] + (1,))
+    return np.concatenate([factor, ones], axis=-1)
+
+
+class EdgeSensorMap:
+    """
+    Which sensor drives the weight of each arc
+
+    arc_sensor[e] is the column of the sensor attached to arc e in
+    sensor_ids, or -1 when no sensor is attached.
+    """
+
+    def __init__(self, sensor_ids, arc_sensor):
+        self.sensor_ids = list(sensor_ids)
+        self.sensor_index = {sensor_id: i for i, sensor_id in enumerate(self.sensor_ids)}
+        self.arc_sensor = np.asarray(arc_sensor, dtype=np.int64)
+
+    @classmethod
+    def uniform(cls, graph, sensor_id='default'):
+        """Every arc follows the same sensor"""
+        return cls([sensor_id], np.zeros(graph.num_edges, dtype=np.int64))
+
+    @classmethod
+    def from_assignments(cls, graph, assignments):
+        """
+        Build the map from a list of {source, target, sensor} assignments
+
+        Like network edges, an assignment covers both directions unless it
+        sets ``directed``.
+        """
+        sensor_ids = []
+        sensor_index = {}
+        src, dst, column = [], [], []
+        for item in assignments:
+            sensor_id = item['sensor']
+            if sensor_id not in sensor_index:
+                sensor_index[sensor_id] = len(sensor_ids)
+                sensor_ids.append(sensor_id)
+            u = graph.node_index(item['source'])
+            v = graph.node_index(item['target'])
+            src.append(u)
+            dst.append(v)
+            column.append(sensor_index[sensor_id])
+            if not item.get('directed', False):
+                src.append(v)
+                dst.append(u)
+                column.append(sensor_index[sensor_id])
+
+        arcs = graph.arc_ids(src, dst)
+        column = np.asarray(column, dtype=np.int64)
+        # The reverse of a directed pipe may legitimately be missing
+        keep = arcs >= 0
+        if len(assignments) and not keep.any():
+            raise ValueError("Sensor assignments do not match any edge in the network")
+
+        arc_sensor = np.full(graph.num_edges, -1, dtype=np.int64)
+        arc_sensor[arcs[keep]] = column[keep]
+        return cls(sensor_ids, arc_sensor)
+
+    def reading_columns(self, readings):
+        """
+        Split {sensor_id: {flow, pressure1, pressure2}} into aligned arrays
+
+        Returns:
+            tuple: (columns, flow, pressure1, pressure2) for the known sensors
+        """
+        columns, flow, p1, p2 = [], [], [], []
+        for sensor_id, reading in readings.items():
+            if sensor_id not in self.sensor_index:
+                raise ValueError(f"Unknown sensor {sensor_id}")
+            columns.append(self.sensor_index[sensor_id])
+            flow.append(float(reading.get('flow', reading.get('Flow rate'))))
+            p1.append(float(reading.get('pressure1', reading.get('Pressure 1'))))
+            p2.append(float(reading.get('pressure2', reading.get('Pressure 2'))))
+        return np.asarray(columns, dtype=np.int64), np.asarray(flow), np.asarray(p1), np.asarray(p2)
+
+
+def compile_weighted_graph(base_graph):
+    """Compile a {u: {v: weight}} graph, as used by dynamic routing, into a CompiledGraph"""
+    node_ids = list(base_graph)
+    index = {node_id: i for i, node_id in enumerate(node_ids)}
+    src, dst, weight = [], [], []
+    for u, neighbors in base_graph.items():
+        for v, w in neighbors.items():
+            if v not in index:
+                index[v] = len(node_ids)
+                node_ids.append(v)
+            src.append(index[u])
+            dst.append(index[v])
+            weight.append(w)
+    return CompiledGraph.from_arrays(node_ids, src, dst, weight, weight, weight)
+
+
+class DynamicRouter:
+    """
+    Live shortest-path tree that follows sensor readings incrementally
+
+    Keeps the base graph, the current edge weights and the current
+    shortest-path tree in memory. Weight changes repair the tree with a
+    dynamic SSSP update (Ramalingam-Reps style) instead of a full Dijkstra:
+
+    * increased tree edges invalidate only the subtree hanging below them,
+      which is re-labelled from its unaffected in-neighbours;
+    * decreased edges seed the queue with the nodes they improve.
+
+    A reading that rescales every edge by the same ratio cannot change any
+    route, so the tree is kept and only the distances are rescaled.
+    """
+
+    def __init__(self, graph, source, base_weights=None, sensor_map=None):
+        self.graph = graph
+        self.source = graph.node_index(source)
+        n = graph.num_nodes
+        self.base_weights = graph.weight.copy() if base_weights is None else np.asarray(base_weights, dtype=np.float64)
+        self.weights = self.base_weights.tolist()
+
+        # Latest reading per sensor (rows: flow, pressure 1, pressure 2)
+        self.sensor_map = sensor_map or EdgeSensorMap.uniform(graph)
+        self.readings = np.full((3, len(self.sensor_map.sensor_ids)), np.nan)
+
+        self._indptr = graph.indptr.tolist()
+        self._heads = graph.indices.tolist()
+        self._tails = graph.arc_sources().tolist()
+
+        # Incoming arcs (CSC) to re-label nodes whose tree path got longer
+        order = np.argsort(graph.indices, kind='stable')
+        in_ptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(graph.indices, minlength=n), out=in_ptr[1:])
+        self._in_ptr = in_ptr.tolist()
+        self._in_arcs = order.tolist()
+
+        self._lock = threading.Lock()
+        self.recompute()
+
+    def recompute(self):
+        """Full Dijkstra from the source with the current weights"""
+        n = self.graph.num_nodes
+        self.dist = [float('inf')] * n
+        self.parent_arc = [-1] * n
+        self.children = [set() for _ in range(n)]
+        self.dist[self.source] = 0
+        return self._propagate([(0, self.source)])
+
+    def _set_parent(self, v, arc):
+        old = self.parent_arc[v]
+        if old >= 0:
+            self.children[self._tails[old]].discard(v)
+        self.parent_arc[v] = arc
+        if arc >= 0:
+            self.children[self._tails[arc]].add(v)
+
+    def _propagate(self, heap):
+        """Dijkstra from the seeded queue; returns the set of relabelled nodes"""
+        dist, weights = self.dist, self.weights
+        indptr, heads = self._indptr, self._heads
+        changed = set()
+        heapq.heapify(heap)
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            changed.add(u)
+            for e in range(indptr[u], indptr[u + 1]):
+                v = heads[e]
+                nd = d + weights[e]
+                if nd < dist[v]:
+                    dist[v] = nd
+                    self._set_parent(v, e)
+                    heapq.heappush(heap, (nd, v))
+        return changed
+
+    def update_weights(self, arcs, new_weights):
+        """
+        Change the weight of some arcs and repair the shortest-path tree
+
+        Args:
+            arcs (iterable): Arc positions in the compiled graph
+            new_weights (iterable): New weight for each arc
+
+        Returns:
+            set: Interned indices of the nodes whose distance was relabelled
+        """
+        with self._lock:
+            return self._update(list(arcs), list(new_weights))
+
+    def _update(self, arcs, new_weights):
+        dist, weights, tails, heads = self.dist, self.weights, self._tails, self._heads
+        increased, decreased = [], []
+        for e, w in zip(arcs, new_weights):
+            if w > weights[e]:
+                increased.append(e)
+            elif w < weights[e]:
+                decreased.append(e)
+            weights[e] = w
+
+        # Subtrees below increased tree edges lose their labels
+        affected = set()
+        stack = [heads[e] for e in increased if self.parent_arc[heads[e]] == e]
+        while stack:
+            v = stack.pop()
+            if v in affected:
+                continue
+            affected.add(v)
+            stack.extend(self.children[v])
+        for v in affected:
+            dist[v] = float('inf')
+            self._set_parent(v, -1)
+
+        heap = []
+        # Re-label affected nodes from their best unaffected in-neighbour
+        for v in affected:
+            best, best_arc = float('inf'), -1
+            for i in range(self._in_ptr[v], self._in_ptr[v + 1]):
+                e = self._in_arcs[i]
+                u = tails[e]
+                if u not in affected and dist[u] + weights[e] < best:
+                    best, best_arc = dist[u] + weights[e], e
+            if best_arc >= 0:
+                dist[v] = best
+                self._set_parent(v, best_arc)
+                heap.append((best, v))
+
+        # Cheaper arcs may shorten paths anywhere downstream
+        for e in decreased:
+            u, v = tails[e], heads[e]
+            nd = dist[u] + weights[e]
+            if nd < dist[v]:
+                dist[v] = nd
+                self._set_parent(v, e)
+                heap.append((nd, v))
+
+        return self._propagate(heap) | affected
+
+    def set_weights(self, new_weights):
+        """
+        Replace every arc weight, updating the tree as cheaply as possible
+
+        Args:
+            new_weights (array): New weight per arc, in CSR order
+
+        Returns:
+            set: Interned indices of the nodes whose distance changed
+        """
+        new_weights = np.asarray(new_weights, dtype=np.float64)
+        with self._lock:
+            return self._set_weights(new_weights)
+
+    def _set_weights(self, new_weights):
+        current = np.asarray(self.weights)
+        changed = np.flatnonzero(new_weights != current)
+        if len(changed) == 0:
+            return set()
+
+        # Uniform rescaling keeps every route, only distances scale
+        if np.all(current > 0) and np.all(new_weights > 0):
+            ratios = new_weights / current
+            if np.allclose(ratios, ratios[0], rtol=1e-12, atol=0):
+                ratio = float(ratios[0])
+                self.weights = new_weights.tolist()
+                self.dist = [d * ratio for d in self.dist]
+                return set(range(self.graph.num_nodes))
+
+        return self._update(changed.tolist(), new_weights[changed].tolist())
+
+    def apply_readings(self, readings):
+        """
+        Record new readings and reweight the arcs of the sensors that reported
+
+        Args:
+            readings (dict): sensor ID -> {flow, pressure1, pressure2}
+
+        Returns:
+            set: Interned indices of the nodes whose distance changed
+        """
+        columns, flow, p1, p2 = self.sensor_map.reading_columns(readings)
+        # Readings, weights and tree change together, so concurrent updates
+        # never compute weights from each other's half-applied readings
+        with self._lock:
+            self.readings[:, columns] = (flow, p1, p2)
+            new_weights = dynamic_weight_kernel(
+                self.base_weights, self.sensor_map.arc_sensor, *self.readings
+            )
+            return self._set_weights(new_weights)
+
+    def apply_reading(self, flow, pressure1, pressure2):
+        """Apply one reading to every sensor, i.e. reweight the whole network"""
+        reading = {'flow': flow, 'pressure1': pressure1, 'pressure2': pressure2}
+        return self.apply_readings({sensor_id: reading for sensor_id in self.sensor_map.sensor_ids})
+
+    def distances(self):
+        """Current distance of every node, keyed by node ID"""
+        with self._lock:
+            return dict(zip(self.graph.node_ids, self.dist))
+
+    def edges(self):
+        """Current (source ID, target ID, weight) for every arc"""
+        node_ids = self.graph.node_ids
+        with self._lock:
+            return [
+                (node_ids[u], node_ids[v], w)
+                for u, v, w in zip(self._tails, self._heads, self.weights)
+            ]
+
+
+def plan_replay(arc_sensor, flow, pressure1, pressure2):
+    """
+    Decide which time steps of a replay need their own shortest-path tree
+
+    All factors are computed in one vectorized pass over the readings. A
+    step whose factors are the previous step's times one common ratio only
+    rescales every arc weight, so it keeps the previous tree and its
+    distances are the tree's scaled by that ratio. This works on per-sensor
+    factors, never on (T, E) weight matrices.
+
+    Args:
+        arc_sensor (array): Sensor column of every arc, -1 for none
+        flow, pressure1, pressure2 (array): Readings, shape (T, S)
+
+    Returns:
+        tuple: (factors, step_tree, step_scale) where factors is (T, S + 1),
+               step_tree[t] is the tree a step uses (trees are numbered in
+               order of their first step) and step_scale[t] multiplies that
+               tree's distances
+    """
+    factors = sensor_factors(flow, pressure1, pressure2)
+    T = len(factors)
+    if T == 0:
+        return factors, np.zeros(0, dtype=np.int64), np.zeros(0)
+
+    # Only the sensors that drive some arc matter
+    used = np.unique(np.where(np.asarray(arc_sensor) < 0, factors.shape[1] - 1, arc_sensor))
+    if len(used) == 0:
+        used = np.array([factors.shape[1] - 1])
+    driving = factors[:, used]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        shape = driving / driving[:, :1]
+        rescaled = np.all(np.abs(shape[1:] - shape[:-1]) <= 1e-12 * np.abs(shape[:-1]), axis=1)
+    new_tree = np.concatenate(([True], ~rescaled))
+
+    step_tree = np.cumsum(new_tree) - 1
+    first_step = np.flatnonzero(new_tree)
+    step_scale = driving[:, 0] / driving[first_step[step_tree], 0]
+    return factors, step_tree, step_scale
+
+
+def _replay_window(shared, window):
+    """Shortest-path trees for a window of factor rows (one per tree)"""
+    graph, source, arc_sensor = shared
+    weights = graph.weight * window[:, arc_sensor]
+    n = graph.num_nodes
+    dist = np.empty((len(window), n))
+    parent = np.empty((len(window), n), dtype=np.int64)
+    for k, row in enumerate(weights):
+        dist[k], parent[k], _ = shortest_path_tree(graph, source, row)
+    return dist, parent
+
+
+def replay_dynamic_routes(graph, source, flow, pressure1, pressure2, sensor_map=None,
+                          window=32, max_workers=None):
+    """
+    Routing tables for every time step of a sensor history
+
+    Steps are grouped by plan_replay; only the first step of each group
+    runs Dijkstra. Those runs are cut into windows of consecutive trees and
+    spread across a process pool; each window computes its arc weights in
+    one vectorized kernel call.
+
+    Args:
+        graph (CompiledGraph): Base network
+        source: Source node ID
+        flow, pressure1, pressure2 (array): Readings, shape (T,) applied to
+            every sensor, or (T, S) with one column per sensor of sensor_map
+        sensor_map (EdgeSensorMap): Sensor of every arc, uniform by default
+        window (int): Trees computed per pool task
+        max_workers (int): Pool size, defaults to the configured worker count
+
+    Returns:
+        tuple: (step_tree, step_scale, trees) where trees yields one
+               (distances, parents) pair of node-indexed arrays per tree,
+               in tree order, as the pool produces them
+    """
+    sensor_map = sensor_map or EdgeSensorMap.uniform(graph)
+    S = len(sensor_map.sensor_ids)
+    readings = []
+    for values in (flow, pressure1, pressure2):
+        values = np.asarray(values, dtype=np.float64)
+        if values.ndim == 1:
+            values = np.repeat(values[:, None], S, axis=1)
+        if values.ndim != 2 or values.shape[1] != S:
+            raise ValueError(f"Readings need one column per sensor ({S})")
+        readings.append(values)
+
+    factors, step_tree, step_scale = plan_replay(sensor_map.arc_sensor, *readings)
+    if len(step_tree):
+        first_step = np.flatnonzero(np.diff(step_tree, prepend=-1))
+    else:
+        first_step = np.zeros(0, dtype=np.int64)
+    tree_factors = factors[first_step]
+    windows = [tree_factors[i:i + window] for i in range(0, len(tree_factors), window)]
+    shared = (graph, graph.node_index(source), sensor_map.arc_sensor)
+
+    def trees():
+        done = 0
+        for dist, parent in iter_with_graph(
+            _replay_window, shared, windows, max_workers=max_workers, item_work=window * graph.num_edges
+        ):
+            for k in range(len(dist)):
+                yield dist[k], parent[k]
+            done += len(dist)
+            checkpoint(done, len(tree_factors), f"{done} of {len(tree_factors)} routing trees")
+
+    return step_tree, step_scale, trees()
+
+
+def sensor_history_columns(store_columns, sensor_ids, sensor_columns=None):
+    """
+    Stored columns holding the flow, pressure 1 and pressure 2 of each sensor
+
+    A sensor reads from "<sensor> Flow rate", "<sensor> Pressure 1" and
+    "<sensor> Pressure 2" when the store has them, and otherwise from the
+    shared "Flow rate", "Pressure 1" and "Pressure 2" columns of the
+    single-sensor history. sensor_columns overrides this per sensor with
+    {flow, pressure1, pressure2} column names.
+
+    Args:
+        store_columns (list): Columns of the sensor store
+        sensor_ids (list): Sensors of the routing network, in column order
+        sensor_columns (dict): Optional sensor ID -> column names
+
+    Returns:
+        list: (flow, pressure1, pressure2) column names per sensor
+    """
+    available = set(store_columns)
+    sensor_columns = sensor_columns or {}
+    unknown = [sensor_id for sensor_id in sensor_columns if sensor_id not in sensor_ids]
+    if unknown:
+        raise ValueError(f"Unknown sensor {unknown[0]}")
+
+    mapping = []
+    for sensor_id in sensor_ids:
+        names = []
+        for key, shared in zip(('flow', 'pressure1', 'pressure2'), HISTORY_COLUMNS):
+            own = f"{sensor_id} {shared}"
+            name = sensor_columns.get(sensor_id, {}).get(key) or (own if own in available else shared)
+            if name not in available:
+                raise ValueError(f"Sensor history has no column {name} for sensor {sensor_id}")
+            names.append(name)
+        mapping.append(tuple(names))
+    return mapping
+
+
+def replay_sensor_history(graph, source, store, path, start=None, end=None, window=32, max_workers=None,
+                          sensor_map=None, sensor_columns=None):
+    """
+    Replay a window of the sensor history through dynamic routing
+
+    Every stored reading is applied to the pipes of its sensor, as the live
+    router does for a single reading, and the routing table after each one
+    is written to a RouteReplay at path. Stored columns are matched to the
+    sensors of sensor_map by sensor_history_columns.
+
+    Args:
+        graph (CompiledGraph): Base network
+        source: Source node ID
+        store (SensorStore): Sensor history
+        path (str): Output directory
+        start, end: Optional created_at range (inclusive)
+        sensor_map (EdgeSensorMap): Sensor of every arc, uniform by default
+        sensor_columns (dict): Optional sensor ID -> {flow, pressure1, pressure2} column names
+
+    Returns:
+        RouteReplay: The written replay
+    """
+    sensor_map = sensor_map or EdgeSensorMap.uniform(graph)
+    mapping = sensor_history_columns(store.columns, sensor_map.sensor_ids, sensor_columns)
+    rows = store.time_range(start, end)
+    times = store.column('created_at', rows)
+    # Sensors sharing a column read it once
+    loaded = {name: store.column(name, rows) for name in dict.fromkeys(n for names in mapping for n in names)}
+    flow, p1, p2 = (np.column_stack([loaded[names[k]] for names in mapping]) for k in range(3))
+    step_tree, step_scale, trees = replay_dynamic_routes(
+        graph, source, flow, p1, p2, sensor_map=sensor_map, window=window, max_workers=max_workers
+    )
+    return RouteReplay.write(path, graph.node_ids, source, times, step_tree, step_scale, trees)
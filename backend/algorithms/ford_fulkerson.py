@@ -1,50 +1,736 @@
-import networkx as nx
+import threading
 
-def add_super_sink(G, sinks):
-    """Add a super sink node to handle multiple sinks"""
-    G_ff = G.copy() # Work on a copy so we don’t mess with the original
-    G_ff.add_node("SuperSink")
-    for sink in sinks:
-        # Connect each individual sink to the SuperSink with unlimited capacity
-        G_ff.add_edge(sink, "SuperSink", capacity=float('inf'))
-    return G_ff
+import numpy as np
 
-def ford_fulkerson(graph, source, sink):
+from utils.compiled_graph import as_compiled_graph
+from utils.job_queue import checkpoint
+
+
+class ResidualNetwork:
+    """
+    Residual network over the CSR arrays of a compiled graph
+
+    Original arc e becomes residual arc 2*e (forward) and 2*e + 1 (backward),
+    so the partner of residual arc a is always a ^ 1. Multiple sinks are
+    joined through a virtual super sink (index n) whose arcs are appended
+    after the real ones instead of copying the graph.
+    """
+
+    def __init__(self, graph, sinks):
+        G = graph
+        n = G.num_nodes
+        m = G.num_edges
+        self.graph = G
+        self.num_arcs = m
+
+        tails = G.arc_sources()
+        heads = G.indices
+        caps = G.capacity
+
+        self.sinks = list(sinks)
+        if len(sinks) == 1:
+            self.sink = sinks[0]
+            num_nodes = n
+        else:
+            # Virtual super sink: never needs more than everything entering the sinks
+            self.sink = n
+            num_nodes = n + 1
+            sinks = np.asarray(sinks, dtype=np.int64)
+            into = np.bincount(heads, weights=caps, minlength=n)
+            tails = np.concatenate([tails, sinks])
+            heads = np.concatenate([heads, np.full(len(sinks), n, dtype=np.int64)])
+            caps = np.concatenate([caps, into[sinks]])
+
+        # Interleave forward and backward residual arcs
+        k = len(tails)
+        res_tail = np.empty(2 * k, dtype=np.int64)
+        res_head = np.empty(2 * k, dtype=np.int64)
+        res_cap = np.zeros(2 * k, dtype=np.float64)
+        res_tail[0::2], res_tail[1::2] = tails, heads
+        res_head[0::2], res_head[1::2] = heads, tails
+        res_cap[0::2] = caps
+
+        # Work in exact integers when every capacity is integral
+        self.integral = bool(np.all(np.isfinite(caps)) and np.all(caps == np.floor(caps)))
+        if self.integral:
+            self.res_cap = [int(c) for c in res_cap.tolist()]
+        else:
+            self.res_cap = res_cap.tolist()
+
+        order = np.argsort(res_tail, kind='stable')
+        ptr = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(res_tail, minlength=num_nodes), out=ptr[1:])
+
+        # Flow below eps is rounding noise when capacities are fractional
+        self.eps = 0 if self.integral else 1e-9 * max(1.0, float(caps.max(initial=0)))
+        self.num_nodes = num_nodes
+        self.num_res_arcs = k
+        self.res_head = res_head.tolist()
+        self.adj_ptr = ptr.tolist()
+        self.adj_arc = order.tolist()
+        # Residual arcs that gained capacity, recorded only while a list is set
+        self.gained = None
+
+    def arc_flow(self, e):
+        """Flow currently on original arc e (the backward residual capacity)"""
+        return self.res_cap[2 * e + 1]
+
+    def set_flows(self, flows):
+        """Load a flow (one value per arc, virtual sink arcs last) into the residual capacities"""
+        cap = self.res_cap
+        for k, f in enumerate(flows):
+            total = cap[2 * k] + cap[2 * k + 1]
+            cap[2 * k + 1] = f
+            cap[2 * k] = total - f
+
+    def decompose(self, s):
+        """
+        Decompose the current flow into source -> sink paths
+
+        Walks positive-flow arcs from s with a per-node arc pointer, so every
+        arc is scanned once overall. Flow circulations met on the way are
+        cancelled rather than reported.
+
+        Yields:
+            tuple: (list of interned node indices, flow on that path)
+        """
+        head, ptr, adj = self.res_head, self.adj_ptr, self.adj_arc
+        flow = self.res_cap[1::2]
+        eps = self.eps
+        virtual = self.sink == self.graph.num_nodes
+        t = self.sink
+        it = ptr[:-1]
+
+        while True:
+            arcs = []
+            nodes = [s]
+            position = {s: 0}
+            u = s
+            while u != t:
+                end = ptr[u + 1]
+                while it[u] < end:
+                    a = adj[it[u]]
+                    if not a & 1 and flow[a >> 1] > eps:
+                        break
+                    it[u] += 1
+                else:
+                    if not arcs:
+                        return
+                    # Dead end left by rounding: drop the arc into u and retreat
+                    a = arcs.pop()
+                    flow[a >> 1] = 0
+                    del position[nodes.pop()]
+                    u = nodes[-1]
+                    continue
+
+                v = head[a]
+                if v in position:
+                    # Circulation: cancel it and cut the walk back to v
+                    i = position[v]
+                    cycle = arcs[i:] + [a]
+                    pushed = min(flow[c >> 1] for c in cycle)
+                    for c in cycle:
+                        flow[c >> 1] -= pushed
+                    for w in nodes[i + 1:]:
+                        del position[w]
+                    del arcs[i:]
+                    del nodes[i + 1:]
+                    u = v
+                    continue
+
+                arcs.append(a)
+                position[v] = len(nodes)
+                nodes.append(v)
+                u = v
+
+            pushed = min(flow[a >> 1] for a in arcs)
+            for a in arcs:
+                flow[a >> 1] -= pushed
+            yield (nodes[:-1] if virtual else nodes), pushed
+
+    def _bfs_levels(self, s, t):
+        level = [-1] * self.num_nodes
+        level[s] = 0
+        queue = [s]
+        head, cap, ptr, adj = self.res_head, self.res_cap, self.adj_ptr, self.adj_arc
+        for u in queue:
+            # Nodes at or past the sink's level cannot lie on a shortest augmenting path
+            if level[t] >= 0 and level[u] >= level[t]:
+                break
+            for i in range(ptr[u], ptr[u + 1]):
+                a = adj[i]
+                v = head[a]
+                if cap[a] > 0 and level[v] < 0:
+                    level[v] = level[u] + 1
+                    queue.append(v)
+        return level if level[t] >= 0 else None
+
+    def _blocking_flow(self, s, t, level):
+        head, cap, ptr, adj = self.res_head, self.res_cap, self.adj_ptr, self.adj_arc
+        gained = self.gained
+        it = ptr[:-1]
+        total = 0
+        path = []
+        u = s
+        while True:
+            if u == t:
+                pushed = min(cap[a] for a in path)
+                for a in path:
+                    cap[a] -= pushed
+                    cap[a ^ 1] += pushed
+                if gained is not None:
+                    gained.extend(a ^ 1 for a in path)
+                total += pushed
+                path = []
+                u = s
+                continue
+
+            end = ptr[u + 1]
+            while it[u] < end:
+                a = adj[it[u]]
+                v = head[a]
+                if cap[a] > 0 and level[v] == level[u] + 1:
+                    break
+                it[u] += 1
+            else:
+                # Dead end: prune u from the level graph and retreat
+                if not path:
+                    return total
+                level[u] = -1
+                a = path.pop()
+                u = head[a ^ 1]
+                it[u] += 1
+                continue
+
+            path.append(a)
+            u = v
+
+    def push(self, s, t, amount, max_nodes=None):
+        """
+        Push flow from s to t along shortest residual paths
+
+        Each search stops as soon as it reaches t, so rerouting flow between
+        nearby nodes only visits their neighbourhood.
+
+        Args:
+            s (int): Node index to push from
+            t (int): Node index to push to
+            amount: Most flow to push
+            max_nodes (int): Give up once a search has visited this many nodes
+
+        Returns:
+            Amount of flow pushed
+        """
+        head, cap, ptr, adj = self.res_head, self.res_cap, self.adj_ptr, self.adj_arc
+        gained = self.gained
+        total = 0
+        while total < amount - self.eps:
+            parent = {s: -1}
+            queue = [s]
+            for u in queue:
+                for i in range(ptr[u], ptr[u + 1]):
+                    a = adj[i]
+                    v = head[a]
+                    if cap[a] > 0 and v not in parent:
+                        parent[v] = a
+                        queue.append(v)
+                if t in parent or (max_nodes is not None and len(queue) >= max_nodes):
+                    break
+            if t not in parent:
+                return total
+
+            path = []
+            v = t
+            while v != s:
+                a = parent[v]
+                path.append(a)
+                v = head[a ^ 1]
+            pushed = min(min(cap[a] for a in path), amount - total)
+            for a in path:
+                cap[a] -= pushed
+                cap[a ^ 1] += pushed
+            if gained is not None:
+                gained.extend(a ^ 1 for a in path)
+            total += pushed
+        return total
+
+    def withdraw(self, start, end, amount, upstream):
+        """
+        Remove flow along flow-carrying paths between start and end
+
+        Follows arcs that carry flow into start back to end (upstream) or
+        arcs that carry flow out of start on to end (downstream), so only
+        the part of the network the flow passes through is visited. Flow
+        circulations met on the way are cancelled.
+
+        Args:
+            start (int): Node index the walk starts from
+            end (int): Node index the walk ends at (the source or the sink)
+            amount: How much flow to remove
+            upstream (bool): Walk against the flow instead of along it
+
+        Returns:
+            Amount of flow removed
+        """
+        head, cap, ptr, adj = self.res_head, self.res_cap, self.adj_ptr, self.adj_arc
+        eps = self.eps
+        gained = self.gained
+        # Upstream walks the backward halves of arcs into a node, downstream
+        # the forward halves of arcs out of it; cap[b] is the flow either way
+        parity = 1 if upstream else 0
+        it = {}
+        total = 0
+        while total < amount - eps:
+            arcs = []
+            nodes = [start]
+            position = {start: 0}
+            u = start
+            while u != end:
+                i = it.get(u, ptr[u])
+                stop = ptr[u + 1]
+                while i < stop:
+                    a = adj[i]
+                    if a & 1 == parity and cap[a ^ (1 - parity)] > eps:
+                        break
+                    i += 1
+                it[u] = i
+                if i == stop:
+                    if not arcs:
+                        return total
+                    arcs.pop()
+                    del position[nodes.pop()]
+                    u = nodes[-1]
+                    it[u] += 1
+                    continue
+
+                v = head[a]
+                b = a ^ (1 - parity)
+                if v in position:
+                    # Circulation: cancel it and cut the walk back to v
+                    k = position[v]
+                    cycle = arcs[k:] + [b]
+                    pushed = min(cap[c] for c in cycle)
+                    for c in cycle:
+                        cap[c] -= pushed
+                        cap[c ^ 1] += pushed
+                    if gained is not None:
+                        gained.extend(c ^ 1 for c in cycle)
+                    for w in nodes[k + 1:]:
+                        del position[w]
+                    del arcs[k:]
+                    del nodes[k + 1:]
+                    u = v
+                    continue
+
+                arcs.append(b)
+                position[v] = len(nodes)
+                nodes.append(v)
+                u = v
+
+            pushed = min(min(cap[b] for b in arcs), amount - total)
+            for b in arcs:
+                cap[b] -= pushed
+                cap[b ^ 1] += pushed
+            if gained is not None:
+                gained.extend(b ^ 1 for b in arcs)
+            total += pushed
+        return total
+
+    def max_flow(self, s, on_phase=None):
+        """
+        Run Dinic's algorithm from s to the network sink and return the flow value
+
+        on_phase, if given, is called before every phase with the phase number.
+        """
+        t = self.sink
+        total = 0
+        phase = 0
+        while True:
+            if on_phase is not None:
+                on_phase(phase)
+            level = self._bfs_levels(s, t)
+            if level is None:
+                return total
+            total += self._blocking_flow(s, t, level)
+            phase += 1
+
+    def flow_value(self):
+        """Net flow currently entering the network sink"""
+        cap = self.res_cap
+        t = self.sink
+        total = 0
+        for i in range(self.adj_ptr[t], self.adj_ptr[t + 1]):
+            a = self.adj_arc[i]
+            # Odd arcs at t are the backward halves of arcs into t
+            total += cap[a] if a & 1 else -cap[a ^ 1]
+        return total
+
+
+def _networkx_flows(residual, s, engine):
+    """Solve with one of the networkx max-flow engines and return the flow per arc"""
+    import networkx as nx
+    from networkx.algorithms import flow as nx_flow
+
+    flow_func = getattr(nx_flow, NETWORKX_ENGINES[engine])
+    head = residual.res_head
+    cap = residual.res_cap
+    # Interned indices as node labels, so the virtual super sink cannot collide
+    G = nx.DiGraph()
+    G.add_nodes_from(range(residual.num_nodes))
+    G.add_edges_from(
+        (head[2 * k + 1], head[2 * k], {'capacity': cap[2 * k]})
+        for k in range(residual.num_res_arcs)
+    )
+    _, flow_dict = nx.maximum_flow(G, s, residual.sink, capacity='capacity', flow_func=flow_func)
+    return [flow_dict[head[2 * k + 1]][head[2 * k]] for k in range(residual.num_res_arcs)]
+
+
+# Engines besides the native Dinic implementation, by networkx flow function name
+NETWORKX_ENGINES = {
+    'edmonds_karp': 'edmonds_karp',
+    'preflow_push': 'preflow_push',
+    'push_relabel': 'preflow_push',
+    'boykov_kolmogorov': 'boykov_kolmogorov',
+    'shortest_augmenting_path': 'shortest_augmenting_path',
+    'dinitz': 'dinitz'
+}
+MAX_FLOW_ENGINES = ('dinic',) + tuple(NETWORKX_ENGINES)
+
+# How far a what-if edit searches for a detour around a throttled pipe
+# before withdrawing its flow instead
+DETOUR_SEARCH_NODES = 4096
+
+
+def solve_max_flow(graph, source, sink, engine='dinic'):
     """
-    Implementation of Ford-Fulkerson algorithm using NetworkX
-    
+    Solve max-flow and keep the residual network
+
     Args:
-        graph (dict): Graph representation
+        graph (CompiledGraph or dict): Graph representation
         source (str): Source node ID
         sink (str): Sink node ID or list of sink nodes
-        
+        engine (str): 'dinic' (native, on the CSR arrays) or one of the
+            networkx engines: edmonds_karp, preflow_push (push_relabel),
+            boykov_kolmogorov, shortest_augmenting_path, dinitz
+
+    Returns:
+        tuple: (compiled graph, ResidualNetwork, maximum flow value)
+    """
+    if engine not in MAX_FLOW_ENGINES:
+        raise ValueError(f"Unknown max-flow engine {engine}; choose from {', '.join(MAX_FLOW_ENGINES)}")
+
+    G = as_compiled_graph(graph)
+    sinks = sink if isinstance(sink, list) else [sink]
+
+    s = G.node_index(source)
+    targets = [G.node_index(t) for t in sinks]
+    if s in targets:
+        raise ValueError("Source and sink must be different nodes")
+
+    residual = ResidualNetwork(G, targets)
+    if engine == 'dinic':
+        def on_phase(phase):
+            checkpoint(message=f"Dinic phase {phase + 1}")
+        return G, residual, residual.max_flow(s, on_phase=on_phase)
+
+    flows = _networkx_flows(residual, s, engine)
+    residual.set_flows(flows)
+    t = residual.sink
+    head = residual.res_head
+    value = sum(f for k, f in enumerate(flows) if head[2 * k] == t) - sum(
+        f for k, f in enumerate(flows) if head[2 * k + 1] == t
+    )
+    return G, residual, value
+
+
+def iter_flow_paths(G, residual, source):
+    """Yield the source -> sink paths of a solved flow, with the flow each carries"""
+    node_ids = G.node_ids
+    for nodes, flow in residual.decompose(G.node_index(source)):
+        yield {
+            "path": [node_ids[u] for u in nodes],
+            "flow": flow
+        }
+
+
+def ford_fulkerson(graph, source, sink, engine='dinic'):
+    """
+    Maximum flow by augmenting paths (Dinic's variant of Ford-Fulkerson)
+
+    Runs directly on the CSR arrays of the compiled graph, unless another
+    engine is chosen. The flow is decomposed into complete source -> sink
+    paths.
+
+    Args:
+        graph (CompiledGraph or dict): Graph representation
+        source (str): Source node ID
+        sink (str): Sink node ID or list of sink nodes
+        engine (str): Max-flow engine, see solve_max_flow
+
     Returns:
         tuple: (maximum flow value, flow paths)
     """
-    # Convert our graph format to NetworkX DiGraph
-    G = nx.DiGraph()
-    for u in graph:
-        for v in graph[u]:
-            G.add_edge(u, v, capacity=graph[u][v]['capacity'])
-    
-    # If sink is a list, use super sink approach
-    if isinstance(sink, list):
-        G = add_super_sink(G, sink)
-        sink = "SuperSink"
-    
-    # Run max flow algorithm
-    flow_value, flow_dict = nx.maximum_flow(G, source, sink, capacity='capacity')
-    
-    # Format the output
-    flow_paths = []
-    for u in flow_dict:
-        for v in flow_dict[u]:
-            if flow_dict[u][v] > 0:
-                # For simplicity, just add the direct edges with flow
-                # In a real implementation, you'd want to trace complete paths
-                flow_paths.append({
-                    "path": [u, v],
-                    "flow": flow_dict[u][v]
-                })
-    
-    return flow_value, flow_paths
+    G, residual, flow_value = solve_max_flow(graph, source, sink, engine)
+    return flow_value, list(iter_flow_paths(G, residual, source))
+
+
+class MaxFlowSession:
+    """
+    Solved max-flow kept warm for what-if capacity edits
+
+    The residual network of the last solve is kept, and capacity changes
+    are applied to it in place. Flow above a reduced capacity is rerouted
+    through a nearby detour where one exists, and otherwise withdrawn along
+    the paths that carry it, back to the source and on to the sink.
+    The set of nodes reachable from the source (the source side of the
+    minimum cut) is maintained, and the network is only searched for new
+    augmenting paths (extra capacity, or a detour around a throttled pipe)
+    once that set grows to include the sink.
+    """
+
+    def __init__(self, graph, source, sink, engine='dinic'):
+        G, residual, value = solve_max_flow(graph, source, sink, engine)
+        self.graph = G
+        self.residual = residual
+        self.source = source
+        self.sink = sink
+        self.base_value = value
+        self.value = value
+        self.overrides = {}
+        self._s = G.node_index(source)
+        self._lock = threading.Lock()
+        self._source_side = self._reachable()
+        # Arc pairs modified since the last snapshot or restore (None: all of them)
+        self._snapshot = None
+        self._dirty = None
+
+    def arcs(self, source, target, directed=False):
+        """Arc indices of the pipe source -> target (and its reverse unless directed)"""
+        G = self.graph
+        u, v = G.node_index(source), G.node_index(target)
+        arcs = [e for e in (G.find_arc(u, v), -1 if directed else G.find_arc(v, u)) if e >= 0]
+        if not arcs:
+            raise ValueError(f"No edge from {source} to {target}")
+        return arcs
+
+    def capacity(self, e):
+        """Capacity currently assigned to arc e"""
+        return self.residual.res_cap[2 * e] + self.residual.res_cap[2 * e + 1]
+
+    def what_if(self, capacities):
+        """
+        Maximum flow with some arc capacities replaced
+
+        Every call is relative to the original network: arcs changed by an
+        earlier call but missing from this one are restored first. Only the
+        arcs whose capacity actually differs are touched.
+
+        Args:
+            capacities (dict): arc index -> capacity
+
+        Returns:
+            Maximum flow value under the edited capacities
+        """
+        if any(c < 0 for c in capacities.values()):
+            raise ValueError("Capacities must be non-negative")
+        with self._lock:
+            return self._what_if(capacities)
+
+    def what_if_report(self, capacities, include_paths=False):
+        """
+        Like what_if, but also report the state it produced
+
+        The session is shared between requests, so everything is read under
+        the same lock hold as the solve; reading overrides or flow paths
+        after what_if returns could see another caller's edit.
+
+        Args:
+            capacities (dict): arc index -> capacity
+            include_paths (bool): Whether to decompose the flow into paths
+
+        Returns:
+            dict: value, changed (number of arcs off their original
+                  capacity) and, if asked for, paths
+        """
+        if any(c < 0 for c in capacities.values()):
+            raise ValueError("Capacities must be non-negative")
+        with self._lock:
+            report = {'value': self._what_if(capacities), 'changed': len(self.overrides)}
+            if include_paths:
+                report['paths'] = list(iter_flow_paths(self.graph, self.residual, self.source))
+            return report
+
+    def _what_if(self, capacities):
+        base = self.graph.capacity
+        targets = {e: base[e].item() for e in self.overrides if e not in capacities}
+        targets.update(capacities)
+        self._apply(targets)
+        self.overrides = {e: c for e, c in capacities.items() if c != base[e]}
+        return self.value
+
+    def snapshot(self):
+        """Copy of the current flow state, for restore()"""
+        residual = self.residual
+        with self._lock:
+            state = (
+                list(residual.res_cap), bytes(self._source_side), self.value,
+                dict(self.overrides), residual.integral, residual.eps
+            )
+            self._snapshot, self._dirty = state, set()
+            return state
+
+    def restore(self, state):
+        """
+        Return to a state taken by snapshot()
+
+        Restoring the most recent snapshot or restore point again only
+        copies back the arcs modified since, so repeated what-if runs from
+        one base solution stay cheap.
+        """
+        residual = self.residual
+        cap, inside, value, overrides, integral, eps = state
+        with self._lock:
+            if state is self._snapshot and self._dirty is not None:
+                res_cap = residual.res_cap
+                for k in self._dirty:
+                    res_cap[2 * k] = cap[2 * k]
+                    res_cap[2 * k + 1] = cap[2 * k + 1]
+            else:
+                residual.res_cap[:] = cap
+            self._source_side[:] = inside
+            self.value = value
+            self.overrides = dict(overrides)
+            residual.integral, residual.eps = integral, eps
+            self._snapshot, self._dirty = state, set()
+
+    def __getstate__(self):
+        # Locks cannot be pickled, e.g. when handed to spawned worker processes
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def flow_paths(self):
+        """Source -> sink paths of the current flow"""
+        with self._lock:
+            return list(iter_flow_paths(self.graph, self.residual, self.source))
+
+    def _apply(self, capacities):
+        residual = self.residual
+        cap, head = residual.res_cap, residual.res_head
+        s, t = self._s, residual.sink
+        inside = self._source_side
+        residual.gained = gained = []
+        stale = False
+        try:
+            for e, capacity in capacities.items():
+                capacity = self._exact(capacity)
+                a = 2 * e
+                flow = cap[a + 1]
+                gained.append(a)
+                if capacity > cap[a] + flow:
+                    self._widen_sink(head[a], capacity - cap[a] - flow)
+                if stale:
+                    cap[a], cap[a + 1] = capacity, 0
+                    continue
+                if capacity >= flow:
+                    cap[a] = capacity - flow
+                    continue
+
+                # Flow above the new capacity leaves an excess at the tail
+                # and a deficit at the head
+                u, v = head[a + 1], head[a]
+                cap[a], cap[a + 1] = 0, capacity
+                excess = flow - capacity
+                # Try a nearby detour first; none exists when the arc crosses the cut
+                if not (inside[u] and not inside[v]):
+                    excess -= residual.push(u, v, excess, max_nodes=DETOUR_SEARCH_NODES)
+                if excess > residual.eps:
+                    cancelled = residual.withdraw(u, s, excess, upstream=True) if u != s else excess
+                    returned = residual.withdraw(v, t, excess, upstream=False) if v != t else excess
+                    # Rounding left flow behind: fall back to a full solve
+                    stale = min(cancelled, returned) < excess - residual.eps
+
+            if stale:
+                self._resolve()
+            elif self._extend_source_side(gained):
+                residual.max_flow(s)
+                self._source_side = self._reachable()
+            self.value = residual.flow_value()
+        finally:
+            residual.gained = None
+            if self._dirty is not None:
+                self._dirty.update(a >> 1 for a in gained)
+
+    def _exact(self, capacity):
+        """Keep integral networks in exact integers, leave them on a fractional edit"""
+        residual = self.residual
+        if residual.integral and float(capacity).is_integer():
+            return int(capacity)
+        if residual.integral:
+            residual.integral = False
+            residual.eps = 1e-9 * max(1.0, float(capacity), float(self.graph.capacity.max(initial=0)))
+        return float(capacity)
+
+    def _widen_sink(self, node, amount):
+        """Grow the virtual sink arc of a sink whose inflow capacity grows"""
+        residual = self.residual
+        if residual.sink != self.graph.num_nodes or node not in residual.sinks:
+            return
+        a = 2 * (residual.num_arcs + residual.sinks.index(node))
+        residual.res_cap[a] += amount
+        residual.gained.append(a)
+
+    def _resolve(self):
+        """Solve from scratch on the current capacities"""
+        residual = self.residual
+        residual.set_flows([0] * residual.num_res_arcs)
+        residual.max_flow(self._s)
+        self._source_side = self._reachable()
+        self._dirty = None
+
+    def _reachable(self):
+        """Nodes reachable from the source in the residual network"""
+        inside = bytearray(self.residual.num_nodes)
+        inside[self._s] = True
+        self._grow(inside, [self._s])
+        return inside
+
+    def _extend_source_side(self, arcs):
+        """
+        Grow the reachable set across arcs that gained residual capacity
+
+        The set may keep nodes that are no longer reachable, but it stays
+        closed under residual arcs, so the flow is still maximum whenever
+        the sink is outside it.
+
+        Returns:
+            bool: Whether the sink became reachable
+        """
+        inside = self._source_side
+        head, cap = self.residual.res_head, self.residual.res_cap
+        frontier = []
+        for a in arcs:
+            v = head[a]
+            if cap[a] > 0 and inside[head[a ^ 1]] and not inside[v]:
+                inside[v] = True
+                frontier.append(v)
+        self._grow(inside, frontier, stop=self.residual.sink)
+        return inside[self.residual.sink]
+
+    def _grow(self, inside, queue, stop=None):
+        head, cap, ptr, adj = (
+            self.residual.res_head, self.residual.res_cap, self.residual.adj_ptr, self.residual.adj_arc
+        )
+        for u in queue:
+            for i in range(ptr[u], ptr[u + 1]):
+                a = adj[i]
+                v = head[a]
+                if cap[a] > 0 and not inside[v]:
+                    inside[v] = True
+                    queue.append(v)
+            if stop is not None and inside[stop]:
+                return
@@ -0,0 +1,278 @@
+import math
+
+import numpy as np
+
+from utils.compiled_graph import as_compiled_graph
+from utils.job_queue import checkpoint
+
+
+def network_simplex(num_nodes, tail, head, capacity, cost, supply):
+    """
+    Primal network simplex for minimum-cost flow
+
+    Starts from a tree of artificial arcs between every node and an extra
+    root, priced at a cost larger than any path. Pricing is vectorized: a
+    block of arcs is scanned at once and its most violated arcs become a
+    short candidate list that the following pivots draw from. Leaving arcs
+    are chosen to keep the tree strongly feasible, which rules out cycling
+    on degenerate pivots. Integral data is solved in exact integers.
+
+    Supplies need not balance: whatever cannot be routed stays on the
+    artificial arcs, so the result delivers as much as possible and, among
+    those flows, costs the least.
+
+    Args:
+        num_nodes (int): Number of nodes
+        tail, head (array): Arc endpoints
+        capacity (array): Arc capacities (may be inf)
+        cost (array): Arc costs per unit of flow
+        supply (array): Net supply per node (negative for demand)
+
+    Returns:
+        list: Flow on every arc
+    """
+    n = num_nodes
+    root = n
+    capacity = np.asarray(capacity, dtype=np.float64)
+    cost = np.asarray(cost, dtype=np.float64)
+    supply = np.asarray(supply, dtype=np.float64)
+    m = len(capacity)
+    integral = all(_is_integral(values) for values in (capacity, cost, supply))
+    number = int if integral else float
+
+    # Dearer than routing a unit along any simple path
+    big = number(1 + (n + 1) * np.abs(cost).max(initial=0))
+    nodes = np.arange(n)
+    out = supply > 0
+    tails = np.concatenate([tail, np.where(out, nodes, root)]).astype(np.int64)
+    heads = np.concatenate([head, np.where(out, root, nodes)]).astype(np.int64)
+    # Flow the root sends out stands for unmet demand, so it must never
+    # pass through a node on to another: arcs to nodes without supply or
+    # demand cost more than any path onward could save, and arcs to demand
+    # nodes are capped at their demand
+    detour = number(1 + (n + 1) * max(0, -cost.min(initial=0)))
+    artificial = np.where(supply == 0, big + detour, big)
+    costs = np.concatenate([cost, artificial]).astype(np.int64 if integral else np.float64)
+    cap = [x if math.isinf(x) else number(x) for x in capacity.tolist()]
+    cap += [number(-b) if b < 0 else math.inf for b in supply.tolist()]
+    flow = [number(0)] * m + [number(abs(b)) for b in supply.tolist()]
+
+    # Zero-flow tree arcs point away from the root (strong feasibility)
+    pi = np.append(np.where(out, artificial, -artificial), 0).astype(costs.dtype)
+    parent = [root] * n + [-1]
+    parent_arc = list(range(m, m + n)) + [-1]
+    depth = [1] * n + [0]
+    children = [set() for _ in range(n + 1)]
+    children[root] = set(range(n))
+
+    # +1 at the lower bound, -1 at the upper bound, 0 for tree arcs and
+    # arcs that can never carry flow
+    sign = np.ones(m + n, dtype=np.int8)
+    sign[:m][capacity == 0] = 0
+    sign[m:] = 0
+
+    tail_list = tails.tolist()
+    head_list = heads.tolist()
+    total = m + n
+    block = min(total, max(16384, 4 * int(math.sqrt(total))))
+    width = max(8, int(math.sqrt(total)) // 4)
+    eps = 0 if integral else 1e-12 * big
+    position = 0
+    pivots = 0
+
+    while True:
+        checkpoint(message=f"{pivots} simplex pivots")
+        candidates = None
+        scanned = 0
+        while scanned < total:
+            stop = min(position + block, total)
+            window = slice(position, stop)
+            violation = sign[window] * (pi[tails[window]] - pi[heads[window]] - costs[window])
+            hits = np.flatnonzero(violation > eps)
+            scanned += stop - position
+            position = stop % total
+            if len(hits):
+                if len(hits) > width:
+                    hits = hits[np.argpartition(violation[hits], -width)[-width:]]
+                candidates = hits + window.start
+                break
+        if candidates is None:
+            return flow[:m]
+
+        # Minor iterations: keep pivoting on the candidates while they pay off
+        candidate_tails = tails[candidates]
+        candidate_heads = heads[candidates]
+        candidate_costs = costs[candidates]
+        for _ in range(len(candidates)):
+            violation = sign[candidates] * (pi[candidate_tails] - pi[candidate_heads] - candidate_costs)
+            best = int(np.argmax(violation))
+            if violation[best] <= eps:
+                break
+            entering = int(candidates[best])
+            pivots += 1
+
+            # Push along the entering arc from i to j: forward when it sits
+            # at its lower bound, backward when it sits at its upper bound
+            if sign[entering] > 0:
+                i, j = tail_list[entering], head_list[entering]
+            else:
+                i, j = head_list[entering], tail_list[entering]
+
+            # The cycle runs from the apex down to i, across and up from j,
+            # and its last blocking arc leaves the tree. Climbing from i and
+            # j to the apex finds the blocking arc of each side on the way:
+            # the one nearest i on the i side, nearest the apex on the j side
+            room_i = room_j = math.inf
+            leave_i = leave_j = -1
+            a, b = i, j
+            while a != b:
+                depth_a, depth_b = depth[a], depth[b]
+                if depth_a >= depth_b:
+                    e = parent_arc[a]
+                    room = cap[e] - flow[e] if head_list[e] == a else flow[e]
+                    if room < room_i:
+                        room_i, leave_i = room, a
+                    a = parent[a]
+                if depth_b >= depth_a:
+                    e = parent_arc[b]
+                    room = cap[e] - flow[e] if tail_list[e] == b else flow[e]
+                    if room <= room_j:
+                        room_j, leave_j = room, b
+                    b = parent[b]
+            apex = a
+            forward = tail_list[entering] == i
+            room_e = cap[entering] - flow[entering] if forward else flow[entering]
+
+            delta = min(room_i, room_e, room_j)
+            if math.isinf(delta):
+                raise ValueError("Minimum-cost flow is unbounded (negative-cost cycle without capacity)")
+            if room_j == delta:
+                leaving = (parent_arc[leave_j], leave_j, False)
+            elif room_e == delta:
+                leaving = (entering, -1, False)
+            else:
+                leaving = (parent_arc[leave_i], leave_i, True)
+
+            if delta:
+                flow[entering] += delta if forward else -delta
+                x = i
+                while x != apex:
+                    e = parent_arc[x]
+                    flow[e] += delta if head_list[e] == x else -delta
+                    x = parent[x]
+                x = j
+                while x != apex:
+                    e = parent_arc[x]
+                    flow[e] += delta if tail_list[e] == x else -delta
+                    x = parent[x]
+
+            e_out, q, on_i_side = leaving
+            if e_out == entering:
+                sign[entering] = 1 if flow[entering] == 0 else -1
+                continue
+            sign[entering] = 0
+            sign[e_out] = 1 if flow[e_out] == 0 else -1
+
+            # Re-hang the subtree cut off by the leaving arc below the entering arc
+            x0, p0 = (i, j) if on_i_side else (j, i)
+            rc = (costs[entering] - pi[tail_list[entering]] + pi[head_list[entering]]).item()
+            shift = rc if tail_list[entering] == x0 else -rc
+
+            x, new_parent, new_arc = x0, p0, entering
+            while True:
+                old_parent, old_arc = parent[x], parent_arc[x]
+                children[old_parent].discard(x)
+                parent[x], parent_arc[x] = new_parent, new_arc
+                children[new_parent].add(x)
+                if x == q:
+                    break
+                x, new_parent, new_arc = old_parent, x, old_arc
+
+            subtree = [x0]
+            for u in subtree:
+                depth[u] = depth[parent[u]] + 1
+                subtree.extend(children[u])
+            pi[subtree] += shift
+
+
+def _is_integral(values):
+    finite = values[np.isfinite(values)]
+    return np.array_equal(finite, np.round(finite))
+
+
+def _number(x):
+    """Plain int when the value is integral, else float"""
+    x = float(x)
+    return int(x) if x.is_integer() else x
+
+
+def min_cost_flow(graph, supplies=None, demands=None):
+    """
+    Minimum-cost dispatch from all reservoirs to all consumers
+
+    A virtual super source feeds every reservoir through an arc whose
+    capacity is the reservoir's output, so the network itself is never
+    copied. Consumers that cannot be fully served are reported rather than
+    failing the whole plan.
+
+    Args:
+        graph (CompiledGraph or dict): Graph representation
+        supplies (dict): Optional node ID -> reservoir capacity, overriding graph.supply
+        demands (dict): Optional node ID -> consumer demand, overriding graph.demand
+
+    Returns:
+        dict: Total cost, delivered and demanded volume, per-consumer unmet
+              demand, per-reservoir output and the flow on every used pipe
+    """
+    G = as_compiled_graph(graph)
+    n = G.num_nodes
+    supply = G.supply.copy()
+    demand = G.demand.copy()
+    for values, overrides in ((supply, supplies), (demand, demands)):
+        for node_id, amount in (overrides or {}).items():
+            if amount < 0:
+                raise ValueError(f"Supply and demand must be non-negative, got {amount} at {node_id}")
+            values[G.node_index(node_id)] = amount
+
+    reservoirs = np.flatnonzero(supply > 0)
+    tails = G.arc_sources()
+    m = len(tails)
+    S = n
+    tail = np.concatenate([tails, np.full(len(reservoirs), S)])
+    head = np.concatenate([G.indices, reservoirs])
+    capacity = np.concatenate([G.capacity, supply[reservoirs]])
+    cost = np.concatenate([G.cost, np.zeros(len(reservoirs))])
+    if (capacity < 0).any():
+        raise ValueError("Pipe capacities must be non-negative")
+
+    b = np.append(-demand, demand.sum())
+    flow = network_simplex(n + 1, tail, head, capacity, cost, b)
+
+    real = np.asarray(flow[:m], dtype=np.float64)
+    inflow = np.bincount(G.indices, weights=real, minlength=n) - np.bincount(tails, weights=real, minlength=n)
+    # Water fed to a reservoir by the super source counts as inflow too
+    fed = np.zeros(n)
+    fed[reservoirs] = flow[m:]
+    unmet = demand - (inflow + fed)
+    unmet[np.abs(unmet) < 1e-9 * max(1.0, demand.max(initial=0))] = 0
+
+    node_ids = G.node_ids
+    used = np.flatnonzero(real > 0)
+    delivered = float(demand.sum() - unmet.sum())
+    return {
+        "totalCost": _number(np.dot(real, G.cost)),
+        "delivered": _number(delivered),
+        "totalDemand": _number(demand.sum()),
+        "feasible": not (unmet > 0).any(),
+        "unmetDemand": {node_ids[v]: _number(unmet[v]) for v in np.flatnonzero(unmet > 0).tolist()},
+        "reservoirOutput": {node_ids[v]: _number(f) for v, f in zip(reservoirs.tolist(), flow[m:])},
+        "flows": [
+            {
+                "source": node_ids[tails[e]],
+                "target": node_ids[G.indices[e]],
+                "flow": _number(real[e]),
+                "cost": _number(real[e] * G.cost[e])
+            }
+            for e in used.tolist()
+        ]
+    }
@@ -1,63 +1,124 @@
-import networkx as nx
+import heapq
+
+import numpy as np
+
+from utils.compiled_graph import as_compiled_graph
+
 
 def convert_to_undirected(graph):
-    """Convert directed graph to undirected for MST algorithms"""
-    G_undirected = nx.Graph()
-    
-    for u in graph:
-        for v in graph[u]:
-            # Avoid adding duplicate edges (since it's undirected)
-            if G_undirected.has_edge(u, v):
-                continue
-            # Use 'cost' as the edge weight, default to 1 if missing
-            G_undirected.add_edge(u, v, weight=graph[u][v].get('cost', 1))
-    
-    return G_undirected
+    """
+    Collapse the arcs of a compiled graph into undirected pipes for MST algorithms
+
+    Each unordered node pair keeps the cost of the first arc seen in CSR
+    order, like the old has_edge check did.
+
+    Returns:
+        tuple: (u array, v array, cost array) of undirected edges
+    """
+    G = as_compiled_graph(graph)
+    src = G.arc_sources()
+    dst = G.indices
+    # Self-loops never belong to a spanning tree
+    keep = src != dst
+    src, dst, cost = src[keep], dst[keep], G.cost[keep]
+
+    lo = np.minimum(src, dst)
+    hi = np.maximum(src, dst)
+    _, first = np.unique(lo * G.num_nodes + hi, return_index=True)
+    first.sort()
+    return src[first], dst[first], cost[first]
+
+
+def _format_tree(G, tree_u, tree_v, tree_cost):
+    """Translate interned MST edges back to node IDs"""
+    node_ids = G.node_ids
+    mst_edges = [(node_ids[u], node_ids[v]) for u, v in zip(tree_u, tree_v)]
+    return mst_edges, sum(tree_cost)
+
 
 def kruskals_algorithm(graph):
     """
     Implementation of Kruskal's algorithm for Minimum Spanning Tree
-    
+
     Args:
-        graph (dict): Graph representation
-        
+        graph (CompiledGraph or dict): Graph representation
+
     Returns:
         tuple: (list of MST edges, total cost)
     """
-    # Convert to undirected graph
-    G_undirected = convert_to_undirected(graph)
-    
-    # Apply Kruskal's algorithm
-    mst = nx.minimum_spanning_tree(G_undirected, weight="weight", algorithm="kruskal")
-    
-    # Calculate total cost
-    total_cost = sum(mst[u][v]['weight'] for u, v in mst.edges())
-    
-    # Return edges and total cost
-    mst_edges = list(mst.edges())
-    
-    return mst_edges, total_cost
+    G = as_compiled_graph(graph)
+    edge_u, edge_v, edge_cost = convert_to_undirected(G)
+
+    # Sort edges by cost once in NumPy, then union-find in plain Python
+    order = np.argsort(edge_cost, kind='stable')
+    parent = list(range(G.num_nodes))
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    tree_u, tree_v, tree_cost = [], [], []
+    for u, v, c in zip(edge_u[order].tolist(), edge_v[order].tolist(), edge_cost[order].tolist()):
+        ru, rv = find(u), find(v)
+        if ru == rv:
+            continue
+        parent[ru] = rv
+        tree_u.append(u)
+        tree_v.append(v)
+        tree_cost.append(c)
+        if len(tree_u) == G.num_nodes - 1:
+            break
+
+    return _format_tree(G, tree_u, tree_v, tree_cost)
+
 
 def prims_algorithm(graph):
     """
     Implementation of Prim's algorithm for Minimum Spanning Tree
-    
+
+    Disconnected networks yield a minimum spanning forest, one tree per component.
+
     Args:
-        graph (dict): Graph representation
-        
+        graph (CompiledGraph or dict): Graph representation
+
     Returns:
         tuple: (list of MST edges, total cost)
     """
-    # Convert to undirected graph
-    G_undirected = convert_to_undirected(graph)
-    
-    # Apply Prim's algorithm
-    mst = nx.minimum_spanning_tree(G_undirected, weight="weight", algorithm="prim")
-    
-    # Calculate total cost
-    total_cost = sum(mst[u][v]['weight'] for u, v in mst.edges())
-    
-    # Return edges and total cost
-    mst_edges = list(mst.edges())
-    
-    return mst_edges, total_cost
+    G = as_compiled_graph(graph)
+    edge_u, edge_v, edge_cost = convert_to_undirected(G)
+    n = G.num_nodes
+
+    # Undirected adjacency as CSR over both directions of every pipe
+    tails = np.concatenate([edge_u, edge_v])
+    heads = np.concatenate([edge_v, edge_u])
+    costs = np.concatenate([edge_cost, edge_cost])
+    order = np.argsort(tails, kind='stable')
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(tails, minlength=n), out=indptr[1:])
+    indptr = indptr.tolist()
+    heads = heads[order].tolist()
+    costs = costs[order].tolist()
+
+    visited = [False] * n
+    tree_u, tree_v, tree_cost = [], [], []
+    for root in range(n):
+        if visited[root]:
+            continue
+        visited[root] = True
+        heap = [(costs[e], root, heads[e]) for e in range(indptr[root], indptr[root + 1])]
+        heapq.heapify(heap)
+        while heap:
+            c, u, v = heapq.heappop(heap)
+            if visited[v]:
+                continue
+            visited[v] = True
+            tree_u.append(u)
+            tree_v.append(v)
+            tree_cost.append(c)
+            for e in range(indptr[v], indptr[v + 1]):
+                if not visited[heads[e]]:
+                    heapq.heappush(heap, (costs[e], v, heads[e]))
+
+    return _format_tree(G, tree_u, tree_v, tree_cost)
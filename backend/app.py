@@ -1,17 +1,188 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, abort, g, make_response, request, jsonify
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-from algorithms.ford_fulkerson import ford_fulkerson
+from algorithms.ford_fulkerson import ford_fulkerson, solve_max_flow, iter_flow_paths, MaxFlowSession
+from algorithms.contingency import contingency_analysis
+from algorithms.min_cost_flow import min_cost_flow
 from algorithms.mst import prims_algorithm, kruskals_algorithm
-from algorithms.dijkstra import dijkstra
-from utils.graph_parser import parse_graph_data
-from utils.network_creator import create_water_network
+from algorithms.dijkstra import (
+    ShortestPathTree, shortest_path_trees, batch_shortest_paths, iter_shortest_paths
+)
+from algorithms.dynamic_mst import DynamicMST
+from algorithms.contraction_hierarchy import ContractionHierarchy
+from algorithms.dynamic_routing import (
+    DynamicRouter, EdgeSensorMap, compile_weighted_graph, replay_sensor_history
+)
+from utils.graph_parser import NPZ_MIMETYPE, is_columnar, parse_graph_data, read_npz_network
+from utils.network_creator import (
+    create_water_network, spatial_network_arrays, spatial_node_ids, iter_spatial_nodes, iter_spatial_edges
+)
+from utils.network_registry import NetworkRegistry, UnknownNetworkError, network_fingerprint
+from utils.result_cache import ResultCache
+from utils.job_queue import JobQueue, UnknownJobError, FINISHED, current_job
+from utils.metrics import metrics, stage, set_endpoint, observe_graph
+from utils.profiler import SamplingProfiler
+from utils.parallel import start_worker_server
+from utils.route_replay import RouteReplay
+from utils.sensor_store import SensorStore, format_timestamps
+from utils.downsampling import bucket_aggregate, lttb_indices
+from utils.streaming import stream_format, stream_response, document_records
+import numpy as np
 import pandas as pd
+import json
 import os
 import math
+import re
+import shutil
+import threading
+import time
+import uuid
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider, timing request decoding and response serialization"""
+
+    def loads(self, s, **kwargs):
+        with stage('decode'):
+            return super().loads(s, **kwargs)
+
+    def dumps(self, obj, **kwargs):
+        with stage('serialize'):
+            return super().dumps(obj, **kwargs)
 
 app = Flask(__name__)
+app.json = TimedJSONProvider(app)
 CORS(app)  # Enable CORS for all routes
 
+# Compiled networks uploaded once and referenced by content-hash ID
+registry = NetworkRegistry(
+    max_bytes=int(os.environ.get('NETWORK_CACHE_BYTES', 256 * 1024 * 1024))
+)
+
+# Memoized algorithm results, dropped when their network leaves the registry
+results = ResultCache(
+    max_entries=int(os.environ.get('RESULT_CACHE_ENTRIES', 1024)),
+    ttl=float(os.environ.get('RESULT_CACHE_TTL', 300))
+)
+registry.add_eviction_listener(results.invalidate)
+
+# Background analyses submitted through /api/jobs
+jobs = JobQueue(
+    max_workers=int(os.environ.get('JOB_WORKERS', 2)),
+    max_finished=int(os.environ.get('JOB_HISTORY', 256))
+)
+
+# Sampling profiler for request threads, switched on through /api/profiler
+profiler = SamplingProfiler(
+    interval=float(os.environ.get('PROFILER_INTERVAL', 0.005)),
+    sample_rate=float(os.environ.get('PROFILER_SAMPLE_RATE', 1.0))
+)
+if os.environ.get('PROFILER_ENABLED') == '1':
+    profiler.configure(enabled=True)
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    set_endpoint(request.endpoint or 'unknown')
+    # Any request can ask to be profiled while the profiler is on
+    g.profiled = profiler.begin(request.endpoint or request.path, force=request.headers.get('X-Profile') == '1')
+
+@app.after_request
+def record_request_latency(response):
+    if 'request_start' in g:
+        metrics.observe(
+            'http_request_duration_seconds', time.perf_counter() - g.request_start,
+            endpoint=request.endpoint or 'unknown', method=request.method, status=response.status_code
+        )
+    return response
+
+@app.teardown_request
+def finish_request(error=None):
+    if g.get('profiled'):
+        profiler.end()
+    set_endpoint(None)
+
+def cache_metrics():
+    """Registry, result cache and job queue state for /metrics"""
+    registry_stats = registry.stats()
+    result_stats = results.stats()
+    job_stats = jobs.stats()
+    with _path_index_lock:
+        indexes = list(_path_indexes.values())
+    return [
+        ('network_registry_lookups_total', 'counter', 'Registered network lookups',
+         [({'result': 'hit'}, registry_stats['hits']), ({'result': 'miss'}, registry_stats['misses'])]),
+        ('network_registry_networks', 'gauge', 'Networks held by the registry', [({}, registry_stats['networks'])]),
+        ('network_registry_bytes', 'gauge', 'Estimated memory held by the registry', [({}, registry_stats['bytes'])]),
+        ('network_registry_evictions_total', 'counter', 'Networks evicted from the registry',
+         [({}, registry_stats['evictions'])]),
+        ('result_cache_lookups_total', 'counter', 'Result cache lookups',
+         [({'result': 'hit'}, result_stats['hits']), ({'result': 'miss'}, result_stats['misses'])]),
+        ('result_cache_hit_ratio', 'gauge', 'Share of result cache lookups that hit', [({}, result_stats['hitRate'])]),
+        ('result_cache_entries', 'gauge', 'Entries in the result cache', [({}, result_stats['entries'])]),
+        ('result_cache_evictions_total', 'counter', 'Results evicted from the cache', [({}, result_stats['evictions'])]),
+        ('shortest_path_index_bytes', 'gauge', 'Estimated memory held by shortest-path indexes',
+         [({}, sum(index.stats['bytes'] for index in indexes))]),
+        ('jobs', 'gauge', 'Background jobs by status',
+         [({'status': status}, count) for status, count in job_stats['jobs'].items()])
+    ]
+
+metrics.add_collector(cache_metrics)
+
+def request_data():
+    """
+    Body of the request, or an empty dict when there is none
+
+    JSON bodies may use either network layout; a body sent as
+    application/x-npz is a columnar network in NumPy's archive format.
+    """
+    if request.mimetype == NPZ_MIMETYPE:
+        try:
+            with stage('decode'):
+                return read_npz_network(request.get_data())
+        except Exception as e:
+            abort(make_response(jsonify({"error": f"Invalid network archive: {e}"}), 400))
+    return request.get_json(silent=True) or {}
+
+def request_param(data, name, default=None):
+    """Read a parameter from the JSON body, falling back to the query string"""
+    if data.get(name) is not None:
+        return data[name]
+    values = request.args.getlist(name)
+    if len(values) > 1:
+        return values
+    return values[0] if values else default
+
+def load_graph(data):
+    """Compiled graph for a request: a registered network ID or an inline network"""
+    network_id = request_param(data, 'networkId')
+    if network_id:
+        graph = registry.get(network_id).graph
+    else:
+        with stage('parse'):
+            graph = parse_graph_data(data)
+    observe_graph(graph)
+    return graph
+
+def cached_result(data, algorithm, params, compute):
+    """
+    Run compute(graph) through the result cache
+
+    The key is the network's content hash (the registry ID, or the hash of
+    an inline network) plus the algorithm parameters, so a hit skips both
+    graph construction and the solve.
+    """
+    network_key = request_param(data, 'networkId')
+    if not network_key:
+        with stage('fingerprint'):
+            network_key = network_fingerprint(data)
+
+    def solve():
+        graph = load_graph(data)
+        with stage('solve'):
+            return compute(graph)
+
+    return results.get_or_compute(network_key, algorithm, params, solve)
+
 # ---------- Root Route ----------
 @app.route('/')
 def home():
@@ -23,183 +194,1249 @@ def health_check():
 
 @app.route('/api/generate-network', methods=['POST'])
 def generate_network():
+    """
+    Generate a random network
+
+    Body: reservoirs, junctions and consumers counts, plus an optional
+    layout: "random" (default) or "spatial" for a planar network laid out
+    in space, which builds million-junction networks in seconds. A seed
+    makes spatial networks reproducible.
+    """
     data = request.json
-    print("Received request with data:", data)  # Debug print
     
     num_reservoirs = data.get('reservoirs', 2)
     num_junctions = data.get('junctions', 5)
     num_consumers = data.get('consumers', 3)
+    layout = data.get('layout', 'random')
     
     try:
-        network = create_water_network(
-            num_reservoirs=num_reservoirs,
-            num_junctions=num_junctions,
-            num_consumers=num_consumers
-        )
-        print("Generated network:", network)  # Debug print
-        return jsonify(network)
+        fmt = stream_format(request)
+        if layout == 'spatial':
+            arrays = spatial_network_arrays(
+                num_reservoirs=num_reservoirs,
+                num_junctions=num_junctions,
+                num_consumers=num_consumers,
+                seed=data.get('seed')
+            )
+            # Records are produced from the arrays as they are sent
+            node_ids = spatial_node_ids(arrays)
+            network = {
+                "nodes": iter_spatial_nodes(arrays, node_ids),
+                "edges": iter_spatial_edges(arrays, node_ids),
+                "source": node_ids[0],
+                "sink": node_ids[-1]
+            }
+        elif layout == 'random':
+            network = create_water_network(
+                num_reservoirs=num_reservoirs,
+                num_junctions=num_junctions,
+                num_consumers=num_consumers
+            )
+        else:
+            raise ValueError(f"Unknown layout '{layout}', expected 'random' or 'spatial'")
+
+        if fmt:
+            return stream_response(document_records(
+                {"source": network["source"], "sink": network["sink"]},
+                [("nodes", network["nodes"]), ("edges", network["edges"])]
+            ), fmt)
+        return jsonify(dict(network, nodes=list(network["nodes"]), edges=list(network["edges"])))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+
+# ---------- Network Registry ----------
+@app.route('/api/networks', methods=['POST'])
+def register_network():
+    """
+    Register a network; pathIndex: true (or SHORTEST_PATH_INDEX=1) also
+    queues a shortest-path index build for it
+    """
+    data = request_data()
+    try:
+        entry, created = registry.register(data)
+        response = entry.describe()
+        wants_index = str(request_param(data, 'pathIndex', os.environ.get('SHORTEST_PATH_INDEX', ''))).lower()
+        if wants_index in ('1', 'true') and get_path_index(entry.network_id) is None:
+            response['pathIndexJob'] = build_path_index(entry.network_id).job_id
+        return jsonify(response), 201 if created else 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/api/networks', methods=['GET'])
+def network_registry_stats():
+    return jsonify(registry.stats())
+
+@app.route('/api/cache', methods=['GET'])
+def cache_stats():
+    return jsonify({
+        "networks": registry.stats(),
+        "results": results.stats()
+    })
+
+@app.route('/api/cache', methods=['DELETE'])
+def clear_result_cache():
+    results.clear()
+    return jsonify(results.stats())
+
+@app.route('/api/networks/<network_id>', methods=['GET'])
+def get_network(network_id):
+    try:
+        return jsonify(registry.get(network_id).describe())
+    except UnknownNetworkError as e:
+        return jsonify({"error": str(e)}), 404
+
+@app.route('/api/networks/<network_id>', methods=['DELETE'])
+def delete_network(network_id):
+    if not registry.remove(network_id):
+        return jsonify({"error": f"Unknown network {network_id}"}), 404
+    return jsonify({"deleted": network_id})
+
+# ---------- Shortest-Path Index ----------
+# Contraction hierarchies of registered networks, for point-to-point queries
+_path_indexes = {}
+_path_index_lock = threading.Lock()
+
+def drop_path_index(network_id):
+    with _path_index_lock:
+        return _path_indexes.pop(network_id, None)
+
+registry.add_eviction_listener(drop_path_index)
+
+def get_path_index(network_id):
+    with _path_index_lock:
+        return _path_indexes.get(network_id)
+
+def build_path_index(network_id):
+    """Queue a background build of a registered network's index; returns the Job"""
+    graph = registry.get(network_id).graph
+
+    def build(job):
+        index = ContractionHierarchy.build(graph)
+        with _path_index_lock:
+            # The network may have been removed while the index was built
+            if network_id in registry:
+                _path_indexes[network_id] = index
+        return dict(index.describe(), networkId=network_id)
+
+    return jobs.submit('path-index', build)
+
+@app.route('/api/networks/<network_id>/path-index', methods=['POST'])
+def create_path_index(network_id):
+    """Build (or rebuild) the network's shortest-path index as a background job"""
+    try:
+        job = build_path_index(network_id)
+        return jsonify(job.describe()), 202
+    except UnknownNetworkError as e:
+        return jsonify({"error": str(e)}), 404
+
+@app.route('/api/networks/<network_id>/path-index', methods=['GET'])
+def get_path_index_stats(network_id):
+    """Size, shortcut count, build time and memory of the network's index"""
+    index = get_path_index(network_id)
+    if index is None:
+        return jsonify({"error": f"Network {network_id} has no shortest-path index"}), 404
+    return jsonify(index.describe())
+
+@app.route('/api/networks/<network_id>/path-index', methods=['DELETE'])
+def delete_path_index(network_id):
+    if drop_path_index(network_id) is None:
+        return jsonify({"error": f"Network {network_id} has no shortest-path index"}), 404
+    return jsonify({"deleted": network_id})
+
+# ---------- Dynamic MST ----------
+# One incrementally maintained spanning forest per registered network
+_mst_engines = {}
+_mst_lock = threading.Lock()
+
+def drop_mst_engine(network_id):
+    with _mst_lock:
+        _mst_engines.pop(network_id, None)
+
+registry.add_eviction_listener(drop_mst_engine)
+
+def get_mst_engine(network_id):
+    """The network's DynamicMST, built on first use"""
+    graph = registry.get(network_id).graph
+    with _mst_lock:
+        engine = _mst_engines.get(network_id)
+        if engine is None:
+            engine = _mst_engines[network_id] = DynamicMST(graph)
+        return engine
+
+def mst_response(engine, changes=None):
+    response = {
+        "mstEdges": engine.edges(),
+        "totalCost": engine.total_cost
+    }
+    if changes is not None:
+        response["changes"] = changes
+    return response
+
+@app.route('/api/networks/<network_id>/mst', methods=['GET'])
+def get_dynamic_mst(network_id):
+    try:
+        return jsonify(mst_response(get_mst_engine(network_id)))
+    except UnknownNetworkError as e:
+        return jsonify({"error": str(e)}), 404
+
+@app.route('/api/networks/<network_id>/mst', methods=['POST'])
+def update_dynamic_mst(network_id):
+    """
+    Apply pipe edits to the network's spanning forest
+
+    Body: {"updates": [{source, target, cost}, ...]} to insert pipes or
+    change their cost, and/or {"removals": [{source, target}, ...]}.
+    Edits accumulate until the forest is reset with DELETE.
+    """
+    data = request_data()
+    try:
+        updates = data.get('updates', [])
+        costs = []
+        for update in updates:
+            # Validate the whole batch before the engine applies any of it
+            try:
+                cost = float(update['cost'])
+            except (TypeError, ValueError):
+                raise ValueError(f"Pipe cost must be a number, got {update['cost']!r}")
+            if not math.isfinite(cost):
+                raise ValueError(f"Pipe cost must be a finite number, got {update['cost']!r}")
+            costs.append(cost)
+
+        engine = get_mst_engine(network_id)
+        added, removed = [], []
+        for update, cost in zip(updates, costs):
+            changes = engine.set_cost(update['source'], update['target'], cost)
+            added += changes['added']
+            removed += changes['removed']
+        for removal in data.get('removals', []):
+            changes = engine.remove(removal['source'], removal['target'])
+            added += changes['added']
+            removed += changes['removed']
+        return jsonify(mst_response(engine, {"added": added, "removed": removed}))
+    except UnknownNetworkError as e:
+        return jsonify({"error": str(e)}), 404
     except Exception as e:
-        print("Error generating network:", str(e))  # Debug print
         return jsonify({"error": str(e)}), 400
 
+@app.route('/api/networks/<network_id>/mst', methods=['DELETE'])
+def reset_dynamic_mst(network_id):
+    """Discard accumulated edits; the next request starts from the registered network"""
+    drop_mst_engine(network_id)
+    return jsonify({"reset": network_id})
+
 
 @app.route('/api/max-flow', methods=['POST'])
 def calculate_max_flow():
-    data = request.json
+    data = request_data()
     try:
-        graph, source, sink = parse_graph_data(data, flow=True)
-        max_flow_value, flow_paths = ford_fulkerson(graph, source, sink)
+        source = request_param(data, 'source')
+        sink = request_param(data, 'sink')
+
+        if not source or not sink:
+            raise ValueError("Flow analysis requires source and sink nodes")
+
+        # Native Dinic by default; networkx engines can be selected
+        engine = request_param(data, 'engine', 'dinic')
+
+        fmt = stream_format(request)
+        if fmt:
+            # Streamed paths are decomposed straight from the residual network
+            graph = load_graph(data)
+            with stage('solve'):
+                G, residual, max_flow_value = solve_max_flow(graph, source, sink, engine)
+            return stream_response(document_records(
+                {"maxFlow": max_flow_value},
+                [("flowPaths", iter_flow_paths(G, residual, source))]
+            ), fmt)
+
+        sink_key = tuple(sink) if isinstance(sink, list) else sink
+        max_flow_value, flow_paths = cached_result(
+            data, 'max-flow', (source, sink_key, engine),
+            lambda graph: ford_fulkerson(graph, source, sink, engine)
+        )
         return jsonify({
             "maxFlow": max_flow_value,
             "flowPaths": flow_paths
         })
+    except UnknownNetworkError as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/api/max-flow/what-if', methods=['POST'])
+def max_flow_what_if():
+    """
+    Maximum flow after editing pipe capacities, warm-started from the cached solve
+
+    Body: the network (networkId or nodes/edges), source, sink and
+    changes: [{source, target, capacity or delta, directed}]. Every call is
+    relative to the original network; undirected changes edit both
+    directions of a pipe.
+    """
+    data = request_data()
+    try:
+        source = request_param(data, 'source')
+        sink = request_param(data, 'sink')
+        if not source or not sink:
+            raise ValueError("Flow analysis requires source and sink nodes")
+
+        sink_key = tuple(sink) if isinstance(sink, list) else sink
+        session = cached_result(
+            data, 'max-flow-session', (source, sink_key),
+            lambda graph: MaxFlowSession(graph, source, sink)
+        )
+
+        base = session.graph.capacity
+        capacities = {}
+        for change in data.get('changes', []):
+            arcs = session.arcs(change['source'], change['target'], change.get('directed', False))
+            for e in arcs:
+                if change.get('capacity') is not None:
+                    capacities[e] = float(change['capacity'])
+                else:
+                    capacities[e] = base[e].item() + float(change.get('delta', 0))
+
+        include_paths = str(request_param(data, 'includePaths', False)).lower() == 'true'
+        with stage('solve'):
+            report = session.what_if_report(capacities, include_paths)
+        response = {
+            "maxFlow": report['value'],
+            "baseMaxFlow": session.base_value,
+            "flowChange": report['value'] - session.base_value,
+            "changedEdges": report['changed']
+        }
+        if include_paths:
+            response["flowPaths"] = report['paths']
+        return jsonify(response)
+    except UnknownNetworkError as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/api/contingency', methods=['POST'])
+def calculate_contingency():
+    """
+    N-1 contingency analysis: the max-flow loss and cut-off consumers of every pipe failure
+
+    Body: the network (networkId or nodes/edges), source, sink, optional
+    consumers (default: the sinks), pipes ([[source, target], ...], default:
+    all) and limit (number of table rows to return).
+    """
+    data = request_data()
+    try:
+        source = request_param(data, 'source')
+        sink = request_param(data, 'sink')
+        if not source or not sink:
+            raise ValueError("Contingency analysis requires source and sink nodes")
+
+        consumers = data.get('consumers')
+        pipes = data.get('pipes')
+        if pipes is not None and not all(isinstance(pipe, list) and len(pipe) == 2 for pipe in pipes):
+            raise ValueError("'pipes' must be a list of [source, target] pairs")
+
+        key = (
+            source,
+            tuple(sink) if isinstance(sink, list) else sink,
+            None if consumers is None else tuple(consumers),
+            None if pipes is None else tuple(map(tuple, pipes))
+        )
+        report = cached_result(
+            data, 'contingency', key,
+            lambda graph: contingency_analysis(graph, source, sink, consumers=consumers, pipes=pipes)
+        )
+
+        table = report["criticality"]
+        limit = request_param(data, 'limit')
+        if limit is not None:
+            table = table[:int(limit)]
+        summary = {k: v for k, v in report.items() if k != "criticality"}
+
+        fmt = stream_format(request)
+        if fmt:
+            return stream_response(document_records(summary, [("criticality", table)]), fmt)
+        return jsonify(dict(summary, criticality=table))
+    except UnknownNetworkError as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+# Networks with more arcs than this are planned as a background job
+MIN_COST_FLOW_SYNC_ARCS = int(os.environ.get('MIN_COST_FLOW_SYNC_ARCS', 60000))
+
+def network_arcs(data):
+    """Arcs in a request's network, counted without compiling an inline one"""
+    network_id = request_param(data, 'networkId')
+    if network_id:
+        return registry.get(network_id).graph.num_edges
+    edges = data.get('edges') or []
+    if is_columnar(data):
+        m = len(edges.get('source', []))
+        directed = np.broadcast_to(np.asarray(edges.get('directed', False), dtype=bool), (m,))
+        return 2 * m - int(directed.sum())
+    return sum(1 if edge.get('directed', False) else 2 for edge in edges)
+
+def job_params(data):
+    """Request body and query string as JSON params for run_analysis"""
+    params = request.args.to_dict()
+    for key, value in data.items():
+        if key in ('nodes', 'edges') and isinstance(value, dict):
+            # Columnar arrays, possibly from a .npz upload
+            value = {column: np.asarray(values).tolist() for column, values in value.items()}
+        params[key] = value
+    return params
+
+@app.route('/api/min-cost-flow', methods=['POST'])
+def calculate_min_cost_flow():
+    """
+    Cheapest dispatch plan meeting every consumer demand from all reservoirs
+
+    Body: the network (networkId or nodes/edges), whose reservoir nodes
+    carry a capacity and consumer nodes a demand. Only nodes of type
+    reservoir or source supply water; a capacity on any other node is
+    ignored. Optional supplies and demands ({nodeId: amount}) override
+    those node attributes, for any node.
+
+    Networks with more than MIN_COST_FLOW_SYNC_ARCS arcs take longer than
+    a request should, so they are queued as a job instead: the response is
+    202 with the job, whose result is the plan (see /api/jobs).
+    """
+    data = request_data()
+    try:
+        supplies = data.get('supplies')
+        demands = data.get('demands')
+        for name, values in (('supplies', supplies), ('demands', demands)):
+            if values is not None and not isinstance(values, dict):
+                raise ValueError(f"'{name}' must map node IDs to amounts")
+
+        key = (
+            None if supplies is None else tuple(sorted(supplies.items())),
+            None if demands is None else tuple(sorted(demands.items()))
+        )
+        if current_job() is None and network_arcs(data) > MIN_COST_FLOW_SYNC_ARCS:
+            params = job_params(data)
+            job = jobs.submit('min-cost-flow', lambda job: run_analysis('min-cost-flow', params))
+            return jsonify(job.describe()), 202
+
+        plan = cached_result(
+            data, 'min-cost-flow', key,
+            lambda graph: min_cost_flow(graph, supplies=supplies, demands=demands)
+        )
+
+        summary = {k: v for k, v in plan.items() if k != "flows"}
+        fmt = stream_format(request)
+        if fmt:
+            return stream_response(document_records(summary, [("flows", plan["flows"])]), fmt)
+        return jsonify(plan)
+    except UnknownNetworkError as e:
+        return jsonify({"error": str(e)}), 404
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
 @app.route('/api/mst', methods=['POST'])
 def calculate_mst():
-    data = request.json
+    data = request_data()
     try:
-        graph = parse_graph_data(data)
-        
         # Default to Prim's algorithm, but allow selection
-        algorithm = request.args.get('algorithm', 'prims')
+        algorithm = request_param(data, 'algorithm', 'prims')
         
         if algorithm == 'kruskals':
-            mst_edges, total_cost = kruskals_algorithm(graph)
+            mst_algorithm = kruskals_algorithm
         else:  # Default to Prim's
-            mst_edges, total_cost = prims_algorithm(graph)
+            algorithm, mst_algorithm = 'prims', prims_algorithm
+
+        mst_edges, total_cost = cached_result(data, 'mst', (algorithm,), mst_algorithm)
+
+        fmt = stream_format(request)
+        if fmt:
+            return stream_response(document_records(
+                {"totalCost": total_cost}, [("mstEdges", mst_edges)]
+            ), fmt)
             
         return jsonify({
             "mstEdges": mst_edges,
             "totalCost": total_cost
         })
+    except UnknownNetworkError as e:
+        return jsonify({"error": str(e)}), 404
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
 @app.route('/api/shortest-path', methods=['POST'])
 def calculate_shortest_path():
-    data = request.json
+    data = request_data()
     try:
-        graph = parse_graph_data(data)
-        source = data.get('source')
-        target = data.get('target')
+        source = request_param(data, 'source')
+        target = request_param(data, 'target')
         
         if not source or not target:
             return jsonify({"error": "Source and target nodes are required"}), 400
+
+        # Indexed networks answer with a bidirectional search of the hierarchy
+        network_id = request_param(data, 'networkId')
+        index = get_path_index(network_id) if network_id else None
+        if index is not None:
+            with stage('solve'):
+                distance, path, _ = index.query(source, target)
+            if distance is None:
+                return jsonify({"error": f"No path exists to target node {target}"}), 404
+            return jsonify({"distance": distance, "path": path})
             
-        distances, paths = dijkstra(graph, source)
+        # The whole single-source tree is cached, so any target reuses it
+        tree = cached_result(
+            data, 'shortest-path', (source,),
+            lambda graph: ShortestPathTree.compute(graph, source)
+        )
         
-        if target not in distances:
+        if not tree.reachable(target):
             return jsonify({"error": f"No path exists to target node {target}"}), 404
             
         return jsonify({
-            "distance": distances[target],
-            "path": paths[target]
+            "distance": tree.distance(target),
+            "path": tree.path(target)
+        })
+    except UnknownNetworkError as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/api/shortest-paths', methods=['POST'])
+def calculate_shortest_paths():
+    """
+    Batch shortest paths: one source with many targets, or many (source, target) pairs
+
+    Runs one Dijkstra pass per distinct source (in parallel, reusing cached
+    trees) and reconstructs paths only for the requested targets.
+    """
+    data = request_data()
+    try:
+        pairs = data.get('pairs')
+        targets = data.get('targets')
+        if pairs is None:
+            source = request_param(data, 'source')
+            if not source:
+                return jsonify({"error": "Provide 'pairs' or a 'source' with optional 'targets'"}), 400
+            sources = [source]
+        else:
+            if not all(isinstance(pair, list) and len(pair) == 2 for pair in pairs):
+                raise ValueError("'pairs' must be a list of [source, target] pairs")
+            sources = [pair[0] for pair in pairs]
+
+        network_key = request_param(data, 'networkId')
+        if not network_key:
+            with stage('fingerprint'):
+                network_key = network_fingerprint(data)
+        trees = {}
+        missing = []
+        for source in dict.fromkeys(sources):
+            tree = results.get(network_key, 'shortest-path', (source,))
+            if tree is None:
+                missing.append(source)
+            else:
+                trees[source] = tree
+
+        if missing:
+            graph = load_graph(data)
+            with stage('solve'):
+                computed = shortest_path_trees(graph, missing)
+            for source, tree in computed.items():
+                results.put(network_key, 'shortest-path', (source,), tree)
+                trees[source] = tree
+
+        if pairs is None:
+            if targets is None:
+                # No targets given: route to every node in the network
+                targets = trees[sources[0]].graph.node_ids
+            pairs = [(sources[0], target) for target in targets]
+
+        include_paths = str(request_param(data, 'includePaths', True)).lower() != 'false'
+        fmt = stream_format(request)
+        if fmt:
+            return stream_response(
+                iter_shortest_paths(trees, pairs, include_paths=include_paths), fmt
+            )
+        return jsonify({
+            "results": batch_shortest_paths(trees, pairs, include_paths=include_paths)
         })
+    except UnknownNetworkError as e:
+        return jsonify({"error": str(e)}), 404
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
 # ---------- Sensor Data Endpoint ----------
+SENSOR_CSV = os.path.join(os.path.dirname(__file__), 'data/Filtered_Data.csv')
+
+_sensor_store = None
+_sensor_store_lock = threading.Lock()
+
+def get_sensor_store():
+    """Columnar sensor store, ingested from the CSV once (and again only if the CSV changes)"""
+    global _sensor_store
+    with _sensor_store_lock:
+        if _sensor_store is None:
+            store_dir = os.environ.get(
+                'SENSOR_STORE_DIR', os.path.join(os.path.dirname(__file__), 'data/sensor_store')
+            )
+            _sensor_store = SensorStore.open(store_dir, SENSOR_CSV)
+        return _sensor_store
+
+SENSOR_COLUMNS = ['Pressure 1', 'Pressure 2', 'Flow rate']
+MAX_SENSOR_PAGE = 10000
+
+def encode_cursor(times, position):
+    """Cursor for row `position`: its timestamp plus its rank among equal timestamps"""
+    first = int(np.searchsorted(times, times[position], side='left'))
+    return f"{int(times[position])}_{position - first}"
+
+def decode_cursor(times, cursor):
+    try:
+        timestamp, offset = (int(part) for part in cursor.split('_'))
+    except ValueError:
+        raise ValueError(f"Invalid cursor {cursor}")
+    position = int(np.searchsorted(times, timestamp, side='left')) + offset
+    # A forged or stale cursor must not become a slice bound silently
+    if offset < 0 or not 0 <= position <= len(times):
+        raise ValueError(f"Invalid cursor {cursor}")
+    return position
+
+def sensor_frame(times, columns):
+    frame = pd.DataFrame(columns)
+    frame.insert(0, 'created_at', format_timestamps(times))
+    return frame
+
+def sensor_records(times, columns):
+    """Rows as JSON-ready dicts, NaN becoming null like DataFrame.to_json"""
+    return json.loads(sensor_frame(times, columns).to_json(orient='records'))
+
+def iter_sensor_rows(times, columns, block=10000):
+    """Yield sensor rows as dicts, converting one block of rows at a time"""
+    for lo in range(0, len(times), block):
+        hi = lo + block
+        stamps = format_timestamps(times[lo:hi])
+        values = {name: np.asarray(column[lo:hi]).tolist() for name, column in columns.items()}
+        for i, stamp in enumerate(stamps):
+            row = {'created_at': stamp}
+            for name, column in values.items():
+                row[name] = column[i]
+            yield row
+
 @app.route('/api/sensor-data', methods=['GET'])
 def get_sensor_data():
-    csv_path = os.path.join(os.path.dirname(__file__), 'data/Filtered_Data.csv')
-    df = pd.read_csv(csv_path)
-    # Only return relevant columns
-    columns = ['created_at', 'Pressure 1', 'Pressure 2', 'Flow rate']
-    filtered = df[columns]
-    return filtered.to_json(orient='records')
+    """
+    Sensor readings, optionally windowed, paginated and downsampled
 
-# ---------- Dynamic Routing Endpoint ----------
-def dynamic_dijkstra(graph, start):
-    import heapq
-    queue = [(0, start)]
-    distances = {node: float('inf') for node in graph}
-    distances[start] = 0
-    previous = {node: None for node in graph}
-    while queue:
-        (dist, current_node) = heapq.heappop(queue)
-        for neighbor, weight in graph[current_node].items():
-            new_distance = dist + weight
-            if new_distance < distances[neighbor]:
-                distances[neighbor] = new_distance
-                previous[neighbor] = current_node
-                heapq.heappush(queue, (new_distance, neighbor))
-    return distances, previous
-
-def compute_dynamic_weights(base_graph, flow, pressure1, pressure2):
-    dynamic_graph = {}
-    factor = (abs(pressure1 - pressure2) + 1) / (flow + 1)
-    for node in base_graph:
-        dynamic_graph[node] = {}
-        for neighbor, base_weight in base_graph[node].items():
-            dynamic_graph[node][neighbor] = base_weight * factor
-    return dynamic_graph
+    Query parameters:
+        start, end: created_at range (inclusive)
+        columns: comma-separated value columns (default pressures and flow rate)
+        limit, cursor: page size and the nextCursor of the previous page
+        downsample: min, max, mean, minmax or lttb, to `points` rows (default
+            1000; lttb needs at least 3)
 
-@app.route('/api/dynamic-routing', methods=['GET'])
-def dynamic_routing():
-    # Example base graph (could be made dynamic if needed)
-    base_graph = {
-        'A': {'B': 4, 'C': 2},
-        'B': {'A': 4, 'C': 1, 'D': 5},
-        'C': {'A': 2, 'B': 1, 'D': 8},
-        'D': {'B': 5, 'C': 8}
-    }
-    
+    Without limit/cursor/downsample the rows are returned as a plain list,
+    as before; otherwise as {"data", "nextCursor", "total"}.
+    """
+    store = get_sensor_store()
+    args = request.args
     try:
-        csv_path = os.path.join(os.path.dirname(__file__), 'data/Filtered_Data.csv')
-        df = pd.read_csv(csv_path)
-        # Use the 10th row as in the notebook
-        sample = df.iloc[10]
-        flow = sample['Flow rate']
-        p1 = sample['Pressure 1']
-        p2 = sample['Pressure 2']
-        
-        # Create dynamic graph with weights
-        dynamic_graph = compute_dynamic_weights(base_graph, flow, p1, p2)
-        distances, _ = dynamic_dijkstra(dynamic_graph, 'A')
-        
-        # Convert to network structure for visualization
-        nodes = []
-        edges = []
-        
-        # Add nodes with positions based on a circular layout
-        num_nodes = len(dynamic_graph)
-        for i, node_id in enumerate(dynamic_graph.keys()):
-            angle = (2 * math.pi * i) / num_nodes
-            x = 50 + 40 * math.cos(angle)  # Center at 50,50 with radius 40
-            y = 50 + 40 * math.sin(angle)
-            node_type = 'source' if node_id == 'A' else 'sink' if node_id == 'D' else 'junction'
-            nodes.append({
-                'id': node_id,
-                'type': node_type,
-                'x': x,
-                'y': y,
-                'distance': round(distances.get(node_id, float('inf')), 2)
+        columns = args.get('columns')
+        columns = [c.strip() for c in columns.split(',') if c.strip()] if columns else SENSOR_COLUMNS
+        rows = store.time_range(args.get('start'), args.get('end'))
+        times = store.column('created_at', rows)
+        values = {name: store.column(name, rows) for name in columns}
+
+        method = args.get('downsample')
+        limit = args.get('limit', type=int)
+        cursor = args.get('cursor')
+        fmt = stream_format(request)
+        if fmt and method is None and limit is None and cursor is None:
+            # Whole window, read block by block from the memory-mapped columns
+            return stream_response(iter_sensor_rows(times, values), fmt)
+        if method is None and limit is None and cursor is None:
+            # Only return relevant columns
+            return sensor_frame(times, values).to_json(orient='records')
+
+        total = len(times)
+        if method:
+            points = min(args.get('points', 1000, type=int), MAX_SENSOR_PAGE)
+            if method == 'lttb':
+                if points < 3:
+                    raise ValueError("lttb downsampling needs at least 3 points")
+                key = args.get('lttbColumn', columns[0])
+                keep = lttb_indices(times, store.column(key, rows), points)
+                times = times[keep]
+                values = {name: column[keep] for name, column in values.items()}
+            else:
+                times, values = bucket_aggregate(times, values, points, method)
+            if fmt:
+                return stream_response(sensor_records(times, values), fmt)
+            return jsonify({
+                "data": sensor_records(times, values),
+                "nextCursor": None,
+                "total": total,
+                "downsample": method
             })
-        
-        # Add edges with weights (rounded)
-        for source, targets in dynamic_graph.items():
-            for target, weight in targets.items():
-                edges.append({
-                    'source': source,
-                    'target': target,
-                    'distance': round(weight, 2),
-                    'value': f"{weight:.2f}"
-                })
-        
+
+        limit = max(1, min(limit or 1000, MAX_SENSOR_PAGE))
+        lo = decode_cursor(times, cursor) if cursor else 0
+        hi = min(lo + limit, total)
+        next_cursor = encode_cursor(times, hi) if hi < total else None
+        if fmt:
+            return stream_response(document_records(
+                {"nextCursor": next_cursor, "total": total},
+                [("data", iter_sensor_rows(times[lo:hi], {name: column[lo:hi] for name, column in values.items()}))]
+            ), fmt)
         return jsonify({
-            'network': {
-                'nodes': nodes,
-                'edges': edges,
-                'source': 'A',
-                'sink': 'D'
-            },
-            'routing_table': {k: round(v, 2) for k, v in distances.items()}
+            "data": sensor_records(times[lo:hi], {name: column[lo:hi] for name, column in values.items()}),
+            "nextCursor": next_cursor,
+            "total": total
         })
-        
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/api/sensor-data', methods=['POST'])
+def append_sensor_data():
+    """Append new readings ({"records": [...]} or a list of rows) to the sensor store"""
+    data = request.get_json(silent=True)
+    records = data.get('records') if isinstance(data, dict) else data
+    if not isinstance(records, list):
+        return jsonify({"error": "Expected a list of sensor readings"}), 400
+    try:
+        store = get_sensor_store()
+        appended = store.append(records)
+        return jsonify({"appended": appended, "rows": store.rows})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+# ---------- Sensor Locations ----------
+def sensor_location_records(store, index, sensors, distances=None):
+    """JSON-ready sensors, with their latest reading"""
+    sensors = np.asarray(sensors, dtype=np.int64)
+    latest = index.last_row[sensors]
+    values = {name: store.column(name)[latest].tolist() for name in SENSOR_COLUMNS if name in store.columns}
+    times = store.column('created_at')
+    first_seen = format_timestamps(times[index.first_row[sensors]])
+    last_seen = format_timestamps(times[latest])
+    records = []
+    for i, sensor in enumerate(sensors.tolist()):
+        lat, lon = index.latitude[sensor].item(), index.longitude[sensor].item()
+        elevation = index.elevation[sensor].item()
+        record = {
+            'sensorId': f"{lat:.6f},{lon:.6f}",
+            'latitude': lat,
+            'longitude': lon,
+            'elevation': None if math.isnan(elevation) else elevation,
+            'readings': int(index.rows[sensor]),
+            'firstSeen': first_seen[i],
+            'lastSeen': last_seen[i],
+            'latest': {name: None if math.isnan(column[i]) else column[i] for name, column in values.items()}
+        }
+        if distances is not None:
+            record['distanceKm'] = round(float(distances[i]), 4)
+        records.append(record)
+    return records
+
+def float_arg(args, name):
+    value = args.get(name)
+    if value is None or value == '':
+        return None
+    try:
+        value = float(value)
+    except ValueError:
+        raise ValueError(f"'{name}' must be a number")
+    if not math.isfinite(value):
+        raise ValueError(f"'{name}' must be finite")
+    return value
+
+def node_coordinates(node):
+    lat = node.get('latitude', node.get('lat'))
+    lon = node.get('longitude', node.get('lon'))
+    if lat is None or lon is None:
+        raise ValueError(f"Node {node.get('id')} has no latitude/longitude")
+    return float(lat), float(lon)
+
+@app.route('/api/sensors', methods=['GET'])
+def find_sensors():
+    """
+    Sensor locations, looked up through the spatial index
+
+    Query parameters (one query shape per request):
+        lat, lon, k: the k nearest sensors
+        lat, lon, radius: sensors within radius kilometres
+        bbox: minLat,minLon,maxLat,maxLon
+        minElevation, maxElevation: elevation band, alone or combined
+            with any of the above
+    Without any of them every located sensor is returned. Each sensor
+    comes with its reading count, first/last reading time and latest values.
+    """
+    args = request.args
+    try:
+        store = get_sensor_store()
+        index = store.locations()
+        lat, lon = float_arg(args, 'lat'), float_arg(args, 'lon')
+        band = {'min_elevation': float_arg(args, 'minElevation'), 'max_elevation': float_arg(args, 'maxElevation')}
+        distances = None
+
+        if (lat is None) != (lon is None):
+            raise ValueError("Give both 'lat' and 'lon'")
+        if lat is not None and args.get('k'):
+            k = args.get('k', type=int)
+            if k is None or k < 1:
+                raise ValueError("'k' must be a positive integer")
+            sensors, distances = index.nearest(lat, lon, k=k, max_km=float_arg(args, 'radius'), **band)
+        elif lat is not None:
+            radius = float_arg(args, 'radius')
+            if radius is None or radius < 0:
+                raise ValueError("Nearby queries need 'k' or a non-negative 'radius' (km)")
+            sensors, distances = index.radius(lat, lon, radius, **band)
+        elif args.get('bbox'):
+            try:
+                min_lat, min_lon, max_lat, max_lon = (float(v) for v in args['bbox'].split(','))
+            except ValueError:
+                raise ValueError("'bbox' must be minLat,minLon,maxLat,maxLon")
+            sensors = index.bbox(min_lat, min_lon, max_lat, max_lon, **band)
+        elif band['min_elevation'] is not None or band['max_elevation'] is not None:
+            sensors = index.elevation_band(**band)
+        else:
+            sensors = np.arange(len(index))
+
+        return jsonify({
+            "sensors": sensor_location_records(store, index, sensors, distances),
+            "total": len(index)
+        })
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/api/sensors/nearest', methods=['POST'])
+def nearest_sensors():
+    """
+    The k nearest sensors to each of a list of network nodes
+
+    Body: {"nodes": [{"id", "latitude", "longitude"}, ...], "k": 3,
+    "maxKm": optional search limit, "minElevation"/"maxElevation": optional band}
+    """
+    data = request_data()
+    try:
+        nodes = data.get('nodes')
+        if not isinstance(nodes, list):
+            raise ValueError("Expected a list of nodes with latitude and longitude")
+        k = int(data.get('k', 1))
+        if k < 1:
+            raise ValueError("'k' must be a positive integer")
+        store = get_sensor_store()
+        index = store.locations()
+        found = []
+        for node in nodes:
+            lat, lon = node_coordinates(node)
+            sensors, distances = index.nearest(
+                lat, lon, k=k, max_km=data.get('maxKm'),
+                min_elevation=data.get('minElevation'), max_elevation=data.get('maxElevation')
+            )
+            found.append({
+                "node": node.get('id'),
+                "sensors": sensor_location_records(store, index, sensors, distances)
+            })
+        return jsonify({"results": found})
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": str(e)}), 400
+
+# ---------- Dynamic Routing Endpoint ----------
+# Example base graph (could be made dynamic if needed)
+DYNAMIC_BASE_GRAPH = {
+    'A': {'B': 4, 'C': 2},
+    'B': {'A': 4, 'C': 1, 'D': 5},
+    'C': {'A': 2, 'B': 1, 'D': 8},
+    'D': {'B': 5, 'C': 8}
+}
+
+_router = None
+_router_sink = 'D'
+_router_lock = threading.Lock()
+
+def get_router():
+    """Live routing engine, seeded from the notebook's sample reading on first use"""
+    global _router
+    with _router_lock:
+        if _router is None:
+            router = DynamicRouter(compile_weighted_graph(DYNAMIC_BASE_GRAPH), 'A')
+            # Use the 10th row as in the notebook
+            sample = get_sensor_store().row(10, ['Flow rate', 'Pressure 1', 'Pressure 2'])
+            router.apply_reading(sample['Flow rate'], sample['Pressure 1'], sample['Pressure 2'])
+            _router = router
+        return _router
+
+def routing_response(router):
+    distances = router.distances()
+    source_id = router.graph.node_ids[router.source]
+
+    # Convert to network structure for visualization
+    nodes = []
+    edges = []
+
+    # Add nodes with positions based on a circular layout
+    node_ids = router.graph.node_ids
+    num_nodes = len(node_ids)
+    for i, node_id in enumerate(node_ids):
+        angle = (2 * math.pi * i) / num_nodes
+        x = 50 + 40 * math.cos(angle)  # Center at 50,50 with radius 40
+        y = 50 + 40 * math.sin(angle)
+        node_type = 'source' if node_id == source_id else 'sink' if node_id == _router_sink else 'junction'
+        nodes.append({
+            'id': node_id,
+            'type': node_type,
+            'x': x,
+            'y': y,
+            'distance': round(distances.get(node_id, float('inf')), 2)
+        })
+
+    # Add edges with weights (rounded)
+    for source, target, weight in router.edges():
+        edges.append({
+            'source': source,
+            'target': target,
+            'distance': round(weight, 2),
+            'value': f"{weight:.2f}"
+        })
+
+    return {
+        'network': {
+            'nodes': nodes,
+            'edges': edges,
+            'source': source_id,
+            'sink': _router_sink
+        },
+        'routing_table': {k: round(v, 2) for k, v in distances.items()}
+    }
+
+@app.route('/api/dynamic-routing', methods=['GET'])
+def dynamic_routing():
+    try:
+        return jsonify(routing_response(get_router()))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/dynamic-routing/network', methods=['POST'])
+def configure_dynamic_routing():
+    """
+    Replace the live routing network
+
+    Takes a networkId or inline nodes/edges, a source (and optional sink
+    for display), and optional edgeSensors: [{source, target, sensor}]
+    assigning a sensor to each pipe. Without edgeSensors every pipe follows
+    one shared sensor, as before.
+    """
+    global _router, _router_sink
+    data = request_data()
+    try:
+        graph = load_graph(data)
+        source = request_param(data, 'source')
+        if not source:
+            raise ValueError("Dynamic routing requires a source node")
+        assignments = data.get('edgeSensors')
+        sensor_map = EdgeSensorMap.from_assignments(graph, assignments) if assignments else None
+        router = DynamicRouter(graph, source, sensor_map=sensor_map)
+        with _router_lock:
+            _router, _router_sink = router, data.get('sink')
+        response = routing_response(router)
+        response['sensors'] = router.sensor_map.sensor_ids
+        return jsonify(response)
+    except UnknownNetworkError as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/api/dynamic-routing/readings', methods=['POST'])
+def dynamic_routing_reading():
+    """
+    Push new sensor readings into the live routing engine
+
+    Accepts {"readings": {sensor_id: {flow, pressure1, pressure2}}} for
+    per-sensor updates, or a single {"flow", "pressure1", "pressure2"}
+    reading (CSV column names also work) applied to every sensor.
+    Only the affected edge weights change and the shortest-path tree is
+    repaired incrementally.
+    """
+    data = request_data()
+    readings = data.get('readings')
+    if readings is None:
+        try:
+            flow = float(data.get('flow', data.get('Flow rate')))
+            p1 = float(data.get('pressure1', data.get('Pressure 1')))
+            p2 = float(data.get('pressure2', data.get('Pressure 2')))
+        except (TypeError, ValueError):
+            return jsonify({"error": "Reading requires numeric flow, pressure1 and pressure2"}), 400
+
+    try:
+        router = get_router()
+        if readings is None:
+            changed = router.apply_reading(flow, p1, p2)
+        else:
+            changed = router.apply_readings(readings)
+        response = routing_response(router)
+        response['changedNodes'] = len(changed)
+        return jsonify(response)
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+REPLAY_DIR = os.environ.get('REPLAY_DIR', os.path.join(os.path.dirname(__file__), 'data/replays'))
+REPLAY_HISTORY = int(os.environ.get('REPLAY_HISTORY', 32))
+_replay_lock = threading.Lock()
+
+def replay_path(replay_id):
+    """Directory of a finished replay, or None for unknown or malformed IDs"""
+    path = os.path.join(REPLAY_DIR, replay_id)
+    if not re.fullmatch(r'[0-9a-f]{32}', replay_id) or not os.path.exists(os.path.join(path, 'meta.json')):
+        return None
+    return path
+
+def prune_replays():
+    """Delete all but the newest REPLAY_HISTORY finished replays"""
+    with _replay_lock:
+        finished = [
+            (os.path.getmtime(os.path.join(REPLAY_DIR, name, 'meta.json')), name)
+            for name in os.listdir(REPLAY_DIR) if replay_path(name)
+        ]
+        finished.sort(reverse=True)
+        for _, name in finished[REPLAY_HISTORY:]:
+            shutil.rmtree(os.path.join(REPLAY_DIR, name), ignore_errors=True)
+
+@app.route('/api/dynamic-routing/replay', methods=['POST'])
+def replay_dynamic_routing():
+    """
+    Replay the sensor history through dynamic routing
+
+    Takes an optional start/end created_at range and an optional network
+    (networkId or inline nodes/edges, with a source and optional
+    edgeSensors); without one the live routing network and its sensor map
+    are replayed. sensorColumns ({sensor: {flow, pressure1, pressure2}})
+    names the stored columns of each sensor; by default a sensor reads
+    "<sensor> Flow rate" etc. when stored, else the shared columns.
+
+    Routing tables for every step are written to a columnar replay under
+    REPLAY_DIR, which keeps the newest REPLAY_HISTORY replays; long replays
+    are best submitted through /api/jobs.
+    """
+    data = request_data()
+    path = None
+    try:
+        if request_param(data, 'networkId') or 'nodes' in data:
+            graph = load_graph(data)
+            source = request_param(data, 'source')
+            if not source:
+                raise ValueError("Replay requires a source node")
+            assignments = data.get('edgeSensors')
+            sensor_map = EdgeSensorMap.from_assignments(graph, assignments) if assignments else None
+        else:
+            router = get_router()
+            graph, source = router.graph, router.graph.node_ids[router.source]
+            sensor_map = router.sensor_map
+
+        replay_id = uuid.uuid4().hex
+        path = os.path.join(REPLAY_DIR, replay_id)
+        with stage('solve'):
+            replay = replay_sensor_history(
+                graph, source, get_sensor_store(), path,
+                start=request_param(data, 'start'), end=request_param(data, 'end'),
+                window=int(request_param(data, 'window', 32)),
+                sensor_map=sensor_map, sensor_columns=data.get('sensorColumns')
+            )
+        prune_replays()
+        return jsonify(dict(replay.describe(), replayId=replay_id)), 201
+    except UnknownNetworkError as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+    finally:
+        # A replay that failed part-way has no meta.json and is never served
+        if path is not None and os.path.isdir(path) and not os.path.exists(os.path.join(path, 'meta.json')):
+            shutil.rmtree(path, ignore_errors=True)
+
+@app.route('/api/dynamic-routing/replay/<replay_id>', methods=['DELETE'])
+def delete_routing_replay(replay_id):
+    path = replay_path(replay_id)
+    if path is None:
+        return jsonify({"error": f"Unknown replay {replay_id}"}), 404
+    with _replay_lock:
+        shutil.rmtree(path, ignore_errors=True)
+    return jsonify({"deleted": replay_id})
+
+@app.route('/api/dynamic-routing/replay/<replay_id>', methods=['GET'])
+def get_routing_replay(replay_id):
+    """
+    A stored replay, or its routing table at one step
+
+    Query parameters: at (timestamp; the last step at or before it is
+    used) or step (position), and an optional target to include the route.
+    """
+    path = replay_path(replay_id)
+    if path is None:
+        return jsonify({"error": f"Unknown replay {replay_id}"}), 404
+    replay = RouteReplay(path)
+    try:
+        if request.args.get('at'):
+            step = replay.step_at(request.args['at'])
+        elif request.args.get('step') is not None:
+            step = request.args.get('step', type=int)
+            if step is None or not 0 <= step < replay.steps:
+                raise ValueError(f"Step must be between 0 and {replay.steps - 1}")
+        else:
+            return jsonify(dict(replay.describe(), replayId=replay_id))
+
+        response = {
+            'step': step,
+            'created_at': format_timestamps(replay.column('created_at')[step:step + 1])[0],
+            'tree': int(replay.column('tree')[step]),
+            'routing_table': {k: round(v, 2) for k, v in replay.routing_table(step).items()}
+        }
+        target = request.args.get('target')
+        if target:
+            if target not in replay.index:
+                raise ValueError(f"Unknown node {target}")
+            response['route'] = replay.route(step, target)
+        return jsonify(response)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+# ---------- Instrumentation ----------
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Request and stage latency histograms, graph sizes and cache statistics for Prometheus"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/profiler', methods=['GET'])
+def profiler_report():
+    """Hottest functions and stacks; ?format=collapsed gives flame graph input"""
+    if request.args.get('format') == 'collapsed':
+        return Response(profiler.collapsed(), mimetype='text/plain')
+    return jsonify(profiler.report(limit=int(request.args.get('limit', 30))))
+
+@app.route('/api/profiler', methods=['POST'])
+def configure_profiler():
+    """
+    Switch the sampling profiler on or off without a restart
+
+    Body: enabled (bool), interval (seconds between samples) and
+    sampleRate (share of requests profiled; a request can also opt in
+    with an X-Profile: 1 header). reset: true clears collected samples.
+    """
+    data = request_data()
+    try:
+        if data.get('reset'):
+            profiler.reset()
+        profiler.configure(
+            enabled=data.get('enabled'),
+            interval=data.get('interval'),
+            sample_rate=data.get('sampleRate')
+        )
+        return jsonify(profiler.report(limit=0))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+# ---------- Background Jobs ----------
+# Analyses that can run as jobs, by the path under /api/ they are served at
+JOB_ANALYSES = {
+    'max-flow': calculate_max_flow,
+    'max-flow/what-if': max_flow_what_if,
+    'contingency': calculate_contingency,
+    'min-cost-flow': calculate_min_cost_flow,
+    'mst': calculate_mst,
+    'shortest-path': calculate_shortest_path,
+    'shortest-paths': calculate_shortest_paths,
+    'dynamic-routing/replay': replay_dynamic_routing
+}
+
+def run_analysis(analysis, params):
+    """Run an analysis endpoint outside of an HTTP request and return its JSON body"""
+    set_endpoint(f'job:{analysis}')
+    try:
+        with app.test_request_context(f'/api/{analysis}', method='POST', json=params):
+            response = app.make_response(JOB_ANALYSES[analysis]())
+    finally:
+        set_endpoint(None)
+    body = response.get_json()
+    if response.status_code >= 400:
+        raise ValueError(body.get("error", f"{analysis} failed with status {response.status_code}"))
+    return body
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    """
+    Queue an analysis and return its job ID right away
+
+    Body: analysis (one of JOB_ANALYSES, e.g. "max-flow"), params (the
+    body the analysis endpoint takes) and an optional priority (higher
+    runs first, default 0).
+    """
+    data = request_data()
+    try:
+        analysis = data.get('analysis')
+        if analysis not in JOB_ANALYSES:
+            raise ValueError(f"Unknown analysis {analysis}; choose from {', '.join(JOB_ANALYSES)}")
+        params = data.get('params') or {}
+        if not isinstance(params, dict):
+            raise ValueError("'params' must be an object")
+        priority = int(data.get('priority', 0))
+
+        job = jobs.submit(analysis, lambda job: run_analysis(analysis, params), priority=priority)
+        return jsonify(job.describe()), 202
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    """Queue statistics and every known job, without results"""
+    return jsonify({
+        "stats": jobs.stats(),
+        "jobs": [job.describe(include_result=False) for job in jobs.jobs()]
+    })
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Poll a job; the result is included once it has succeeded"""
+    try:
+        return jsonify(jobs.get(job_id).describe())
+    except UnknownJobError as e:
+        return jsonify({"error": str(e)}), 404
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """
+    Server-sent events for a job
+
+    One event per status or progress change, the last one carrying the
+    result; a comment line is sent every 15 seconds to keep idle
+    connections open.
+    """
+    try:
+        job = jobs.get(job_id)
+    except UnknownJobError as e:
+        return jsonify({"error": str(e)}), 404
+
+    def events():
+        version = None
+        while True:
+            if version is not None and job.wait_for_change(version, timeout=15) == version:
+                yield ": keep-alive\n\n"
+                continue
+            info = job.describe()
+            version = info["version"]
+            yield f"event: {info['status']}\ndata: {json.dumps(info)}\n\n"
+            if info["status"] in FINISHED:
+                return
+
+    return Response(events(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """Cancel a job: queued jobs stop at once, running ones at their next checkpoint"""
+    try:
+        job = jobs.cancel(job_id)
+        info = job.describe(include_result=False)
+        return jsonify(info), 200 if job.finished else 202
+    except UnknownJobError as e:
+        return jsonify({"error": str(e)}), 404
+
 if __name__ == '__main__':
+    start_worker_server()
     app.run(debug=True)
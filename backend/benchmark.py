@@ -0,0 +1,296 @@
+"""
+Benchmark the parse, convert, solve and serialize stages of the core algorithms
+
+Networks of increasing size are generated from a fixed seed, so runs are
+comparable across commits and machines:
+
+    python benchmark.py --sizes 1000,10000,100000 --output results.json
+    python benchmark.py --baseline baseline.json            # compare
+    python benchmark.py --baseline baseline.json --update-baseline
+    python benchmark.py --wire columnar     # parallel-array request bodies
+
+Stages, each timed on its own:
+    decode     json.loads of the request body
+    parse      parse_graph_data (node interning and CSR compilation)
+    convert    the algorithm's own graph preparation (residual network,
+               undirected pipe list, adjacency lists, dynamic arc weights);
+               solve repeats it
+    solve      the algorithm on the compiled graph
+    serialize  jsonify of the endpoint's response body
+
+The exit status is 1 when the comparison finds a regression.
+"""
+import argparse
+import json
+import math
+import platform
+import random
+import statistics
+import sys
+import time
+
+import numpy as np
+from flask import Flask, jsonify
+
+from algorithms.dijkstra import dijkstra
+from algorithms.dynamic_routing import EdgeSensorMap, dynamic_dijkstra, dynamic_weight_kernel
+from algorithms.ford_fulkerson import ResidualNetwork, ford_fulkerson
+from algorithms.mst import convert_to_undirected, kruskals_algorithm, prims_algorithm
+from utils.graph_parser import parse_graph_data, to_columnar
+from utils.network_creator import create_spatial_network, create_water_network
+
+STAGES = ('decode', 'parse', 'convert', 'solve', 'serialize')
+
+# Flask app used only to run jsonify the way the endpoints do
+_app = Flask(__name__)
+
+
+def _max_flow_case(G, network):
+    source, sink = network['source'], network['sink']
+    return {
+        'convert': lambda: ResidualNetwork(G, [G.node_index(sink)]),
+        'solve': lambda: ford_fulkerson(G, source, sink),
+        'response': lambda result: {"maxFlow": result[0], "flowPaths": result[1]}
+    }
+
+
+def _mst_case(algorithm):
+    def case(G, network):
+        return {
+            'convert': lambda: convert_to_undirected(G),
+            'solve': lambda: algorithm(G),
+            'response': lambda result: {"mstEdges": result[0], "totalCost": result[1]}
+        }
+    return case
+
+
+def _dijkstra_case(G, network):
+    source = network['source']
+    return {
+        # The per-node lists shortest_path_tree reads the CSR arrays into
+        'convert': lambda: (G.indptr.tolist(), G.indices.tolist(), G.weight.tolist()),
+        'solve': lambda: dijkstra(G, source),
+        'response': lambda result: {"distances": result[0], "paths": result[1]}
+    }
+
+
+def _dynamic_dijkstra_case(G, network):
+    source = network['source']
+    arc_sensor = EdgeSensorMap.uniform(G).arc_sensor
+    # One fixed reading, so every run sees the same weights
+    reading = ([42.0], [3.5], [2.0])
+    weights = dynamic_weight_kernel(G.weight, arc_sensor, *reading)
+    return {
+        'convert': lambda: dynamic_weight_kernel(G.weight, arc_sensor, *reading),
+        'solve': lambda: dynamic_dijkstra(G, source, weights),
+        'response': lambda result: {"distances": result[0], "previous": result[1]}
+    }
+
+
+CASES = {
+    'ford_fulkerson': _max_flow_case,
+    'prims_algorithm': _mst_case(prims_algorithm),
+    'kruskals_algorithm': _mst_case(kruskals_algorithm),
+    'dijkstra': _dijkstra_case,
+    'dynamic_dijkstra': _dynamic_dijkstra_case
+}
+
+
+def generate(junctions, generator='spatial', seed=0):
+    """Seeded test network with about 1% reservoirs and 10% consumers"""
+    reservoirs = max(1, junctions // 100)
+    consumers = max(1, junctions // 10)
+    if generator == 'random':
+        # create_water_network draws from the global random state
+        random.seed(seed)
+        return create_water_network(reservoirs, junctions, consumers)
+    return create_spatial_network(reservoirs, junctions, consumers, seed=seed)
+
+
+def _timed(func):
+    start = time.perf_counter()
+    value = func()
+    return value, time.perf_counter() - start
+
+
+def run_case(algorithm, body, repeat):
+    """
+    Time every stage of one algorithm on one encoded network
+
+    Returns:
+        dict: Graph size, per-stage timings (median and min, in seconds)
+              and the response size in bytes
+    """
+    samples = {stage: [] for stage in STAGES}
+    for _ in range(repeat):
+        network, seconds = _timed(lambda: json.loads(body))
+        samples['decode'].append(seconds)
+        G, seconds = _timed(lambda: parse_graph_data(network))
+        samples['parse'].append(seconds)
+
+        case = CASES[algorithm](G, network)
+        _, seconds = _timed(case['convert'])
+        samples['convert'].append(seconds)
+        result, seconds = _timed(case['solve'])
+        samples['solve'].append(seconds)
+        with _app.app_context():
+            response, seconds = _timed(lambda: jsonify(case['response'](result)).get_data())
+        samples['serialize'].append(seconds)
+
+    return {
+        'nodes': G.num_nodes,
+        'edges': G.num_edges,
+        'responseBytes': len(response),
+        'stages': {
+            stage: {'median': statistics.median(values), 'min': min(values)}
+            for stage, values in samples.items()
+        }
+    }
+
+
+def scaling_exponents(results):
+    """
+    Empirical growth exponent of every stage: the log-log slope of median
+    time against edge count between the smallest and largest network
+    """
+    by_algorithm = {}
+    for row in results:
+        by_algorithm.setdefault(row['algorithm'], []).append(row)
+    exponents = {}
+    for algorithm, rows in by_algorithm.items():
+        rows.sort(key=lambda row: row['edges'])
+        small, large = rows[0], rows[-1]
+        if large['edges'] <= small['edges']:
+            continue
+        exponents[algorithm] = {}
+        for stage in STAGES:
+            t0 = small['stages'][stage]['median']
+            t1 = large['stages'][stage]['median']
+            if t0 > 0 and t1 > 0:
+                exponents[algorithm][stage] = round(
+                    math.log(t1 / t0) / math.log(large['edges'] / small['edges']), 2
+                )
+    return exponents
+
+
+def compare(results, baseline, threshold=0.25, noise=0.001):
+    """
+    Stages that got slower than the baseline
+
+    A stage regresses when its median grows by more than threshold (a
+    fraction) and by more than noise seconds, which keeps sub-millisecond
+    jitter out of the report.
+
+    Returns:
+        list: One dict per regression
+    """
+    previous = {
+        (row['algorithm'], row['junctions']): row for row in baseline.get('results', [])
+    }
+    regressions = []
+    for row in results:
+        old = previous.get((row['algorithm'], row['junctions']))
+        if old is None:
+            continue
+        for stage in STAGES:
+            before = old['stages'].get(stage, {}).get('median')
+            after = row['stages'][stage]['median']
+            if before is None:
+                continue
+            if after > before * (1 + threshold) and after - before > noise:
+                regressions.append({
+                    'algorithm': row['algorithm'],
+                    'junctions': row['junctions'],
+                    'stage': stage,
+                    'baseline': before,
+                    'current': after,
+                    'ratio': round(after / before, 2) if before else None
+                })
+    return regressions
+
+
+def run(sizes, algorithms, generator='spatial', seed=0, repeat=3, log=None, wire='records'):
+    results = []
+    for junctions in sizes:
+        network = generate(junctions, generator, seed)
+        body = json.dumps(to_columnar(network) if wire == 'columnar' else network)
+        for algorithm in algorithms:
+            row = run_case(algorithm, body, repeat)
+            row = dict({'algorithm': algorithm, 'junctions': junctions}, **row)
+            results.append(row)
+            if log is not None:
+                stages = '  '.join(
+                    f"{stage} {row['stages'][stage]['median'] * 1000:9.2f}" for stage in STAGES
+                )
+                log(f"{algorithm:<20} {junctions:>9} junctions  {stages}  (ms)")
+    return {
+        'meta': {
+            'generator': generator,
+            'seed': seed,
+            'wire': wire,
+            'repeat': repeat,
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'timestamp': time.time()
+        },
+        'results': results,
+        'scaling': scaling_exponents(results)
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='100,1000,10000', help='comma-separated junction counts')
+    parser.add_argument('--algorithms', default=','.join(CASES), help='comma-separated subset of ' + ', '.join(CASES))
+    parser.add_argument('--generator', choices=('spatial', 'random'), default='spatial',
+                        help='seeded spatial generator, or create_water_network (quadratic)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--wire', choices=('records', 'columnar'), default='records',
+                        help='request body layout: one object per edge, or parallel arrays')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per case; medians are reported')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--baseline', help='JSON results to compare against')
+    parser.add_argument('--update-baseline', action='store_true', help='overwrite the baseline with these results')
+    parser.add_argument('--threshold', type=float, default=0.25, help='relative slowdown that counts as a regression')
+    args = parser.parse_args(argv)
+
+    algorithms = args.algorithms.split(',')
+    unknown = [name for name in algorithms if name not in CASES]
+    if unknown:
+        parser.error(f"unknown algorithms: {', '.join(unknown)}")
+    sizes = [int(size) for size in args.sizes.split(',')]
+
+    report = run(sizes, algorithms, args.generator, args.seed, args.repeat,
+                 log=lambda line: print(line, file=sys.stderr), wire=args.wire)
+
+    status = 0
+    if args.baseline and not args.update_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        meta = baseline.get('meta', {})
+        if (meta.get('generator'), meta.get('seed'), meta.get('wire', 'records')) != (args.generator, args.seed, args.wire):
+            print("warning: baseline was generated with different networks", file=sys.stderr)
+        report['regressions'] = compare(report['results'], baseline, threshold=args.threshold)
+        for item in report['regressions']:
+            print(
+                f"REGRESSION {item['algorithm']} {item['junctions']} junctions {item['stage']}: "
+                f"{item['baseline'] * 1000:.2f} ms -> {item['current'] * 1000:.2f} ms",
+                file=sys.stderr
+            )
+        status = 1 if report['regressions'] else 0
+
+    text = json.dumps(report, indent=2)
+    if args.update_baseline and args.baseline:
+        with open(args.baseline, 'w') as f:
+            f.write(text)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    elif not (args.update_baseline and args.baseline):
+        print(text)
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""
+Replay the sensor history through dynamic routing
+
+Writes the routing table after every stored reading to a columnar replay
+directory (see utils/route_replay.py):
+
+    python replay.py --network network.json --source reservoir_1 --output replays/may
+    python replay.py --network network.npz --source reservoir_1 --start 2024-05-25 --end 2024-05-26
+    python replay.py --network network.json --edge-sensors sensors.json --sensor-columns columns.json ...
+
+Networks may be JSON (per-edge or columnar layout) or a columnar .npz
+archive. Readings come from the sensor store, which is (re)built from the
+CSV when it is missing or stale.
+
+As with /api/dynamic-routing/replay, --edge-sensors assigns a sensor to
+each pipe ([{source, target, sensor}]) and --sensor-columns names the
+stored columns of each sensor ({sensor: {flow, pressure1, pressure2}});
+both default to the network file's edgeSensors and sensorColumns. Without
+them every pipe follows one shared sensor.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from algorithms.dynamic_routing import EdgeSensorMap, replay_sensor_history
+from utils.graph_parser import parse_graph_data, read_npz_network
+from utils.parallel import default_workers
+from utils.sensor_store import SensorStore
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+
+
+def load_network(path):
+    if path.endswith('.npz'):
+        with open(path, 'rb') as f:
+            return read_npz_network(f.read())
+    with open(path) as f:
+        return json.load(f)
+
+
+def load_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--network', required=True, help='network file (.json or .npz)')
+    parser.add_argument('--source', help='source node ID (defaults to the network file\'s source)')
+    parser.add_argument('--output', required=True, help='replay directory to write')
+    parser.add_argument('--start', help='first created_at to replay')
+    parser.add_argument('--end', help='last created_at to replay')
+    parser.add_argument('--csv', default=os.path.join(DATA_DIR, 'Filtered_Data.csv'))
+    parser.add_argument('--store', default=os.environ.get('SENSOR_STORE_DIR', os.path.join(DATA_DIR, 'sensor_store')))
+    parser.add_argument('--edge-sensors', help='JSON file of [{source, target, sensor}] pipe assignments')
+    parser.add_argument('--sensor-columns', help='JSON file of {sensor: {flow, pressure1, pressure2}} column names')
+    parser.add_argument('--window', type=int, default=32, help='routing trees per pool task')
+    parser.add_argument('--workers', type=int, default=default_workers())
+    args = parser.parse_args(argv)
+
+    network = load_network(args.network)
+    source = args.source or network.get('source')
+    if not source:
+        parser.error("no --source given and the network has none")
+
+    assignments = load_json(args.edge_sensors) if args.edge_sensors else network.get('edgeSensors')
+    sensor_columns = load_json(args.sensor_columns) if args.sensor_columns else network.get('sensorColumns')
+
+    start = time.perf_counter()
+    graph = parse_graph_data(network)
+    sensor_map = EdgeSensorMap.from_assignments(graph, assignments) if assignments else None
+    replay = replay_sensor_history(
+        graph, source, SensorStore.open(args.store, args.csv), args.output,
+        start=args.start, end=args.end, window=args.window, max_workers=args.workers,
+        sensor_map=sensor_map, sensor_columns=sensor_columns
+    )
+    summary = dict(replay.describe(), seconds=round(time.perf_counter() - start, 3))
+    print(json.dumps(summary, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,202 @@
+import numpy as np
+
+
+class CompiledGraph:
+    """
+    Compact directed graph shared by all algorithm modules
+
+    Node IDs are interned to integers 0..n-1 and the outgoing arcs of node i
+    live in the slice indptr[i]:indptr[i+1] of the CSR (compressed sparse row)
+    arrays. Arc attributes (capacity, cost, weight) are stored as parallel
+    float64 arrays, so a network is compiled once and every algorithm can run
+    on it without building a networkx graph.
+
+    The class also behaves like the old dict-of-dicts (``graph[u][v]['cost']``,
+    ``for u in graph``) so existing callers keep working.
+    """
+
+    def __init__(self, node_ids, indptr, indices, capacity, cost, weight, supply=None, demand=None):
+        self.node_ids = list(node_ids)
+        self.index = {node_id: i for i, node_id in enumerate(self.node_ids)}
+        self.indptr = indptr
+        self.indices = indices
+        self.capacity = capacity
+        self.cost = cost
+        self.weight = weight
+        # Node attributes: reservoir output capacity and consumer demand
+        n = len(self.node_ids)
+        self.supply = np.zeros(n) if supply is None else np.asarray(supply, dtype=np.float64)
+        self.demand = np.zeros(n) if demand is None else np.asarray(demand, dtype=np.float64)
+
+    @classmethod
+    def from_arrays(cls, node_ids, src, dst, capacity, cost, weight, supply=None, demand=None):
+        """
+        Build a compiled graph from parallel arc arrays
+
+        Repeated (src, dst) pairs follow dict semantics: the arc keeps the
+        position of its first occurrence and the attributes of its last one.
+
+        Args:
+            node_ids (list): Node IDs, position is the interned index
+            src (array): Tail index of every arc
+            dst (array): Head index of every arc
+            capacity, cost, weight (array): Arc attributes
+            supply, demand (array): Optional per-node reservoir capacity and
+                consumer demand
+
+        Returns:
+            CompiledGraph: The compiled graph
+        """
+        n = len(node_ids)
+        src = np.asarray(src, dtype=np.int64)
+        dst = np.asarray(dst, dtype=np.int64)
+        capacity = np.asarray(capacity, dtype=np.float64)
+        cost = np.asarray(cost, dtype=np.float64)
+        weight = np.asarray(weight, dtype=np.float64)
+        m = len(src)
+
+        if m:
+            keys = src * n + dst
+            # A stable sort groups repeated pairs in insertion order, so each
+            # group starts at its first occurrence and ends at its last
+            by_key = np.argsort(keys, kind='stable')
+            sorted_keys = keys[by_key]
+            starts = np.flatnonzero(np.concatenate(([True], sorted_keys[1:] != sorted_keys[:-1])))
+            if len(starts) == m:
+                # No repeats: order arcs by tail, keeping insertion order
+                first = last = np.argsort(src, kind='stable')
+            else:
+                first = by_key[starts]
+                last = by_key[np.append(starts[1:], m) - 1]
+                # Order arcs by tail, then by first insertion (dict iteration order)
+                order = np.lexsort((first, src[first]))
+                first, last = first[order], last[order]
+            src = src[first]
+            dst = dst[first]
+            capacity = capacity[last]
+            cost = cost[last]
+            weight = weight[last]
+
+        counts = np.bincount(src, minlength=n)
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+
+        return cls(node_ids, indptr, dst.astype(np.int64), capacity, cost, weight, supply, demand)
+
+    @classmethod
+    def from_adjacency(cls, graph):
+        """
+        Compile a dict-of-dicts graph (``graph[u][v] = {attrs}``)
+
+        Missing attributes fall back to ``weight``, then ``distance``, then
+        ``cost``, then 1, matching what the algorithm modules used to read.
+        """
+        node_ids = list(graph)
+        index = {node_id: i for i, node_id in enumerate(node_ids)}
+        src, dst, capacity, cost, weight = [], [], [], [], []
+
+        for u, neighbors in graph.items():
+            for v, attrs in neighbors.items():
+                if v not in index:
+                    index[v] = len(node_ids)
+                    node_ids.append(v)
+                w = attrs.get('weight', attrs.get('distance', attrs.get('cost', 1)))
+                src.append(index[u])
+                dst.append(index[v])
+                capacity.append(attrs.get('capacity', w))
+                cost.append(attrs.get('cost', w))
+                weight.append(w)
+
+        return cls.from_arrays(node_ids, src, dst, capacity, cost, weight)
+
+    @property
+    def num_nodes(self):
+        return len(self.node_ids)
+
+    @property
+    def num_edges(self):
+        return len(self.indices)
+
+    @property
+    def nbytes(self):
+        """Approximate memory footprint, arrays plus the node ID table"""
+        arrays = (self.indptr, self.indices, self.capacity, self.cost, self.weight, self.supply, self.demand)
+        # Roughly one list slot, one dict slot and a short string per node
+        return sum(a.nbytes for a in arrays) + 160 * self.num_nodes
+
+    def arc_sources(self):
+        """Tail index of every arc, in CSR order"""
+        return np.repeat(np.arange(self.num_nodes, dtype=np.int64), np.diff(self.indptr))
+
+    def arc_ids(self, src, dst):
+        """
+        Vectorized arc lookup
+
+        Args:
+            src, dst (array): Interned tail and head indices
+
+        Returns:
+            array: Arc position for every (src, dst) pair, -1 where there is no arc
+        """
+        src = np.asarray(src, dtype=np.int64)
+        dst = np.asarray(dst, dtype=np.int64)
+        if self.num_edges == 0:
+            return np.full(len(src), -1, dtype=np.int64)
+
+        n = self.num_nodes
+        keys = self.arc_sources() * n + self.indices
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        wanted = src * n + dst
+        pos = np.minimum(np.searchsorted(sorted_keys, wanted), len(sorted_keys) - 1)
+        return np.where(sorted_keys[pos] == wanted, order[pos], -1)
+
+    def find_arc(self, u, v):
+        """Return the arc position of u->v (interned indices) or -1"""
+        start, end = self.indptr[u], self.indptr[u + 1]
+        hits = np.flatnonzero(self.indices[start:end] == v)
+        return int(start + hits[0]) if len(hits) else -1
+
+    def node_index(self, node_id):
+        """Return the interned index of a node ID, raising ValueError if unknown"""
+        try:
+            return self.index[node_id]
+        except (KeyError, TypeError):
+            raise ValueError(f"Node {node_id} is not in the network")
+
+    # ----- dict-of-dicts compatibility -----
+
+    def __len__(self):
+        return self.num_nodes
+
+    def __iter__(self):
+        return iter(self.node_ids)
+
+    def __contains__(self, node_id):
+        try:
+            return node_id in self.index
+        except TypeError:
+            return False
+
+    def __getitem__(self, node_id):
+        i = self.index[node_id]
+        start, end = self.indptr[i], self.indptr[i + 1]
+        return {
+            self.node_ids[self.indices[e]]: {
+                'capacity': self.capacity[e].item(),
+                'cost': self.cost[e].item(),
+                'weight': self.weight[e].item()
+            }
+            for e in range(start, end)
+        }
+
+    def to_dict(self):
+        """Expand back into the dict-of-dicts representation"""
+        return {node_id: self[node_id] for node_id in self.node_ids}
+
+
+def as_compiled_graph(graph):
+    """Return graph as a CompiledGraph, compiling plain dict-of-dicts input"""
+    if isinstance(graph, CompiledGraph):
+        return graph
+    return CompiledGraph.from_adjacency(graph)
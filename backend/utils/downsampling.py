@@ -0,0 +1,112 @@
+import numpy as np
+
+BUCKET_METHODS = ('min', 'max', 'mean', 'minmax')
+
+
+def time_buckets(times, num_buckets):
+    """
+    Split sorted timestamps into equal-width time buckets
+
+    Args:
+        times (array): Sorted int64 timestamps
+        num_buckets (int): Number of buckets across [times[0], times[-1]]
+
+    Returns:
+        array: Start row of every non-empty bucket (for np.*.reduceat)
+    """
+    if len(times) == 0:
+        return np.empty(0, dtype=np.int64)
+    t0, t1 = int(times[0]), int(times[-1])
+    edges = np.linspace(t0, t1 + 1, num_buckets + 1)[:-1]
+    starts = np.searchsorted(times, edges, side='left')
+    return np.unique(starts)
+
+
+def bucket_aggregate(times, columns, num_buckets, method='mean'):
+    """
+    Downsample columns into min, max and/or mean per time bucket
+
+    Each bucket is stamped with its first timestamp. NaNs are ignored.
+
+    Args:
+        times (array): Sorted int64 timestamps
+        columns (dict): name -> values array aligned with times
+        num_buckets (int): Target number of buckets
+        method (str): 'min', 'max', 'mean' or 'minmax'
+
+    Returns:
+        tuple: (bucket timestamps, dict of output name -> values)
+    """
+    if method not in BUCKET_METHODS:
+        raise ValueError(f"Unknown downsampling method {method}")
+    starts = time_buckets(times, num_buckets)
+    if len(starts) == 0:
+        return np.empty(0, dtype=np.int64), {name: np.empty(0) for name in columns}
+    counts = np.diff(np.append(starts, len(times)))
+
+    out = {}
+    for name, values in columns.items():
+        values = np.asarray(values, dtype=np.float64)
+        valid = ~np.isnan(values)
+        if method in ('min', 'minmax'):
+            low = np.minimum.reduceat(np.where(valid, values, np.inf), starts)
+            out[name if method == 'min' else f'{name}_min'] = np.where(np.isinf(low), np.nan, low)
+        if method in ('max', 'minmax'):
+            high = np.maximum.reduceat(np.where(valid, values, -np.inf), starts)
+            out[name if method == 'max' else f'{name}_max'] = np.where(np.isinf(high), np.nan, high)
+        if method == 'mean':
+            total = np.add.reduceat(np.where(valid, values, 0.0), starts)
+            n = np.add.reduceat(valid.astype(np.int64), starts)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                out[name] = np.where(n > 0, total / np.maximum(n, 1), np.nan)
+
+    return times[starts], out
+
+
+def lttb_indices(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets point selection
+
+    Keeps the first and last points, and from every bucket in between the
+    point forming the largest triangle with the previously kept point and
+    the average of the next bucket.
+
+    Args:
+        x (array): Sorted x values (e.g. timestamps)
+        y (array): Values to preserve the shape of
+        threshold (int): Number of points to keep, at least 2
+
+    Returns:
+        array: Indices of the selected points
+    """
+    n = len(x)
+    if threshold < 2:
+        raise ValueError(f"LTTB keeps the first and last point, so the threshold must be at least 2, got {threshold}")
+    if threshold >= n:
+        return np.arange(n)
+    if threshold == 2:
+        return np.array([0, n - 1], dtype=np.int64)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # NaNs would poison every triangle in their bucket
+    y = np.where(np.isnan(y), np.nanmean(y) if np.isfinite(y).any() else 0.0, y)
+
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_lo, next_hi = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        if next_hi <= next_lo:
+            next_hi = next_lo + 1
+        avg_x = x[next_lo:next_hi].mean()
+        avg_y = y[next_lo:next_hi].mean()
+        area = np.abs(
+            (x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a])
+        )
+        a = lo + int(np.argmax(area)) if hi > lo else lo
+        selected[i + 1] = a
+    return selected
@@ -1,62 +1,295 @@
+import io
+
+import numpy as np
+
+from utils.compiled_graph import CompiledGraph
+
+# Content type of NumPy .npz network uploads
+NPZ_MIMETYPE = 'application/x-npz'
+
+# Node types whose capacity is a supply; other nodes never feed the network
+SUPPLY_TYPES = ('reservoir', 'source')
+
+
+def is_columnar(data):
+    """Whether a network uses the columnar layout (edges as parallel arrays)"""
+    return isinstance(data.get('edges'), dict)
+
+
 def parse_graph_data(data, flow=False):
     """
     Parse the JSON graph data into a format suitable for the algorithms
-    
+
+    The network is compiled once into a CompiledGraph (interned node IDs and
+    CSR arc arrays) that all algorithm modules run on directly. Both the
+    per-edge object layout and the columnar layout (see
+    parse_columnar_data) are accepted.
+
+    Only nodes whose type is one of SUPPLY_TYPES supply water, at their
+    capacity; consumers carry a demand.
+
     Args:
         data (dict): JSON data containing nodes and edges
         flow (bool): Whether to parse for flow algorithms (needs source/sink)
-        
+
     Returns:
-        dict or tuple: Graph representation (and source/sink nodes if flow=True)
+        CompiledGraph or tuple: Graph representation (and source/sink nodes if flow=True)
     """
     if 'nodes' not in data or 'edges' not in data:
         raise ValueError("Input data must contain 'nodes' and 'edges'")
-    
-    graph = {}
-    
-    # Initialize nodes
+
+    if is_columnar(data):
+        graph = parse_columnar_data(data)
+    else:
+        graph = _parse_records(data)
+
+    if flow:
+        source_node = data.get('source')
+        sink_node = data.get('sink')
+
+        if not source_node or not sink_node:
+            raise ValueError("Flow analysis requires source and sink nodes")
+
+        return graph, source_node, sink_node
+
+    return graph
+
+
+def _parse_records(data):
+    # Intern node IDs; reservoirs carry a capacity and consumers a demand
+    node_ids = []
+    index = {}
+    supply, demand = [], []
     for node in data['nodes']:
         node_id = node['id']
-        graph[node_id] = {}
-    
+        if node_id not in index:
+            index[node_id] = len(node_ids)
+            node_ids.append(node_id)
+            supply.append(0)
+            demand.append(0)
+        supply[index[node_id]] = _value(node, 'capacity', 0) if node.get('type') in SUPPLY_TYPES else 0
+        demand[index[node_id]] = _value(node, 'demand', 0)
+
+    src, dst, capacity, cost, weight = [], [], [], [], []
+
     # Add edges with weights
     for edge in data['edges']:
         source = edge['source']
         target = edge['target']
-        
+
         # Ensure source and target exist
-        if source not in graph or target not in graph:
+        if source not in index or target not in index:
             raise ValueError(f"Edge {source}->{target} references undefined node")
-        
-        # Extract weights based on edge properties
-        weight = edge.get('weight', 1)
-        capacity = edge.get('capacity', weight)
-        cost = edge.get('cost', weight)
-        
-        # Store edge information
-        graph[source][target] = {
-            'capacity': capacity,
-            'cost': cost,
-            'weight': weight
-        }
-        
+
+        # Extract weights based on edge properties; null means not given
+        w = _value(edge, 'weight', 1)
+        u, v = index[source], index[target]
+
+        src.append(u)
+        dst.append(v)
+        capacity.append(_value(edge, 'capacity', w))
+        cost.append(_value(edge, 'cost', w))
+        weight.append(w)
+
         # For undirected graphs (if specified)
         if not edge.get('directed', False):
-            if target not in graph:
-                graph[target] = {}
-            graph[target][source] = {
-                'capacity': capacity,
-                'cost': cost,
-                'weight': weight
-            }
-    
-    if flow:
-        source_node = data.get('source')
-        sink_node = data.get('sink')
-        
-        if not source_node or not sink_node:
-            raise ValueError("Flow analysis requires source and sink nodes")
-            
-        return graph, source_node, sink_node
-    
-    return graph
+            src.append(v)
+            dst.append(u)
+            capacity.append(capacity[-1])
+            cost.append(cost[-1])
+            weight.append(w)
+
+    return CompiledGraph.from_arrays(node_ids, src, dst, capacity, cost, weight, supply, demand)
+
+
+def _value(record, key, default):
+    """record[key], or default when the key is absent or null"""
+    value = record.get(key)
+    return default if value is None else value
+
+
+def parse_columnar_data(data):
+    """
+    Compile a network sent as parallel arrays
+
+    Layout (every array of one column has the same length):
+
+        nodes: {id: [...], type: [...], capacity: [...], demand: [...]}
+        edges: {source: [...], target: [...], capacity: [...], cost: [...],
+                weight: [...], directed: bool or [...]}
+
+    Edge endpoints are positions in nodes.id, not node IDs. Every column
+    but nodes.id, edges.source and edges.target is optional, and edge
+    attributes may be single numbers applying to all edges. Defaults match
+    the per-edge layout, for absent columns and null entries alike: weight
+    1, capacity and cost equal to the weight, node capacity and demand 0,
+    undirected. An undirected edge is one record that both of its arcs
+    read their attributes from. As in the per-edge layout, a node capacity
+    is only a supply on nodes whose type is one of SUPPLY_TYPES.
+
+    Validation is vectorized, so a few hundred thousand edges compile in
+    milliseconds.
+
+    Args:
+        data (dict): Columnar nodes and edges (lists or NumPy arrays)
+
+    Returns:
+        CompiledGraph: The compiled graph
+    """
+    nodes, edges = data['nodes'], data['edges']
+    if not isinstance(nodes, dict) or 'id' not in nodes:
+        raise ValueError("Columnar nodes must be an object with an 'id' array")
+    if 'source' not in edges or 'target' not in edges:
+        raise ValueError("Columnar edges must have 'source' and 'target' arrays")
+
+    # Keep IDs as sent: converting a list through an array would turn
+    # mixed integer and string IDs into strings
+    ids = nodes['id']
+    if not isinstance(ids, (list, tuple, np.ndarray)):
+        raise ValueError("nodes.id must be an array")
+    node_ids = ids.tolist() if isinstance(ids, np.ndarray) else list(ids)
+    n = len(node_ids)
+    if len(set(node_ids)) != n:
+        raise ValueError("Columnar node IDs must be unique")
+    supply = np.where(_supply_nodes(nodes.get('type'), n), _column(nodes, 'capacity', n, 0, 'nodes'), 0)
+    demand = _column(nodes, 'demand', n, 0, 'nodes')
+
+    source = _endpoints(edges['source'], n, 'source')
+    target = _endpoints(edges['target'], n, 'target')
+    m = len(source)
+    if len(target) != m:
+        raise ValueError(f"edges.source has {m} entries but edges.target has {len(target)}")
+    weight = _column(edges, 'weight', m, 1, 'edges')
+    capacity = _column(edges, 'capacity', m, weight, 'edges')
+    cost = _column(edges, 'cost', m, weight, 'edges')
+    directed = np.asarray(edges.get('directed', False), dtype=bool)
+    if directed.ndim > 1 or (directed.ndim == 1 and len(directed) != m):
+        raise ValueError("edges.directed must be a single flag or one flag per edge")
+    directed = np.broadcast_to(directed, (m,))
+
+    # One arc per directed edge, two per undirected edge (u->v then v->u,
+    # as the per-edge layout adds them); record maps every arc to its edge
+    record = np.repeat(np.arange(m), np.where(directed, 1, 2))
+    reverse = np.zeros(len(record), dtype=bool)
+    reverse[1:] = record[1:] == record[:-1]
+    src = np.where(reverse, target[record], source[record])
+    dst = np.where(reverse, source[record], target[record])
+
+    return CompiledGraph.from_arrays(
+        node_ids, src, dst, capacity[record], cost[record], weight[record], supply, demand
+    )
+
+
+def _supply_nodes(types, n):
+    """Mask of the nodes whose type is one of SUPPLY_TYPES"""
+    if types is None:
+        return np.zeros(n, dtype=bool)
+    types = np.asarray(types, dtype=object)
+    if types.ndim != 1 or len(types) != n:
+        raise ValueError("nodes.type must have one entry per node")
+    return np.isin(types, SUPPLY_TYPES)
+
+
+def _endpoints(values, n, name):
+    values = np.asarray(values)
+    if values.ndim != 1:
+        raise ValueError(f"edges.{name} must be a flat array")
+    if len(values) == 0:
+        return values.astype(np.int64)
+    if values.dtype.kind == 'f':
+        if not np.array_equal(values, np.floor(values)):
+            raise ValueError(f"edges.{name} must hold integer node positions")
+    elif values.dtype.kind not in 'iu':
+        raise ValueError(f"edges.{name} must hold integer node positions")
+    values = values.astype(np.int64)
+    bad = np.flatnonzero((values < 0) | (values >= n))
+    if len(bad):
+        raise ValueError(f"Edge {int(bad[0])} references undefined node position {int(values[bad[0]])}")
+    return values
+
+
+def _column(columns, name, size, default, table):
+    """A numeric column broadcast to size entries, default when absent or null"""
+    values = columns.get(name)
+    if values is None:
+        values = default
+    try:
+        values = np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        raise ValueError(f"{table}.{name} must be numeric")
+    if values.ndim > 1 or (values.ndim == 1 and len(values) != size):
+        raise ValueError(f"{table}.{name} must have one entry per {table[:-1]}")
+    if not values.ndim:
+        values = np.full(size, values)
+    # Nulls arrive as NaN and take the default, as in the per-edge layout
+    missing = np.isnan(values)
+    if missing.any():
+        values = np.where(missing, default, values)
+    return values
+
+
+def to_columnar(data):
+    """
+    Convert a network from the per-edge layout to the columnar layout
+
+    Node type, capacity and demand are carried over; other node and edge
+    attributes are dropped, as the algorithms don't read them.
+    """
+    nodes, edges = data['nodes'], data['edges']
+    position = {node['id']: i for i, node in enumerate(nodes)}
+    network = {
+        key: value for key, value in data.items() if key not in ('nodes', 'edges')
+    }
+    network['nodes'] = {
+        'id': [node['id'] for node in nodes],
+        'type': [node.get('type') or '' for node in nodes],
+        'capacity': [node.get('capacity') or 0 for node in nodes],
+        'demand': [node.get('demand') or 0 for node in nodes]
+    }
+    weights = [edge.get('weight', 1) for edge in edges]
+    network['edges'] = {
+        'source': [position[edge['source']] for edge in edges],
+        'target': [position[edge['target']] for edge in edges],
+        'capacity': [edge.get('capacity', w) for edge, w in zip(edges, weights)],
+        'cost': [edge.get('cost', w) for edge, w in zip(edges, weights)],
+        'weight': weights,
+        'directed': [bool(edge.get('directed', False)) for edge in edges]
+    }
+    return network
+
+
+def read_npz_network(payload):
+    """
+    Load a columnar network from NumPy .npz bytes
+
+    Arrays named nodes/<column> and edges/<column> form the columnar
+    layout; any other zero-dimensional array (source, sink, ...) becomes a
+    top-level parameter. Pickled objects are refused.
+    """
+    if not payload.startswith(b'PK'):
+        raise ValueError("Expected a .npz (zip) archive")
+    data = {'nodes': {}, 'edges': {}}
+    with np.load(io.BytesIO(payload), allow_pickle=False) as archive:
+        for key in archive.files:
+            table, _, column = key.partition('/')
+            if column and table in ('nodes', 'edges'):
+                data[table][column] = archive[key]
+            elif archive[key].ndim == 0:
+                data[key] = archive[key].item()
+            else:
+                raise ValueError(f"Unexpected array {key} in network archive")
+    return data
+
+
+def write_npz_network(data):
+    """Encode a columnar network (as taken by parse_columnar_data) as .npz bytes"""
+    arrays = {}
+    for table in ('nodes', 'edges'):
+        for column, values in data[table].items():
+            arrays[f"{table}/{column}"] = np.asarray(values)
+    for key, value in data.items():
+        if key not in ('nodes', 'edges') and value is not None:
+            arrays[key] = np.asarray(value)
+    buffer = io.BytesIO()
+    np.savez(buffer, **arrays)
+    return buffer.getvalue()
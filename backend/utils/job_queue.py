@@ -0,0 +1,257 @@
+import heapq
+import itertools
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# Job states; the last three are final
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+# Job run by the current worker thread, if any
+_current = threading.local()
+
+
+class UnknownJobError(LookupError):
+    """Raised when a job ID is not (or no longer) known"""
+
+
+class JobCancelled(BaseException):
+    """
+    Raised inside a running job at its next checkpoint after cancellation
+
+    Like KeyboardInterrupt it is not an Exception, so the broad error
+    handlers of the analysis code let it through.
+    """
+
+
+def checkpoint(done=None, total=None, message=None):
+    """
+    Report progress of the job running on this thread and honour cancellation
+
+    Long-running algorithms call this between units of work. Outside a job
+    it does nothing, so the same code serves synchronous requests.
+
+    Args:
+        done (int): Units of work finished
+        total (int): Units of work overall, if known
+        message (str): Short description of the current stage
+
+    Raises:
+        JobCancelled: If the job has been cancelled
+    """
+    job = current_job()
+    if job is not None:
+        job.report(done, total, message)
+
+
+def current_job():
+    """The job running on this thread, or None outside the job workers"""
+    return getattr(_current, 'job', None)
+
+
+class Job:
+    """
+    One submitted analysis
+
+    Every state or progress change bumps version and wakes anyone waiting
+    in wait_for_change, which is what server-sent events are built on.
+    """
+
+    def __init__(self, kind, func, priority=0):
+        self.job_id = uuid.uuid4().hex
+        self.kind = kind
+        self.priority = priority
+        self.status = QUEUED
+        self.progress = None
+        self.message = None
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.version = 0
+        self._func = func
+        self._cancel = threading.Event()
+        self._changed = threading.Condition()
+
+    @property
+    def finished(self):
+        return self.status in FINISHED
+
+    def report(self, done=None, total=None, message=None):
+        if self._cancel.is_set():
+            raise JobCancelled(f"Job {self.job_id} was cancelled")
+        with self._changed:
+            if done is not None and total:
+                self.progress = min(1.0, done / total)
+            if message is not None:
+                self.message = message
+            self._bump()
+
+    def wait_for_change(self, version, timeout=None):
+        """Block until version moves past the given one; returns the current version"""
+        with self._changed:
+            self._changed.wait_for(lambda: self.version != version, timeout=timeout)
+            return self.version
+
+    def describe(self, include_result=True):
+        with self._changed:
+            info = {
+                'jobId': self.job_id,
+                'kind': self.kind,
+                'priority': self.priority,
+                'status': self.status,
+                'progress': self.progress,
+                'message': self.message,
+                'createdAt': self.created_at,
+                'startedAt': self.started_at,
+                'finishedAt': self.finished_at,
+                'version': self.version
+            }
+            if self.error is not None:
+                info['error'] = self.error
+            if include_result and self.status == SUCCEEDED:
+                info['result'] = self.result
+            return info
+
+    def _transition(self, status, **fields):
+        with self._changed:
+            self.status = status
+            for name, value in fields.items():
+                setattr(self, name, value)
+            if status in FINISHED:
+                self.finished_at = time.time()
+                self._func = None
+            self._bump()
+
+    def _bump(self):
+        self.version += 1
+        self._changed.notify_all()
+
+
+class JobQueue:
+    """
+    In-process priority queue of analysis jobs run by a bounded thread pool
+
+    Higher priorities run first, ties in submission order. Queued jobs are
+    cancelled at once; running jobs stop at their next checkpoint. Finished
+    jobs are kept for polling until max_finished newer ones have finished.
+    """
+
+    def __init__(self, max_workers=2, max_finished=256):
+        self.max_workers = max_workers
+        self.max_finished = max_finished
+        self._jobs = {}
+        self._finished = OrderedDict()
+        self._heap = []
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+        self._work = threading.Condition(self._lock)
+        self._workers = []
+        self.submitted = 0
+
+    def submit(self, kind, func, priority=0):
+        """
+        Queue func(job) to run in the background
+
+        Args:
+            kind (str): Analysis name, for display
+            func (callable): Called with the Job; its return value is the result
+            priority (int): Higher runs first
+
+        Returns:
+            Job: The queued job
+        """
+        job = Job(kind, func, priority)
+        with self._lock:
+            self._jobs[job.job_id] = job
+            heapq.heappush(self._heap, (-priority, next(self._order), job))
+            self.submitted += 1
+            # Threads are started lazily, up to the pool size
+            if len(self._workers) < self.max_workers:
+                worker = threading.Thread(target=self._run, name=f'job-worker-{len(self._workers)}', daemon=True)
+                self._workers.append(worker)
+                worker.start()
+            self._work.notify()
+        return job
+
+    def get(self, job_id):
+        """Return a Job by ID, raising UnknownJobError if absent"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            raise UnknownJobError(f"Unknown job {job_id}")
+        return job
+
+    def cancel(self, job_id):
+        """
+        Cancel a job
+
+        Returns:
+            Job: The job; already finished jobs are left as they are
+        """
+        job = self.get(job_id)
+        job._cancel.set()
+        with self._lock:
+            if job.status == QUEUED:
+                # Its heap entry is skipped when popped
+                job._transition(CANCELLED)
+                self._retire(job)
+        return job
+
+    def jobs(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def stats(self):
+        with self._lock:
+            counts = {status: 0 for status in (QUEUED, RUNNING) + FINISHED}
+            for job in self._jobs.values():
+                counts[job.status] += 1
+            return {
+                'workers': self.max_workers,
+                'submitted': self.submitted,
+                'jobs': counts
+            }
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while True:
+                    while not self._heap:
+                        self._work.wait()
+                    _, _, job = heapq.heappop(self._heap)
+                    if job.status == QUEUED:
+                        break
+                job._transition(RUNNING, started_at=time.time())
+
+            _current.job = job
+            try:
+                result = job._func(job)
+            except JobCancelled:
+                job._transition(CANCELLED)
+            except Exception as e:
+                job._transition(FAILED, error=str(e))
+            else:
+                if job._cancel.is_set():
+                    job._transition(CANCELLED)
+                else:
+                    job._transition(SUCCEEDED, result=result, progress=1.0)
+            finally:
+                _current.job = None
+
+            with self._lock:
+                self._retire(job)
+
+    def _retire(self, job):
+        # Called with the lock held
+        self._finished[job.job_id] = job
+        while len(self._finished) > self.max_finished:
+            old_id, _ = self._finished.popitem(last=False)
+            del self._jobs[old_id]
@@ -0,0 +1,146 @@
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from 1 ms to a minute
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Size buckets for node and edge counts
+SIZE_BUCKETS = (10, 100, 1000, 10000, 100000, 1000000, 10000000)
+
+# Endpoint of the request handled by this thread, for stage labels
+_current = threading.local()
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense"""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        # First bucket whose upper bound is >= value; the last slot is +Inf
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """
+    Histograms and counters keyed by metric name and label values
+
+    Collectors registered with add_collector are called at render time and
+    return (name, type, help, [(labels, value), ...]) tuples, which is how
+    state owned elsewhere (cache statistics, queue sizes) is exported
+    without being copied on every update.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._help = {}
+        self._collectors = []
+
+    def describe(self, name, help_text):
+        self._help[name] = help_text
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+
+        typed = set()
+        for (name, labels), histogram in histograms:
+            self._header(lines, typed, name, 'histogram')
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + (math.inf,), histogram.counts):
+                cumulative += count
+                le = '+Inf' if math.isinf(bound) else repr(bound)
+                lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {histogram.sum!r}")
+            lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+        for (name, labels), value in counters:
+            self._header(lines, typed, name, 'counter')
+            lines.append(f"{name}{_labels(labels)} {value}")
+
+        for collector in self._collectors:
+            for name, kind, help_text, samples in collector():
+                self._help.setdefault(name, help_text)
+                self._header(lines, typed, name, kind)
+                for labels, value in samples:
+                    lines.append(f"{name}{_labels(tuple(sorted(labels.items())))} {value}")
+        return '\n'.join(lines) + '\n'
+
+    def _header(self, lines, typed, name, kind):
+        if name in typed:
+            return
+        typed.add(name)
+        if name in self._help:
+            lines.append(f"# HELP {name} {self._help[name]}")
+        lines.append(f"# TYPE {name} {kind}")
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    body = ','.join(
+        '{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for k, v in pairs
+    )
+    return '{' + body + '}'
+
+
+# Process-wide registry used by the app and the instrumented helpers
+metrics = MetricsRegistry()
+metrics.describe('http_request_duration_seconds', 'Time to build the response of a request')
+metrics.describe('request_stage_seconds', 'Time spent in each stage of handling a request')
+metrics.describe('graph_nodes', 'Nodes in the networks requests ran on')
+metrics.describe('graph_edges', 'Arcs in the networks requests ran on')
+
+
+def set_endpoint(endpoint):
+    """Label the stages timed on this thread with an endpoint (None to clear)"""
+    _current.endpoint = endpoint
+
+
+@contextmanager
+def stage(name):
+    """Time a block as one stage of the current request; outside a request it is not recorded"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        endpoint = getattr(_current, 'endpoint', None)
+        if endpoint is not None:
+            metrics.observe('request_stage_seconds', time.perf_counter() - start, endpoint=endpoint, stage=name)
+
+
+def observe_graph(graph):
+    """Record the size of a network a request ran on"""
+    endpoint = getattr(_current, 'endpoint', None) or 'unknown'
+    metrics.observe('graph_nodes', graph.num_nodes, buckets=SIZE_BUCKETS, endpoint=endpoint)
+    metrics.observe('graph_edges', graph.num_edges, buckets=SIZE_BUCKETS, endpoint=endpoint)
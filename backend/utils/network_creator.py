@@ -1,6 +1,11 @@
-import networkx as nx
+import math
 import random
 
+import networkx as nx
+import numpy as np
+
+from utils.compiled_graph import CompiledGraph
+
 def create_water_network(num_reservoirs=2, num_junctions=5, num_consumers=3):
     """
     Create a realistic water distribution network
@@ -64,8 +69,9 @@ def create_water_network(num_reservoirs=2, num_junctions=5, num_consumers=3):
     nodes = []
     for node in G.nodes():
         node_data = {"id": node}
-        if "type" in G.nodes[node]:
-            node_data["type"] = G.nodes[node]["type"]
+        for attr in ("type", "capacity", "demand"):
+            if attr in G.nodes[node]:
+                node_data[attr] = G.nodes[node][attr]
         nodes.append(node_data)
     
     edges = []
@@ -85,3 +91,280 @@ def create_water_network(num_reservoirs=2, num_junctions=5, num_consumers=3):
         "source": reservoirs[0],
         "sink": consumers[0]
     }
+
+
+# Pipe length per unit of layout distance (junctions sit about one unit apart)
+SPATIAL_SCALE = 100.0
+
+
+def spatial_network_arrays(num_reservoirs=2, num_junctions=5, num_consumers=3, seed=None, mean_degree=8.0):
+    """
+    Generate a spatially embedded network as NumPy arrays in near-linear time
+
+    Nodes are scattered uniformly at unit density. Candidate pipes join
+    nodes closer than a radius chosen for the requested mean degree (a
+    random geometric graph, found with a cell grid instead of testing every
+    pair). Only Gabriel edges are kept, so pipes never cross. Any stray
+    components left over are joined to their nearest neighbours, so the
+    network is always connected.
+
+    Args:
+        num_reservoirs: Number of water reservoirs (sources)
+        num_junctions: Number of pipe junctions
+        num_consumers: Number of end consumers (sinks)
+        seed: Seed for a reproducible network
+        mean_degree: Mean number of candidate neighbours per node
+
+    Returns:
+        dict: Node coordinates, supply and demand, and parallel pipe arrays
+              (source, target, length, capacity, cost); pipes are undirected
+    """
+    rng = np.random.default_rng(seed)
+    n = num_reservoirs + num_junctions + num_consumers
+    side = math.sqrt(n)
+    x = rng.random(n) * side
+    y = rng.random(n) * side
+
+    radius = math.sqrt(mean_degree / math.pi)
+    # Work on the points in grid-cell order so neighbours sit close in memory
+    order = np.lexsort((x // radius, y // radius))
+    sx, sy = x[order], y[order]
+    src, dst = _gabriel_edges(sx, sy, *_pairs_within(sx, sy, radius))
+    src, dst = _connect_components(sx, sy, src, dst, radius)
+    src, dst = order[src], order[dst]
+
+    length = np.hypot(x[src] - x[dst], y[src] - y[dst]) * SPATIAL_SCALE
+    supply = np.zeros(n, dtype=np.int64)
+    demand = np.zeros(n, dtype=np.int64)
+    supply[:num_reservoirs] = rng.integers(800, 1201, num_reservoirs)
+    demand[n - num_consumers:] = rng.integers(100, 301, num_consumers)
+
+    return {
+        "num_reservoirs": num_reservoirs,
+        "num_junctions": num_junctions,
+        "num_consumers": num_consumers,
+        "x": x * SPATIAL_SCALE,
+        "y": y * SPATIAL_SCALE,
+        "supply": supply,
+        "demand": demand,
+        "source": src,
+        "target": dst,
+        "length": length,
+        "capacity": rng.integers(200, 401, len(src)),
+        # Cost per unit of flow grows with pipe length
+        "cost": np.maximum(1, np.rint(length / 10)).astype(np.int64)
+    }
+
+
+def _pairs_within(x, y, radius, points=None):
+    """
+    Pairs of points closer than radius, using a grid of radius-sized cells
+
+    Args:
+        x, y (array): Point coordinates
+        radius (float): Distance threshold
+        points (array): Only report pairs involving these points (every
+            point, each pair once, when None)
+
+    Returns:
+        tuple: (first, second) point index arrays
+    """
+    cx = (x // radius).astype(np.int64)
+    cy = (y // radius).astype(np.int64)
+    cols = int(cx.max()) + 1
+    rows = int(cy.max()) + 1
+    cell = cy * cols + cx
+    order = np.argsort(cell, kind='stable')
+    start = np.zeros(rows * cols + 1, dtype=np.int64)
+    np.cumsum(np.bincount(cell, minlength=rows * cols), out=start[1:])
+
+    if points is None:
+        # Half the neighbourhood suffices when every point is scanned
+        offsets = [(0, 0), (1, 0), (-1, 1), (0, 1), (1, 1)]
+        points = np.arange(len(x))
+    else:
+        offsets = [(dx, dy) for dy in (-1, 0, 1) for dx in (-1, 0, 1)]
+
+    first, second = [], []
+    for dx, dy in offsets:
+        nx_, ny_ = cx[points] + dx, cy[points] + dy
+        valid = (nx_ >= 0) & (nx_ < cols) & (ny_ >= 0) & (ny_ < rows)
+        p = points[valid]
+        c = ny_[valid] * cols + nx_[valid]
+        counts = start[c + 1] - start[c]
+        i = np.repeat(p, counts)
+        offsets_in_cell = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        j = order[np.repeat(start[c], counts) + offsets_in_cell]
+        keep = (x[i] - x[j]) ** 2 + (y[i] - y[j]) ** 2 < radius * radius
+        keep &= (i < j) if (dx, dy) == (0, 0) and len(offsets) == 5 else (i != j)
+        first.append(i[keep])
+        second.append(j[keep])
+    return np.concatenate(first), np.concatenate(second)
+
+
+def _gabriel_edges(x, y, u, v, chunk=1 << 18):
+    """
+    Keep the pairs whose diametral circle holds no other point
+
+    Any such point lies within the pair's length of u, so only u's
+    candidate neighbours need testing.
+    """
+    n = len(x)
+    ends = np.concatenate([u, v])
+    others = np.concatenate([v, u])
+    order = np.argsort(ends, kind='stable')
+    neighbours = others[order]
+    start = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(ends, minlength=n), out=start[1:])
+
+    keep = np.ones(len(u), dtype=bool)
+    for lo in range(0, len(u), chunk):
+        a, b = u[lo:lo + chunk], v[lo:lo + chunk]
+        counts = start[a + 1] - start[a]
+        pair = np.repeat(np.arange(len(a)), counts)
+        w = neighbours[np.repeat(start[a] - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())]
+        # w is inside the circle exactly when it sees a-b at an obtuse angle
+        xw, yw = x[w], y[w]
+        inside = (
+            (xw - np.repeat(x[a], counts)) * (xw - np.repeat(x[b], counts))
+            + (yw - np.repeat(y[a], counts)) * (yw - np.repeat(y[b], counts))
+        ) < 0
+        inside &= w != np.repeat(b, counts)
+        keep[lo:lo + chunk] = np.bincount(pair[inside], minlength=len(a)) == 0
+    return u[keep], v[keep]
+
+
+def _component_labels(n, u, v, labels=None):
+    """
+    Connected component label (smallest member index) of every node
+
+    Labels from a previous call on a subset of the edges are a valid start.
+    """
+    labels = np.arange(n) if labels is None else labels
+    while True:
+        lu, lv = labels[u], labels[v]
+        differ = lu != lv
+        if not differ.any():
+            return labels
+        # Hook the larger root under the smaller one, then shortcut
+        labels[np.maximum(lu[differ], lv[differ])] = np.minimum(lu[differ], lv[differ])
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+
+
+def _connect_components(x, y, u, v, radius):
+    """Join every component to the nearest node outside it until one remains"""
+    n = len(x)
+    labels = None
+    while n > 1:
+        labels = _component_labels(n, u, v, labels)
+        sizes = np.bincount(labels, minlength=n)
+        stray = np.flatnonzero(labels != np.argmax(sizes))
+        if len(stray) == 0:
+            break
+        a, b = _pairs_within(x, y, radius, points=stray)
+        a, b = a[labels[a] != labels[b]], b[labels[a] != labels[b]]
+        if len(a) == 0:
+            radius *= 2
+            continue
+        # Shortest link out of each stray component
+        d = (x[a] - x[b]) ** 2 + (y[a] - y[b]) ** 2
+        order = np.lexsort((d, labels[a]))
+        _, first = np.unique(labels[a][order], return_index=True)
+        link = order[first]
+        u = np.concatenate([u, a[link]])
+        v = np.concatenate([v, b[link]])
+    return u, v
+
+
+def spatial_node_ids(network):
+    """Node IDs in array order: reservoirs, then junctions, then consumers"""
+    return (
+        [f"reservoir_{i}" for i in range(1, network["num_reservoirs"] + 1)]
+        + [f"junction_{i}" for i in range(1, network["num_junctions"] + 1)]
+        + [f"consumer_{i}" for i in range(1, network["num_consumers"] + 1)]
+    )
+
+
+def iter_spatial_nodes(network, node_ids=None, block=65536):
+    """Yield node records of a spatial network one at a time"""
+    node_ids = node_ids or spatial_node_ids(network)
+    r = network["num_reservoirs"]
+    first_consumer = len(node_ids) - network["num_consumers"]
+    for lo in range(0, len(node_ids), block):
+        hi = min(lo + block, len(node_ids))
+        xs = network["x"][lo:hi].round(1).tolist()
+        ys = network["y"][lo:hi].round(1).tolist()
+        supply = network["supply"][lo:hi].tolist()
+        demand = network["demand"][lo:hi].tolist()
+        for k in range(hi - lo):
+            i = lo + k
+            node = {"id": node_ids[i], "x": xs[k], "y": ys[k]}
+            if i < r:
+                node["type"] = "source"
+                node["capacity"] = supply[k]
+            elif i >= first_consumer:
+                node["type"] = "sink"
+                node["demand"] = demand[k]
+            else:
+                node["type"] = "junction"
+            yield node
+
+
+def iter_spatial_edges(network, node_ids=None, block=65536):
+    """Yield undirected pipe records of a spatial network one at a time"""
+    node_ids = node_ids or spatial_node_ids(network)
+    m = len(network["source"])
+    for lo in range(0, m, block):
+        sl = slice(lo, min(lo + block, m))
+        columns = zip(
+            network["source"][sl].tolist(), network["target"][sl].tolist(),
+            network["capacity"][sl].tolist(), network["cost"][sl].tolist(),
+            network["length"][sl].round(1).tolist()
+        )
+        for u, v, capacity, cost, length in columns:
+            yield {
+                "source": node_ids[u],
+                "target": node_ids[v],
+                "capacity": capacity,
+                "cost": cost,
+                "distance": length,
+                "weight": length,
+                "directed": False
+            }
+
+
+def spatial_compiled_graph(network):
+    """CompiledGraph of a spatial network built straight from its arrays"""
+    u, v = network["source"], network["target"]
+    # Undirected pipes become one arc each way, in the order parse_graph_data
+    # would produce from the pipe records
+    src = np.column_stack([u, v]).ravel()
+    dst = np.column_stack([v, u]).ravel()
+    capacity = np.repeat(network["capacity"], 2)
+    cost = np.repeat(network["cost"], 2)
+    # Pipe length doubles as the shortest-path weight
+    weight = np.repeat(network["length"].round(1), 2)
+    return CompiledGraph.from_arrays(
+        spatial_node_ids(network), src, dst, capacity, cost, weight,
+        network["supply"], network["demand"]
+    )
+
+
+def create_spatial_network(num_reservoirs=2, num_junctions=5, num_consumers=3, seed=None):
+    """
+    Create a planar, spatially embedded water distribution network
+
+    Same output format as create_water_network, plus node coordinates.
+    """
+    network = spatial_network_arrays(num_reservoirs, num_junctions, num_consumers, seed=seed)
+    node_ids = spatial_node_ids(network)
+    return {
+        "nodes": list(iter_spatial_nodes(network, node_ids)),
+        "edges": list(iter_spatial_edges(network, node_ids)),
+        "source": node_ids[0],
+        "sink": node_ids[-1]
+    }
@@ -0,0 +1,185 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from utils.graph_parser import is_columnar, parse_graph_data
+
+
+class UnknownNetworkError(LookupError):
+    """Raised when a network ID is not (or no longer) registered"""
+
+
+def network_fingerprint(data):
+    """
+    Content hash of a network's nodes and edges
+
+    The JSON is canonicalised (sorted keys, no whitespace) so the same
+    network always hashes to the same ID regardless of key order.
+    """
+    if 'nodes' not in data or 'edges' not in data:
+        raise ValueError("Input data must contain 'nodes' and 'edges'")
+    if is_columnar(data):
+        return _columnar_fingerprint(data)
+
+    canonical = json.dumps(
+        {'nodes': data['nodes'], 'edges': data['edges']},
+        sort_keys=True, separators=(',', ':')
+    )
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:32]
+
+
+# Canonical dtypes of the columnar arrays, so lists and arrays hash alike
+_COLUMN_DTYPES = {'source': np.int64, 'target': np.int64, 'directed': np.bool_}
+
+
+def _columnar_fingerprint(data):
+    """Content hash of a columnar network, over the raw array bytes"""
+    digest = hashlib.sha256()
+    for table in ('nodes', 'edges'):
+        for column in sorted(data[table]):
+            values = data[table][column]
+            if table == 'nodes' and column in ('id', 'type'):
+                # As parse_columnar_data reads them: mixed IDs stay mixed
+                labels = values.tolist() if isinstance(values, np.ndarray) else list(values)
+                raw = json.dumps(labels, separators=(',', ':')).encode('utf-8')
+            else:
+                array = np.asarray(values, dtype=_COLUMN_DTYPES.get(column, np.float64))
+                raw = repr(array.shape).encode('utf-8') + np.ascontiguousarray(array).tobytes()
+            digest.update(f"{table}/{column}:{len(raw)}:".encode('utf-8'))
+            digest.update(raw)
+    return digest.hexdigest()[:32]
+
+
+class RegisteredNetwork:
+    """A compiled network held by the registry"""
+
+    def __init__(self, network_id, graph):
+        self.network_id = network_id
+        self.graph = graph
+        self.nbytes = graph.nbytes
+        self.created_at = time.time()
+
+    def describe(self):
+        return {
+            'networkId': self.network_id,
+            'nodes': self.graph.num_nodes,
+            'edges': self.graph.num_edges,
+            'bytes': self.nbytes,
+            'createdAt': self.created_at
+        }
+
+
+class NetworkRegistry:
+    """
+    Bounded LRU cache of compiled networks keyed by content hash
+
+    Entries are evicted least recently used first once the total estimated
+    size exceeds max_bytes (or the entry count exceeds max_entries).
+    Eviction listeners are called with the network ID of every entry that
+    leaves the registry, so dependent caches can drop their results.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, max_entries=None):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._listeners = []
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def add_eviction_listener(self, callback):
+        self._listeners.append(callback)
+
+    def register(self, data):
+        """
+        Parse, compile and store a network
+
+        Args:
+            data (dict): JSON data containing nodes and edges
+
+        Returns:
+            tuple: (RegisteredNetwork, created) where created is False when an
+                   identical network was already registered
+        """
+        network_id = network_fingerprint(data)
+        with self._lock:
+            entry = self._entries.get(network_id)
+            if entry is not None:
+                self._entries.move_to_end(network_id)
+                return entry, False
+
+        # Parse outside the lock so large uploads don't block lookups
+        entry = RegisteredNetwork(network_id, parse_graph_data(data))
+
+        with self._lock:
+            if network_id in self._entries:
+                return self._entries[network_id], False
+            self._entries[network_id] = entry
+            self._bytes += entry.nbytes
+            evicted = self._evict()
+        self._notify(evicted)
+        return entry, True
+
+    def get(self, network_id):
+        """Return the RegisteredNetwork for an ID, raising UnknownNetworkError if absent"""
+        with self._lock:
+            entry = self._entries.get(network_id)
+            if entry is None:
+                self.misses += 1
+                raise UnknownNetworkError(
+                    f"Unknown network {network_id}; upload it to /api/networks first"
+                )
+            self.hits += 1
+            self._entries.move_to_end(network_id)
+            return entry
+
+    def __contains__(self, network_id):
+        # Membership test that leaves hit statistics and LRU order alone
+        with self._lock:
+            return network_id in self._entries
+
+    def remove(self, network_id):
+        """Drop a network, returning True if it was registered"""
+        with self._lock:
+            entry = self._entries.pop(network_id, None)
+            if entry is not None:
+                self._bytes -= entry.nbytes
+        if entry is not None:
+            self._notify([network_id])
+        return entry is not None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'networks': len(self._entries),
+                'bytes': self._bytes,
+                'maxBytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+    def _evict(self):
+        # Always keep the newest entry, even if it alone exceeds the budget
+        evicted = []
+        while len(self._entries) > 1 and (
+            self._bytes > self.max_bytes
+            or (self.max_entries is not None and len(self._entries) > self.max_entries)
+        ):
+            network_id, entry = self._entries.popitem(last=False)
+            self._bytes -= entry.nbytes
+            self.evictions += 1
+            evicted.append(network_id)
+        return evicted
+
+    def _notify(self, network_ids):
+        for network_id in network_ids:
+            for callback in self._listeners:
+                callback(network_id)
@@ -0,0 +1,113 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from utils.job_queue import JobCancelled, checkpoint
+
+# Graph shared by the worker processes of the current pool
+_worker_graph = None
+
+
+def default_workers():
+    """Worker count for analysis pools (ANALYSIS_WORKERS, else the CPU count)"""
+    return int(os.environ.get('ANALYSIS_WORKERS', os.cpu_count() or 1))
+
+
+def min_parallel_work():
+    """
+    Estimated arc visits below which a batch runs in-process
+    (PARALLEL_MIN_WORK, else 2 million)
+
+    Starting a pool and shipping the graph to it costs tens of
+    milliseconds, more than a handful of traversals of a small network.
+    """
+    return int(os.environ.get('PARALLEL_MIN_WORK', 2_000_000))
+
+
+def _context():
+    # Workers are forked from a single-threaded fork server rather than from
+    # the caller: forking the multithreaded web server can copy a lock held
+    # by another thread and deadlock the child
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context()
+
+
+def start_worker_server():
+    """
+    Start the fork server up front
+
+    Call once from the main module before any threads are started, so the
+    first parallel analysis does not pay for it and the server itself is
+    launched from a single-threaded process. The server imports the main
+    module once, so workers start with the analysis modules already loaded.
+    """
+    context = _context()
+    if context.get_start_method() == 'forkserver':
+        context.set_forkserver_preload(['__main__', __name__])
+        from multiprocessing import forkserver
+        forkserver.ensure_running()
+
+
+def _init_worker(graph):
+    global _worker_graph
+    _worker_graph = graph
+
+
+def _run_in_worker(func, item):
+    return func(_worker_graph, item)
+
+
+def map_with_graph(func, graph, items, max_workers=None, item_work=1):
+    """
+    Evaluate func(graph, item) for every item, in parallel when worthwhile
+
+    Workers receive the graph once, through the pool initializer, rather
+    than with every item. A pool is only started when the batch as a whole
+    (items times item_work) reaches min_parallel_work(); smaller batches run
+    in-process, where they finish before a pool would be up.
+
+    Args:
+        func (callable): Module-level function taking (graph, item)
+        graph (CompiledGraph): Read-only graph shared by all workers
+        items (list): Work items
+        max_workers (int): Pool size, defaults to default_workers()
+        item_work (int): Estimated arc visits per item, usually the arc count
+
+    Progress is reported to the running job, if any, as results arrive.
+
+    Returns:
+        list: Results in the order of items
+    """
+    return list(iter_with_graph(func, graph, items, max_workers, item_work))
+
+
+def iter_with_graph(func, graph, items, max_workers=None, item_work=1):
+    """
+    Like map_with_graph, but yield results in order as they become available
+
+    Lets callers write results out while later items are still running
+    instead of holding all of them in memory.
+    """
+    items = list(items)
+    workers = min(max_workers or default_workers(), len(items))
+    if workers <= 1 or len(items) * item_work < min_parallel_work():
+        for done, item in enumerate(items, 1):
+            yield func(graph, item)
+            checkpoint(done, len(items))
+        return
+
+    chunksize = max(1, len(items) // (workers * 4))
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=_context(),
+        initializer=_init_worker, initargs=(graph,)
+    ) as pool:
+        try:
+            results = pool.map(_run_in_worker, [func] * len(items), items, chunksize=chunksize)
+            for done, result in enumerate(results, 1):
+                yield result
+                checkpoint(done, len(items))
+        except (JobCancelled, GeneratorExit):
+            # Leave without waiting for the outstanding chunks
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
@@ -0,0 +1,148 @@
+import os
+import random
+import sys
+import threading
+from collections import Counter
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler for request threads, switched on and off at runtime
+
+    While enabled, a background thread wakes every interval seconds and
+    records the Python stack of every thread currently handling a profiled
+    request. Only a sample_rate fraction of requests is profiled (plus any
+    request that asks for it), so the overhead under real load stays low.
+    Stacks are aggregated, never stored per sample.
+    """
+
+    def __init__(self, interval=0.005, sample_rate=1.0, max_stacks=10000):
+        self.interval = interval
+        self.sample_rate = sample_rate
+        self.max_stacks = max_stacks
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._threads = {}
+        self._stacks = Counter()
+        self._samples = 0
+        self._requests = 0
+        self._dropped = 0
+        self._sampler = None
+        self._stop = threading.Event()
+
+    def configure(self, enabled=None, interval=None, sample_rate=None):
+        """Change settings; enabling starts the sampler thread, disabling stops it"""
+        with self._lock:
+            if interval is not None:
+                if interval <= 0:
+                    raise ValueError("Profiler interval must be positive")
+                self.interval = interval
+            if sample_rate is not None:
+                if not 0 <= sample_rate <= 1:
+                    raise ValueError("Profiler sample rate must be between 0 and 1")
+                self.sample_rate = sample_rate
+            if enabled is not None and enabled != self.enabled:
+                self.enabled = enabled
+                if enabled:
+                    self._stop = threading.Event()
+                    self._sampler = threading.Thread(target=self._sample_loop, args=(self._stop,),
+                                                     name='profiler', daemon=True)
+                    self._sampler.start()
+                else:
+                    self._stop.set()
+                    self._threads.clear()
+
+    def reset(self):
+        with self._lock:
+            self._stacks.clear()
+            self._samples = self._requests = self._dropped = 0
+
+    def begin(self, label, force=False):
+        """
+        Start profiling the calling thread if it is picked for sampling
+
+        Returns:
+            bool: Whether the thread is being profiled; pass it to end()
+        """
+        if not self.enabled or not (force or random.random() < self.sample_rate):
+            return False
+        with self._lock:
+            self._threads[threading.get_ident()] = label
+            self._requests += 1
+        return True
+
+    def end(self):
+        with self._lock:
+            self._threads.pop(threading.get_ident(), None)
+
+    def report(self, limit=30):
+        """
+        Hottest functions and stacks seen so far
+
+        Returns:
+            dict: Sample counts, the functions with the most samples (self:
+                  on top of the stack, total: anywhere on it) and the most
+                  frequent stacks, root first
+        """
+        with self._lock:
+            stacks = list(self._stacks.items())
+            summary = {
+                'enabled': self.enabled,
+                'interval': self.interval,
+                'sampleRate': self.sample_rate,
+                'samples': self._samples,
+                'requests': self._requests,
+                'droppedStacks': self._dropped
+            }
+        own = Counter()
+        total = Counter()
+        for stack, count in stacks:
+            own[stack[-1]] += count
+            for frame in set(stack):
+                total[frame] += count
+        summary['functions'] = [
+            {'function': frame, 'self': own[frame], 'total': count}
+            for frame, count in total.most_common(limit)
+        ]
+        summary['stacks'] = [
+            {'stack': list(stack), 'samples': count}
+            for stack, count in sorted(stacks, key=lambda item: -item[1])[:limit]
+        ]
+        return summary
+
+    def collapsed(self):
+        """Stacks in the collapsed format read by flamegraph.pl and speedscope"""
+        with self._lock:
+            stacks = list(self._stacks.items())
+        return ''.join(f"{';'.join(stack)} {count}\n" for stack, count in stacks)
+
+    def _sample_loop(self, stop):
+        while not stop.wait(self.interval):
+            with self._lock:
+                threads = dict(self._threads)
+            if not threads:
+                continue
+            frames = sys._current_frames()
+            stacks = []
+            for ident, label in threads.items():
+                frame = frames.get(ident)
+                if frame is not None:
+                    stacks.append(_stack(frame, label))
+            with self._lock:
+                for stack in stacks:
+                    self._samples += 1
+                    if stack in self._stacks or len(self._stacks) < self.max_stacks:
+                        self._stacks[stack] += 1
+                    else:
+                        self._dropped += 1
+
+
+def _stack(frame, label):
+    """Frames from the outermost to the innermost, as 'function (file:line)' strings"""
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    frames.append(label)
+    return tuple(reversed(frames))
@@ -0,0 +1,93 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResultCache:
+    """
+    Memoized algorithm results with TTL and LRU eviction
+
+    Keys are (network key, algorithm name, parameters). The network key is
+    the content hash of the graph, so results for a network are dropped as
+    soon as that network is invalidated.
+    """
+
+    def __init__(self, max_entries=1024, ttl=300, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_compute(self, network_key, algorithm, params, compute):
+        """
+        Return the cached result for a call, computing and storing it on a miss
+
+        Args:
+            network_key (str): Graph fingerprint
+            algorithm (str): Algorithm name
+            params (tuple): Hashable algorithm parameters
+            compute (callable): Produces the result on a miss
+
+        Returns:
+            The (possibly cached) result; callers must treat it as read-only
+        """
+        value = self.get(network_key, algorithm, params)
+        if value is None:
+            # Compute outside the lock; failures are not cached
+            value = compute()
+            self.put(network_key, algorithm, params, value)
+        return value
+
+    def get(self, network_key, algorithm, params):
+        """Return a live cached result, or None on a miss"""
+        key = (network_key, algorithm, params)
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None:
+                expires_at, value = item
+                if expires_at > self._clock():
+                    self.hits += 1
+                    self._entries.move_to_end(key)
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, network_key, algorithm, params, value):
+        """Store a result, evicting the least recently used entries if full"""
+        key = (network_key, algorithm, params)
+        with self._lock:
+            self._entries[key] = (self._clock() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, network_key):
+        """Drop every result computed for a network, returning how many were removed"""
+        with self._lock:
+            stale = [key for key in self._entries if key[0] == network_key]
+            for key in stale:
+                del self._entries[key]
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'maxEntries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions
+            }
@@ -0,0 +1,145 @@
+import json
+import os
+
+import numpy as np
+
+from utils.sensor_store import format_timestamps, to_timestamps
+
+META_FILE = 'meta.json'
+
+# Per-step columns and per-tree columns (trees x nodes, row-major)
+STEP_COLUMNS = {'created_at': np.int64, 'tree': np.int64, 'scale': np.float64}
+TREE_COLUMNS = {'distance': np.float64, 'parent': np.int64}
+
+
+class RouteReplay:
+    """
+    Routing history of a sensor replay, stored as columnar binary files
+
+    Every time step records which shortest-path tree it uses and the factor
+    its distances are scaled by; each distinct tree is stored once, as a
+    row of distances and a row of parent node indices. Files are flat
+    arrays described by meta.json, like the sensor store, and are read
+    through memory maps.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, META_FILE)) as f:
+            self._meta = json.load(f)
+        self.node_ids = self._meta['nodes']
+        self.index = {node_id: i for i, node_id in enumerate(self.node_ids)}
+        self._maps = {}
+
+    @classmethod
+    def write(cls, path, node_ids, source, times, step_tree, step_scale, trees):
+        """
+        Write a replay, streaming trees to disk as they are produced
+
+        Args:
+            path (str): Output directory
+            node_ids (list): Node IDs, position is the node index
+            source: Source node ID
+            times (array): Epoch nanoseconds of every step
+            step_tree, step_scale (array): Tree and distance scale of every step
+            trees (iterable): (distances, parents) arrays per tree, in order
+
+        Returns:
+            RouteReplay: The written replay
+        """
+        os.makedirs(path, exist_ok=True)
+        steps = {'created_at': times, 'tree': step_tree, 'scale': step_scale}
+        for name, dtype in STEP_COLUMNS.items():
+            np.asarray(steps[name], dtype=dtype).tofile(os.path.join(path, name + '.bin'))
+
+        count = 0
+        with open(os.path.join(path, 'distance.bin'), 'wb') as dist_file, \
+                open(os.path.join(path, 'parent.bin'), 'wb') as parent_file:
+            for dist, parent in trees:
+                np.asarray(dist, dtype=np.float64).tofile(dist_file)
+                np.asarray(parent, dtype=np.int64).tofile(parent_file)
+                count += 1
+
+        # meta.json goes last, so a replay without it is incomplete
+        meta = {
+            'nodes': list(node_ids),
+            'source': source,
+            'steps': len(step_tree),
+            'trees': count
+        }
+        with open(os.path.join(path, META_FILE), 'w') as f:
+            json.dump(meta, f)
+        return cls(path)
+
+    @property
+    def steps(self):
+        return self._meta['steps']
+
+    @property
+    def trees(self):
+        return self._meta['trees']
+
+    @property
+    def source(self):
+        return self._meta['source']
+
+    def describe(self):
+        times = self.column('created_at')
+        return {
+            'source': self.source,
+            'nodes': len(self.node_ids),
+            'steps': self.steps,
+            'trees': self.trees,
+            'start': format_timestamps(times[:1])[0] if self.steps else None,
+            'end': format_timestamps(times[-1:])[0] if self.steps else None
+        }
+
+    def column(self, name):
+        """Memory-mapped per-step column, or a (trees, nodes) tree column"""
+        if name not in self._maps:
+            if name in STEP_COLUMNS:
+                dtype, shape = STEP_COLUMNS[name], (self.steps,)
+            elif name in TREE_COLUMNS:
+                dtype, shape = TREE_COLUMNS[name], (self.trees, len(self.node_ids))
+            else:
+                raise ValueError(f"Unknown replay column: {name}")
+            if 0 in shape:
+                self._maps[name] = np.empty(shape, dtype=dtype)
+            else:
+                self._maps[name] = np.memmap(
+                    os.path.join(self.path, name + '.bin'), dtype=dtype, mode='r', shape=shape
+                )
+        return self._maps[name]
+
+    def step_at(self, timestamp):
+        """Last step at or before a timestamp"""
+        times = self.column('created_at')
+        step = int(np.searchsorted(times, to_timestamps([timestamp])[0], side='right')) - 1
+        if step < 0:
+            raise ValueError(f"No replayed step at or before {timestamp}")
+        return step
+
+    def distances(self, step):
+        """Distance of every node at a step, by node index"""
+        tree = self.column('tree')[step]
+        return self.column('distance')[tree] * self.column('scale')[step]
+
+    def parents(self, step):
+        """Parent node index of every node at a step, -1 for none"""
+        return np.asarray(self.column('parent')[self.column('tree')[step]])
+
+    def route(self, step, target):
+        """Node IDs on the shortest path to target at a step (empty if unreachable)"""
+        parents = self.parents(step)
+        v = self.index[target]
+        if v != self.index[self.source] and parents[v] < 0:
+            return []
+        path = []
+        while v >= 0:
+            path.append(self.node_ids[v])
+            v = parents[v]
+        return path[::-1]
+
+    def routing_table(self, step):
+        """Node ID -> distance at a step"""
+        return dict(zip(self.node_ids, self.distances(step).tolist()))
@@ -0,0 +1,283 @@
+import json
+import os
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+from utils.spatial_index import SensorLocationIndex
+
+TIME_COLUMN = 'created_at'
+META_FILE = 'meta.json'
+LOCATION_COLUMNS = ('latitude', 'longitude', 'elevation')
+
+
+def _column_file(name):
+    """Filesystem-safe file name for a column"""
+    return re.sub(r'[^A-Za-z0-9_]+', '_', name).strip('_').lower() + '.bin'
+
+
+def _dtype(name):
+    """Stored dtype of a column: int64 epoch nanoseconds for created_at, else float64"""
+    return np.dtype(np.int64 if name == TIME_COLUMN else np.float64)
+
+
+def to_timestamps(values):
+    """Parse timestamps (ISO strings, datetimes or epoch ns) into int64 UTC epoch nanoseconds"""
+    parsed = pd.to_datetime(pd.Series(values), utc=True, errors='coerce')
+    if parsed.isna().any():
+        raise ValueError(f"'{TIME_COLUMN}' must be a valid timestamp")
+    return parsed.dt.tz_localize(None).astype('datetime64[ns]').to_numpy().view(np.int64)
+
+
+def format_timestamps(ns):
+    """Render epoch nanoseconds the way Filtered_Data.csv writes them"""
+    return pd.to_datetime(np.asarray(ns, dtype=np.int64), utc=True).strftime('%Y-%m-%dT%H:%M:%S+00:00')
+
+
+class SensorStore:
+    """
+    Columnar, append-only sensor history backed by memory-mapped arrays
+
+    Every column is a flat binary file of float64 values (created_at is
+    int64 epoch nanoseconds) in a store directory, described by meta.json.
+    Rows are kept sorted by created_at, so time-range lookups are two
+    binary searches and reads touch only the requested columns and rows.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._meta = self._read_meta()
+        self._maps = {}
+        self._locations = None
+
+    # ----- ingestion -----
+
+    @classmethod
+    def open(cls, path, csv_path=None):
+        """
+        Open a store, (re)ingesting csv_path first if the store is missing or
+        older than the CSV
+        """
+        store = cls(path)
+        if csv_path and store.is_stale(csv_path):
+            store.ingest_csv(csv_path)
+        return store
+
+    def is_stale(self, csv_path):
+        if self._meta is None:
+            return True
+        stat = os.stat(csv_path)
+        source = self._meta.get('source', {})
+        return source.get('mtime') != stat.st_mtime or source.get('size') != stat.st_size
+
+    def ingest_csv(self, csv_path):
+        """Replace the store contents with a CSV export, parsed once"""
+        df = pd.read_csv(csv_path)
+        stat = os.stat(csv_path)
+        self.replace(df, source={
+            'path': os.path.abspath(csv_path), 'mtime': stat.st_mtime, 'size': stat.st_size
+        })
+
+    def replace(self, df, source=None):
+        """Rewrite the store from a DataFrame"""
+        df = self._prepare(df)
+        with self._lock:
+            self._rewrite(df, source)
+
+    def append(self, records):
+        """
+        Append new readings
+
+        Readings newer than the last stored one are appended to the column
+        files in place; older ones force a sorted rewrite. The order check
+        and the write happen under one lock, so concurrent appends can't
+        interleave and leave the store unsorted.
+
+        Args:
+            records (list or DataFrame): Rows with created_at and sensor columns
+
+        Returns:
+            int: Number of rows appended
+        """
+        df = self._prepare(pd.DataFrame(records))
+        if df.empty:
+            return 0
+
+        with self._lock:
+            if self._meta is None:
+                self._rewrite(df, None)
+                return len(df)
+
+            columns = self._meta['columns']
+            unknown = [c for c in df.columns if c != TIME_COLUMN and c not in columns]
+            if unknown:
+                raise ValueError(f"Unknown sensor columns: {', '.join(unknown)}")
+            df = df.reindex(columns=[TIME_COLUMN] + columns)
+            df[columns] = df[columns].astype(np.float64)
+
+            rows = self._meta['rows']
+            if rows and df[TIME_COLUMN].iloc[0] < self._column(TIME_COLUMN, rows)[-1]:
+                stored = pd.DataFrame({name: np.array(self._column(name, rows)) for name in df.columns})
+                merged = pd.concat([stored, df], ignore_index=True)
+                merged = merged.sort_values(TIME_COLUMN, kind='stable').reset_index(drop=True)
+                self._rewrite(merged, self._meta.get('source'))
+                return len(df)
+
+            names = [TIME_COLUMN] + columns
+            try:
+                for name in names:
+                    # Start at the last committed row, dropping anything a
+                    # failed append left behind
+                    with open(self._file(name), 'r+b') as f:
+                        f.truncate(rows * _dtype(name).itemsize)
+                        f.seek(0, os.SEEK_END)
+                        df[name].to_numpy().tofile(f)
+                self._meta['rows'] = rows + len(df)
+                self._write_meta()
+            except BaseException:
+                # Keep every column file the length meta.json says
+                self._meta['rows'] = rows
+                for name in names:
+                    with open(self._file(name), 'r+b') as f:
+                        f.truncate(rows * _dtype(name).itemsize)
+                raise
+            finally:
+                self._maps = {}
+                self._locations = None
+        return len(df)
+
+    # ----- queries -----
+
+    @property
+    def rows(self):
+        return self._meta['rows'] if self._meta else 0
+
+    @property
+    def columns(self):
+        return [TIME_COLUMN] + (self._meta['columns'] if self._meta else [])
+
+    def time_range(self, start=None, end=None):
+        """
+        Row slice covering start <= created_at <= end, by binary search
+
+        Args:
+            start, end: Timestamps (anything to_timestamps accepts) or None
+
+        Returns:
+            slice: Matching row positions
+        """
+        times = self.column(TIME_COLUMN)
+        lo = 0 if start is None else int(np.searchsorted(times, to_timestamps([start])[0], side='left'))
+        hi = len(times) if end is None else int(np.searchsorted(times, to_timestamps([end])[0], side='right'))
+        return slice(lo, max(lo, hi))
+
+    def column(self, name, rows=None):
+        """Memory-mapped view of one column (optionally restricted to a row slice)"""
+        with self._lock:
+            if self._meta is None:
+                raise ValueError("Sensor store is empty")
+            if name not in self.columns:
+                raise ValueError(f"Unknown sensor column: {name}")
+            data = self._column(name, self._meta['rows'])
+        return data if rows is None else data[rows]
+
+    def frame(self, columns=None, start=None, end=None, raw_time=False):
+        """
+        Load the selected columns and time range into a DataFrame
+
+        created_at is rendered as ISO strings unless raw_time is set.
+        """
+        columns = self.columns if columns is None else list(columns)
+        rows = self.time_range(start, end)
+        data = {}
+        for name in columns:
+            values = np.array(self.column(name, rows))
+            if name == TIME_COLUMN and not raw_time:
+                values = format_timestamps(values)
+            data[name] = values
+        return pd.DataFrame(data, columns=columns)
+
+    def locations(self):
+        """
+        Spatial index of the sensor locations in the store
+
+        Built from the latitude, longitude and elevation columns when first
+        asked for after an ingest or append, then reused. Stores without
+        location columns get an empty index.
+        """
+        with self._lock:
+            index = self._locations
+            rows = self._meta['rows'] if self._meta else 0
+            present = self._meta is not None and all(name in self._meta['columns'] for name in LOCATION_COLUMNS)
+            if index is None:
+                if present and rows:
+                    columns = [self._column(name, rows) for name in LOCATION_COLUMNS]
+                    index = SensorLocationIndex.from_readings(*columns)
+                else:
+                    index = SensorLocationIndex([], [], [])
+                self._locations = index
+            return index
+
+    def row(self, position, columns=None):
+        """One reading as a dict of column -> value"""
+        columns = self.columns if columns is None else columns
+        return {name: self.column(name)[position].item() for name in columns}
+
+    # ----- internals -----
+
+    def _prepare(self, df):
+        """Drop rows without a timestamp, parse times, coerce values, sort by time"""
+        if TIME_COLUMN not in df.columns:
+            raise ValueError(f"Sensor data must contain '{TIME_COLUMN}'")
+        df = df[df[TIME_COLUMN].notna()].copy()
+        df[TIME_COLUMN] = to_timestamps(df[TIME_COLUMN])
+        for name in df.columns:
+            if name != TIME_COLUMN:
+                df[name] = pd.to_numeric(df[name], errors='coerce').astype(np.float64)
+        return df.sort_values(TIME_COLUMN, kind='stable').reset_index(drop=True)
+
+    def _rewrite(self, df, source):
+        """Replace every column file with a prepared frame; the lock must be held"""
+        columns = [c for c in df.columns if c != TIME_COLUMN]
+        os.makedirs(self.path, exist_ok=True)
+        self._maps = {}
+        self._locations = None
+        # Write beside the old files and swap, so open memory maps stay valid
+        for name in [TIME_COLUMN] + columns:
+            df[name].to_numpy().tofile(self._file(name) + '.tmp')
+            os.replace(self._file(name) + '.tmp', self._file(name))
+        self._meta = {
+            'rows': len(df),
+            'columns': columns,
+            'source': source or {}
+        }
+        self._write_meta()
+
+    def _file(self, name):
+        return os.path.join(self.path, _column_file(name))
+
+    def _column(self, name, rows):
+        key = (name, rows)
+        if key not in self._maps:
+            dtype = _dtype(name)
+            if rows == 0:
+                self._maps[key] = np.empty(0, dtype=dtype)
+            else:
+                self._maps[key] = np.memmap(self._file(name), dtype=dtype, mode='r', shape=(rows,))
+        return self._maps[key]
+
+    def _read_meta(self):
+        try:
+            with open(os.path.join(self.path, META_FILE)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_meta(self):
+        tmp = os.path.join(self.path, META_FILE + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(self._meta, f)
+        os.replace(tmp, os.path.join(self.path, META_FILE))
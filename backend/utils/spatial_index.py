@@ -0,0 +1,204 @@
+import math
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in kilometres (vectorized)"""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class SensorLocationIndex:
+    """
+    Grid index over sensor locations
+
+    A sensor is a distinct (latitude, longitude) among the readings; its
+    elevation is the mean of its readings'. Sensors are bucketed into a
+    grid of latitude/longitude cells sized for a couple of sensors each,
+    stored CSR-style (sensors sorted by cell plus a start offset per cell),
+    so box, radius and nearest-neighbour queries only look at the cells
+    they overlap. Distances are great-circle kilometres. A sorted copy of
+    the elevations answers elevation bands by binary search.
+    """
+
+    def __init__(self, latitude, longitude, elevation, rows=None, first_row=None, last_row=None):
+        self.latitude = np.asarray(latitude, dtype=np.float64)
+        self.longitude = np.asarray(longitude, dtype=np.float64)
+        self.elevation = np.asarray(elevation, dtype=np.float64)
+        n = len(self.latitude)
+        self.rows = np.zeros(n, dtype=np.int64) if rows is None else np.asarray(rows)
+        self.first_row = np.zeros(n, dtype=np.int64) if first_row is None else np.asarray(first_row)
+        self.last_row = np.zeros(n, dtype=np.int64) if last_row is None else np.asarray(last_row)
+        self._build_grid()
+        self.elevation_order = np.argsort(self.elevation, kind='stable')
+        self.sorted_elevation = self.elevation[self.elevation_order]
+        self.known_elevations = int(np.count_nonzero(np.isfinite(self.elevation)))
+
+    @classmethod
+    def from_readings(cls, latitude, longitude, elevation):
+        """
+        Index the distinct locations of a series of readings
+
+        Readings without a latitude or longitude are skipped.
+
+        Args:
+            latitude, longitude, elevation (array): One entry per reading
+
+        Returns:
+            SensorLocationIndex: One sensor per distinct location, with its
+                reading count and first and last reading positions
+        """
+        latitude = np.asarray(latitude, dtype=np.float64)
+        longitude = np.asarray(longitude, dtype=np.float64)
+        elevation = np.asarray(elevation, dtype=np.float64)
+        located = np.flatnonzero(np.isfinite(latitude) & np.isfinite(longitude))
+        if len(located) == 0:
+            return cls([], [], [])
+
+        coords = np.column_stack([latitude[located], longitude[located]])
+        unique, sensor = np.unique(coords, axis=0, return_inverse=True)
+        sensor = sensor.ravel()
+        m = len(unique)
+        rows = np.bincount(sensor, minlength=m)
+        first_row = np.full(m, np.iinfo(np.int64).max)
+        np.minimum.at(first_row, sensor, located)
+        last_row = np.full(m, -1)
+        np.maximum.at(last_row, sensor, located)
+
+        # Mean elevation over the readings that have one
+        heights = elevation[located]
+        known = np.isfinite(heights)
+        counts = np.bincount(sensor[known], minlength=m)
+        totals = np.bincount(sensor[known], weights=heights[known], minlength=m)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean_elevation = np.where(counts > 0, totals / counts, np.nan)
+        return cls(unique[:, 0], unique[:, 1], mean_elevation, rows, first_row, last_row)
+
+    def __len__(self):
+        return len(self.latitude)
+
+    def _build_grid(self):
+        n = len(self)
+        if n == 0:
+            self.cell_size = 1.0
+            self.origin = (0.0, 0.0)
+            self.shape = (1, 1)
+            self.cell_order = np.zeros(0, dtype=np.int64)
+            self.cell_start = np.zeros(2, dtype=np.int64)
+            return
+        lat0, lon0 = self.latitude.min(), self.longitude.min()
+        span = max(self.latitude.max() - lat0, self.longitude.max() - lon0, 1e-9)
+        # About two sensors per cell on average, for uniformly spread sensors
+        per_side = max(1, int(math.sqrt(n / 2)))
+        self.cell_size = span / per_side
+        self.origin = (lat0, lon0)
+        rows = int((self.latitude.max() - lat0) // self.cell_size) + 1
+        cols = int((self.longitude.max() - lon0) // self.cell_size) + 1
+        self.shape = (rows, cols)
+        cell = self._cells(self.latitude, self.longitude)
+        self.cell_order = np.argsort(cell, kind='stable')
+        self.cell_start = np.zeros(rows * cols + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cell, minlength=rows * cols), out=self.cell_start[1:])
+
+    def _cells(self, latitude, longitude):
+        rows, cols = self.shape
+        r = np.clip(((latitude - self.origin[0]) // self.cell_size).astype(np.int64), 0, rows - 1)
+        c = np.clip(((longitude - self.origin[1]) // self.cell_size).astype(np.int64), 0, cols - 1)
+        return r * cols + c
+
+    def _in_box(self, min_lat, min_lon, max_lat, max_lon):
+        """Sensors in the cells overlapping a box (a superset of the box)"""
+        rows, cols = self.shape
+        if len(self) == 0:
+            return np.zeros(0, dtype=np.int64)
+        r0 = int(max(0, (min_lat - self.origin[0]) // self.cell_size))
+        r1 = int(min(rows - 1, (max_lat - self.origin[0]) // self.cell_size))
+        c0 = int(max(0, (min_lon - self.origin[1]) // self.cell_size))
+        c1 = int(min(cols - 1, (max_lon - self.origin[1]) // self.cell_size))
+        if r0 > r1 or c0 > c1:
+            return np.zeros(0, dtype=np.int64)
+        # Each grid row of the box is one contiguous run of cells
+        parts = [
+            self.cell_order[self.cell_start[r * cols + c0]:self.cell_start[r * cols + c1 + 1]]
+            for r in range(r0, r1 + 1)
+        ]
+        return np.concatenate(parts)
+
+    def elevation_band(self, min_elevation=None, max_elevation=None):
+        """Sensors whose elevation lies in [min_elevation, max_elevation]"""
+        # Sensors without an elevation sort last and match no band
+        known = self.sorted_elevation[:self.known_elevations]
+        lo = 0 if min_elevation is None else int(np.searchsorted(known, min_elevation, side='left'))
+        hi = len(known) if max_elevation is None else int(np.searchsorted(known, max_elevation, side='right'))
+        return np.sort(self.elevation_order[lo:max(lo, hi)])
+
+    def _elevation_mask(self, sensors, min_elevation, max_elevation):
+        keep = np.ones(len(sensors), dtype=bool)
+        if min_elevation is not None:
+            keep &= self.elevation[sensors] >= min_elevation
+        if max_elevation is not None:
+            keep &= self.elevation[sensors] <= max_elevation
+        return sensors[keep]
+
+    def bbox(self, min_lat, min_lon, max_lat, max_lon, min_elevation=None, max_elevation=None):
+        """Sensors inside a latitude/longitude box, optionally within an elevation band"""
+        sensors = self._in_box(min_lat, min_lon, max_lat, max_lon)
+        lat, lon = self.latitude[sensors], self.longitude[sensors]
+        sensors = sensors[(lat >= min_lat) & (lat <= max_lat) & (lon >= min_lon) & (lon <= max_lon)]
+        return np.sort(self._elevation_mask(sensors, min_elevation, max_elevation))
+
+    def radius(self, lat, lon, radius_km, min_elevation=None, max_elevation=None):
+        """
+        Sensors within radius_km of a point
+
+        Returns:
+            tuple: (sensors, distances in km), nearest first
+        """
+        sensors = self._in_box(*_bounding_box(lat, lon, radius_km))
+        sensors = self._elevation_mask(sensors, min_elevation, max_elevation)
+        distance = haversine_km(lat, lon, self.latitude[sensors], self.longitude[sensors])
+        keep = distance <= radius_km
+        sensors, distance = sensors[keep], distance[keep]
+        order = np.lexsort((sensors, distance))
+        return sensors[order], distance[order]
+
+    def nearest(self, lat, lon, k=1, min_elevation=None, max_elevation=None, max_km=None):
+        """
+        The k sensors nearest to a point
+
+        Searches a growing radius: once k sensors lie within it, no sensor
+        outside can be nearer.
+
+        Returns:
+            tuple: (sensors, distances in km), nearest first
+        """
+        if len(self) == 0 or k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        # Start from the radius that holds about k sensors at average density
+        cell_km = self.cell_size * math.pi / 180 * EARTH_RADIUS_KM
+        radius_km = cell_km * max(1.0, math.sqrt(k / 2))
+        limit = math.pi * EARTH_RADIUS_KM if max_km is None else max_km
+        while True:
+            radius_km = min(radius_km, limit)
+            sensors, distance = self.radius(lat, lon, radius_km, min_elevation, max_elevation)
+            if len(sensors) >= k or radius_km >= limit:
+                return sensors[:k], distance[:k]
+            radius_km *= 2
+
+
+def _bounding_box(lat, lon, radius_km):
+    """Latitude/longitude box containing every point within radius_km"""
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    min_lat, max_lat = lat - dlat, lat + dlat
+    if min_lat <= -90 or max_lat >= 90:
+        return max(min_lat, -90.0), -180.0, min(max_lat, 90.0), 180.0
+    # Widest at the latitude farthest from the equator
+    dlon = math.degrees(radius_km / (EARTH_RADIUS_KM * math.cos(math.radians(max(abs(min_lat), abs(max_lat))))))
+    if dlon >= 180 or lon - dlon < -180 or lon + dlon > 180:
+        # Crosses the antimeridian: take every longitude
+        return min_lat, -180.0, max_lat, 180.0
+    return min_lat, lon - dlon, max_lat, lon + dlon
@@ -0,0 +1,101 @@
+import json
+import math
+
+import numpy as np
+from flask import Response
+
+try:
+    import msgpack
+except ImportError:  # Optional: only needed for the compact binary format
+    msgpack = None
+
+STREAM_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'msgpack': 'application/x-msgpack'
+}
+
+CHUNK_BYTES = 64 * 1024
+
+# json.dumps with custom separators builds a new encoder on every call
+_JSON = json.JSONEncoder(separators=(',', ':'))
+
+
+def stream_format(request):
+    """
+    Streaming format requested by a client, or None for a regular JSON response
+
+    Read from ?format=ndjson|msgpack, or an Accept header naming one of the
+    streaming media types.
+    """
+    fmt = request.args.get('format')
+    if fmt is None:
+        accept = request.headers.get('Accept', '')
+        fmt = next((name for name, mime in STREAM_FORMATS.items() if mime in accept), None)
+    if fmt is None or fmt == 'json':
+        return None
+    if fmt not in STREAM_FORMATS:
+        raise ValueError(f"Unknown format {fmt}; use json, ndjson or msgpack")
+    if fmt == 'msgpack' and msgpack is None:
+        raise ValueError("MessagePack output requires the msgpack package")
+    return fmt
+
+
+def _plain(value):
+    """Convert NumPy scalars and non-finite floats into JSON/MessagePack-safe values"""
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if isinstance(value, dict):
+        return {k: _plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    return value
+
+
+def encode_stream(items, fmt, chunk_bytes=CHUNK_BYTES):
+    """
+    Serialize records one at a time and yield them in chunks of about chunk_bytes
+
+    NDJSON writes one JSON document per line; msgpack writes a sequence of
+    MessagePack objects that msgpack.Unpacker reads back one by one.
+    """
+    buffer = []
+    size = 0
+    for item in items:
+        item = _plain(item)
+        if fmt == 'msgpack':
+            data = msgpack.packb(item)
+        else:
+            data = _JSON.encode(item).encode('utf-8') + b'\n'
+        buffer.append(data)
+        size += len(data)
+        if size >= chunk_bytes:
+            yield b''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def stream_response(items, fmt):
+    """Flask response that streams a generator of records without materializing it"""
+    return Response(encode_stream(items, fmt), mimetype=STREAM_FORMATS[fmt])
+
+
+def document_records(summary, collections):
+    """
+    Records for a streamed JSON document
+
+    The first record holds the scalar fields (summary); every list item
+    follows as its own record, tagged with the field name it belongs to,
+    e.g. {"flowPaths": {...}}.
+
+    Args:
+        summary (dict): Scalar fields of the response
+        collections (list): (field name, iterable of items) pairs
+    """
+    yield summary
+    for name, items in collections:
+        for item in items:
+            yield {name: item}